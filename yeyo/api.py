@@ -0,0 +1,120 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+A Python API for composing version operations in memory before writing them once.
+
+    >>> from yeyo.api import Chain
+    >>> chain = Chain.from_yaml(".yeyo.yaml").bump_minor().bump_prerelease().finalize()
+    >>> chain.version_string
+    '0.2.0'
+    >>> config = chain.apply(".yeyo.yaml")
+
+Each operation returns a new chain, and only derives a new config in memory, so chains are cheap to
+build, branch and throw away. Applying a chain rewrites each tracked file once, replacing the
+version the chain started from with the version it ended at.
+"""
+
+from pathlib import Path
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from yeyo.config import YeyoConfig
+from yeyo.status import DEFAULT_DIRTY_SCOPE
+
+
+class Step(NamedTuple):
+    """A single operation of a chain, and the version it resulted in."""
+
+    operation: str
+    version: str
+
+
+class Chain(NamedTuple):
+    """A chain of version operations, starting from the config start."""
+
+    start: YeyoConfig
+    config: YeyoConfig
+    steps: Tuple[Step, ...] = ()
+
+    @classmethod
+    def from_config(cls, config: YeyoConfig) -> "Chain":
+        """Start an empty chain from config."""
+        return cls(config, config)
+
+    @classmethod
+    def from_yaml(cls, config_path: Path) -> "Chain":
+        """Start an empty chain from the config at config_path."""
+        return cls.from_config(YeyoConfig.from_yaml(Path(config_path)))
+
+    def _then(self, operation: str, config: YeyoConfig) -> "Chain":
+        return self._replace(
+            config=config, steps=self.steps + (Step(operation, config.version_string),)
+        )
+
+    def bump_major(self) -> "Chain":
+        """Add a major bump to the chain."""
+        return self._then("bump_major", self.config.bump_major())
+
+    def bump_minor(self) -> "Chain":
+        """Add a minor bump to the chain."""
+        return self._then("bump_minor", self.config.bump_minor())
+
+    def bump_patch(self) -> "Chain":
+        """Add a patch bump to the chain."""
+        return self._then("bump_patch", self.config.bump_patch())
+
+    def bump_build(self) -> "Chain":
+        """Add a build bump to the chain."""
+        return self._then("bump_build", self.config.bump_build())
+
+    def bump_prerelease(self, prerelease_token: Optional[str] = None) -> "Chain":
+        """Add a prerelease bump to the chain."""
+        return self._then("bump_prerelease", self.config.bump_prerelease(prerelease_token))
+
+    def finalize(self) -> "Chain":
+        """Add finalizing the version to the chain."""
+        return self._then("finalize", self.config.finalize())
+
+    @property
+    def version_string(self) -> str:
+        """The version at the end of the chain."""
+        return self.config.version_string
+
+    @property
+    def changed(self) -> bool:
+        """
+        True if the chain ends at a different version than it started from.
+
+        The version strings are compared, since semver's comparison ignores the build.
+        """
+        return self.config.version_string != self.start.version_string
+
+    def apply(
+        self,
+        config_path: Path,
+        dryrun: bool = False,
+        git_tag_before: bool = False,
+        git_tag_after: bool = False,
+        jobs: Optional[int] = None,
+        plan_path: Optional[Path] = None,
+        dirty_scope: str = DEFAULT_DIRTY_SCOPE,
+    ) -> YeyoConfig:
+        """
+        Write the net change of the chain to the tracked files and the config at config_path.
+
+        The arguments are the same as YeyoConfig.update. Nothing is written if the chain ends at
+        the version it started from. Returns the config at the end of the chain.
+        """
+        if self.changed:
+            self.config.update(
+                self.start,
+                Path(config_path),
+                dryrun,
+                git_tag_before,
+                git_tag_after,
+                jobs,
+                Path(plan_path) if plan_path is not None else None,
+                dirty_scope,
+            )
+        return self.config
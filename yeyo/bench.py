@@ -0,0 +1,261 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Benchmarks for yeyo's hot paths against synthetic repos, run through `yeyo dev bench`.
+
+Each scale generates a repo with a number of tracked files of a given size, each containing the
+version a number of times. The suite then times loading the config, deriving bumped configs,
+scanning and rewriting the files, adding files and committing and tagging with git. Every benchmark
+reports the best of several runs, so the results of different runs can be compared over time.
+"""
+
+import contextlib
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from yeyo import __version__
+from yeyo import cache
+from yeyo.config import DEFAULT_COMMIT_TEMPLATE
+from yeyo.config import DEFAULT_CONFIG_PATH
+from yeyo.config import DEFAULT_TAG_TEMPLATE
+from yeyo.config import YEYO_VERSION_TEMPLATE
+from yeyo.config import FileVersion
+from yeyo.config import YeyoConfig
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000)
+DEFAULT_REPEAT = 5
+
+# The number of generated files per directory.
+FILES_PER_DIRECTORY = 100
+
+STARTING_VERSION = "0.1.0"
+
+
+class Scale(NamedTuple):
+    """The shape of a synthetic repo."""
+
+    name: str
+    files: int
+    file_size: int
+    matches: int
+
+
+SCALES = {
+    s.name: s
+    for s in [
+        Scale("small", 100, 1_024, 1),
+        Scale("medium", 1_000, 4_096, 4),
+        Scale("large", 5_000, 16_384, 16),
+    ]
+}
+DEFAULT_SCALES = ("small", "medium")
+
+
+class BenchResult(NamedTuple):
+    """The best time of a benchmark at a single size."""
+
+    name: str
+    size: int
+    seconds: float
+    scale: Optional[str] = None
+
+    def to_dict(self):
+        """Convert the result to a dictionary."""
+        return self._asdict()
+
+
+def _best_of(
+    func: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None
+) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def synthetic_config(size: int) -> YeyoConfig:
+    """Create a config tracking size files, which don't need to exist."""
+    files = (FileVersion(Path(f"pkg/{i}/VERSION"), YEYO_VERSION_TEMPLATE) for i in range(size))
+    return YeyoConfig.from_version_string(
+        "0.1.0-dev.1", DEFAULT_TAG_TEMPLATE, DEFAULT_COMMIT_TEMPLATE, files
+    )
+
+
+def synthetic_contents(file_size: int, matches: int, version: str) -> bytes:
+    """Return file_size bytes of filler lines, with version spread evenly over matches lines."""
+    filler = b"value = 1\n"
+    match = f"version = {version}\n".encode()
+
+    lines = [filler] * max(file_size // len(filler), matches)
+    for i in range(matches):
+        lines[i * len(lines) // matches] = match
+    return b"".join(lines)
+
+
+def synthetic_repo(root: Path, scale: Scale, version: str = STARTING_VERSION) -> YeyoConfig:
+    """
+    Generate the files of scale under root, and the config at root that tracks them.
+
+    The file paths in the config are relative to root.
+    """
+    contents = synthetic_contents(scale.file_size, scale.matches, version)
+
+    file_versions = []
+    for i in range(scale.files):
+        file_path = Path(f"pkg{i // FILES_PER_DIRECTORY}") / f"file{i}.txt"
+        (root / file_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / file_path).write_bytes(contents)
+        file_versions.append(FileVersion(file_path, YEYO_VERSION_TEMPLATE))
+
+    config = YeyoConfig.from_version_string(
+        version, DEFAULT_TAG_TEMPLATE, DEFAULT_COMMIT_TEMPLATE, file_versions
+    )
+    config.to_yaml(root / DEFAULT_CONFIG_PATH)
+    return config
+
+
+def bench_bump_derivation(
+    sizes: Iterable[int] = DEFAULT_SIZES, repeat: int = DEFAULT_REPEAT
+) -> List[BenchResult]:
+    """Time deriving every kind of bumped config from configs with sizes files."""
+    results = []
+    for size in sizes:
+        yc = synthetic_config(size)
+        bumps = {
+            "bump_major": yc.bump_major,
+            "bump_minor": yc.bump_minor,
+            "bump_patch": yc.bump_patch,
+            "bump_build": yc.bump_build,
+            "bump_prerelease": lambda: yc.bump_prerelease("rc"),
+            "finalize": yc.finalize,
+        }
+        for name, func in bumps.items():
+            results.append(BenchResult(name, size, _best_of(func, repeat)))
+    return results
+
+
+@contextlib.contextmanager
+def _in_directory(directory: Path):
+    previous = os.getcwd()
+    os.chdir(str(directory))
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _bench_scale(root: Path, scale: Scale, repeat: int) -> List[BenchResult]:
+    """Run the suite against a synthetic repo of scale generated under root."""
+    import git
+    from click.testing import CliRunner
+
+    from yeyo.cli import main
+
+    config_path = Path(DEFAULT_CONFIG_PATH)
+    timings: Dict[str, float] = {}
+
+    with _in_directory(root):
+        config = synthetic_repo(Path("."), scale)
+        files = config.files
+
+        def drop_cache():
+            for p in Path(cache.CACHE_DIR_NAME).glob("*.marshal"):
+                p.unlink()
+
+        timings["from_yaml_cold"] = _best_of(
+            lambda: YeyoConfig.from_yaml(config_path), repeat, drop_cache
+        )
+        timings["from_yaml_warm"] = _best_of(lambda: YeyoConfig.from_yaml(config_path), repeat)
+
+        bumped = config.bump_minor()
+        timings["update_files_dryrun"] = _best_of(
+            lambda: bumped._update_files(config, config_path, True, files=files), repeat
+        )
+
+        # A real update moves the files on, so each run bumps from wherever the last one left off.
+        state = {"current": config}
+
+        def update_files():
+            current = state["current"]
+            new = current.bump_patch()
+            new._update_files(current, config_path, False, files=files)
+            state["current"] = new
+
+        timings["update_files"] = _best_of(update_files, repeat)
+
+        extra = [f"extra/file{i}.txt" for i in range(scale.files)]
+        Path("extra").mkdir()
+        for p in extra:
+            Path(p).write_bytes(b"")
+
+        runner = CliRunner()
+        timings["files_add"] = _best_of(
+            lambda: runner.invoke(main, ["files", "add", *extra], catch_exceptions=False),
+            repeat,
+            lambda: state["current"].to_yaml(config_path),
+        )
+
+        state["current"].to_yaml(config_path)
+        repo = git.Repo.init(".")
+        repo.index.add([str(fv.file_path) for fv in files] + extra + [DEFAULT_CONFIG_PATH])
+        repo.index.commit("Initial commit.")
+
+        def bump_files():
+            current = state["current"]
+            new = current.bump_patch()
+            new.update(current, config_path)
+            state["current"] = new
+
+        timings["tag_after"] = _best_of(
+            lambda: state["current"]._tag_after(config_path, {fv.file_path for fv in files}),
+            repeat,
+            bump_files,
+        )
+
+    return [
+        BenchResult(name, scale.files, seconds, scale.name) for name, seconds in timings.items()
+    ]
+
+
+def run_suite(
+    scales: Iterable[str] = DEFAULT_SCALES,
+    repeat: int = DEFAULT_REPEAT,
+    workdir: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """
+    Run the suite at each of scales, generating the repos in a temporary directory in workdir.
+
+    Returns the results along with the versions of yeyo, python and the platform they ran on.
+    """
+    results = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name in scales:
+            scale = SCALES[name]
+            with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+                results.extend(_bench_scale(Path(tmp), scale, repeat))
+            results.extend(
+                r._replace(scale=name) for r in bench_bump_derivation([scale.files], repeat)
+            )
+
+    return {
+        "yeyo_version": __version__,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": [r.to_dict() for r in results],
+    }
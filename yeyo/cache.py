@@ -0,0 +1,72 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Helpers for yeyo's cache directory, which lives next to the config file.
+
+Everything in the cache can be rebuilt, so it's safe to delete the directory at any time. It holds a
+.gitignore that ignores everything in it, so git never reports the cache as untracked.
+"""
+
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from yeyo import fsutil
+
+CACHE_DIR_NAME = ".yeyo.cache"
+
+# Objects kept in memory across commands by a long running process, see `yeyo serve`. None means
+# nothing is kept, which is the case for a single command.
+_memory: Optional[Dict[Tuple[str, str], Any]] = None
+
+
+def cache_path(config_path: Path, name: str) -> Path:
+    """Return the path of the cache file called name for the config at config_path."""
+    return Path(config_path).parent / CACHE_DIR_NAME / name
+
+
+def keep_in_memory(enabled: bool = True):
+    """Start, or with enabled False stop, keeping remembered objects for the life of the process."""
+    global _memory
+    _memory = {} if enabled else None
+
+
+def recall(kind: str, p: Path) -> Optional[Any]:
+    """Return the object of kind remembered for the path p, if it's being kept in memory."""
+    if _memory is None:
+        return None
+    return _memory.get((kind, str(Path(p).resolve())))
+
+
+def remember(kind: str, p: Path, obj: Any):
+    """
+    Remember obj as the object of kind for the path p, if objects are being kept in memory.
+
+    Whoever recalls obj must check it's still up to date with what's on disk.
+    """
+    if _memory is not None:
+        _memory[(kind, str(Path(p).resolve()))] = obj
+
+
+def ensure_cache_dir(directory: Path):
+    """Create the cache directory, or another of yeyo's, along with a .gitignore that hides it."""
+    if not directory.is_dir():
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / ".gitignore").write_text("*\n")
+
+
+def write(p: Path, data: bytes) -> bool:
+    """
+    Write data to the cache file at p, atomically so readers never see a partial file.
+
+    Returns False if the file couldn't be written. The cache is only an optimization, e.g. the
+    directory may be read-only, so failing to write it must never fail a command.
+    """
+    try:
+        ensure_cache_dir(p.parent)
+        fsutil.write_atomic(p, data)
+    except OSError:
+        return False
+    return True
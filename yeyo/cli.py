@@ -2,22 +2,40 @@
 # All Rights Reserved
 """Defines the command line interface."""
 
+import contextlib
 import functools
 import json
+import os
+import shlex
 from pathlib import Path
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import TextIO
+from typing import Tuple
 
 import click
-import py
-from jinja2 import Template
-from semver import parse_version_info
 
 from yeyo import BANNER
 from yeyo import __version__
+from yeyo import cache
+from yeyo import metrics
+from yeyo import registry
+from yeyo import rewrite
+from yeyo import templates
+from yeyo import walk
 from yeyo.config import DEFAULT_COMMIT_TEMPLATE
 from yeyo.config import DEFAULT_CONFIG_PATH
 from yeyo.config import DEFAULT_TAG_TEMPLATE
+from yeyo.config import LITERAL_TEMPLATE
+from yeyo.config import REGEX_TEMPLATE
 from yeyo.config import YEYO_VERSION_TEMPLATE
+from yeyo.config import FileVersion
 from yeyo.config import YeyoConfig
+from yeyo.config import YeyoUpdateException
+from yeyo.config import git_repo
+from yeyo.status import DEFAULT_DIRTY_SCOPE
+from yeyo.status import DIRTY_SCOPES
 
 STARTING_VERSION = "0.0.0-dev.1"
 STARTING_FILE = Path("VERSION")
@@ -36,6 +54,17 @@ def with_git(f):
         default=False,
         help="If True, bump, then commit the changed files and tag the repo.",
     )
+    @click.option(
+        "--dirty-scope",
+        type=click.Choice(DIRTY_SCOPES),
+        default=DEFAULT_DIRTY_SCOPE,
+        envvar="YEYO_DIRTY_SCOPE",
+        show_default=True,
+        help=(
+            "How much of the repo to check for other changes before committing: tracked files "
+            "only, the directories of the config and tracked files, or everything."
+        ),
+    )
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
         return f(*args, **kwargs)
@@ -73,9 +102,99 @@ def with_dryrun(f):
     return wrapper
 
 
+def with_jobs(f):
+    """Wrap a command to add the jobs option, which bounds how many files are rewritten at once."""
+
+    @click.option(
+        "-j",
+        "--jobs",
+        default=None,
+        type=click.IntRange(min=1),
+        help="The number of files to rewrite concurrently. Defaults to the thread pool default.",
+    )
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def with_plan(f):
+    """Wrap a command to add the plan option, which writes the bump's scan to a file to apply."""
+
+    @click.option(
+        "--plan",
+        default=None,
+        type=click.Path(dir_okay=False, writable=True),
+        help=(
+            "Write the changes as an NDJSON plan to this file instead of making them, see "
+            "`yeyo apply`. Implies --dryrun."
+        ),
+    )
+    @functools.wraps(f)
+    def wrapper(*args, plan, **kwargs):
+        return f(*args, plan=Path(plan) if plan is not None else None, **kwargs)
+
+    return wrapper
+
+
+def with_from_file(f):
+    """Wrap a command to add the from-file option, for reading many file entries at once."""
+
+    @click.option(
+        "--from-file",
+        type=click.File("r"),
+        default=None,
+        help=(
+            "Also read entries from this file, one per line, `-` reads from stdin. Each line is a "
+            "path, optionally followed by `-t TEMPLATE` to give it its own template."
+        ),
+    )
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def _emit_metrics(
+    recorder: metrics.Recorder,
+    command_phase: contextlib.ExitStack,
+    timings: bool,
+    metrics_json: Optional[str],
+):
+    command_phase.close()
+    metrics.disable()
+
+    report = json.dumps(recorder.to_dict(), indent=2)
+    if timings:
+        click.echo(report, err=True)
+    if metrics_json is not None:
+        with open(metrics_json, "w") as out_handler:
+            out_handler.write(report + "\n")
+
+
 @click.group()
+@click.option(
+    "--template-cache-dir",
+    envvar="YEYO_TEMPLATE_CACHE_DIR",
+    default=None,
+    type=click.Path(file_okay=False),
+    help="If set, cache the compiled tag and commit templates in this directory across runs.",
+)
+@click.option(
+    "--timings/--no-timings",
+    default=False,
+    help="If True, print the time of each phase and I/O counters to stderr as JSON.",
+)
+@click.option(
+    "--metrics-json",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the time of each phase and I/O counters to this file as JSON.",
+)
 @click.pass_context
-def main(ctx):
+def main(ctx, template_cache_dir, timings, metrics_json):
     """
     Hey-o for yeyo.
 
@@ -92,6 +211,16 @@ def main(ctx):
     ctx.ensure_object(dict)
     ctx.obj["config_path"] = Path(DEFAULT_CONFIG_PATH)
 
+    templates.configure(Path(template_cache_dir) if template_cache_dir else None)
+
+    if timings or metrics_json is not None:
+        recorder = metrics.enable()
+        command_phase = contextlib.ExitStack()
+        command_phase.enter_context(recorder.phase("command"))
+        ctx.call_on_close(
+            functools.partial(_emit_metrics, recorder, command_phase, timings, metrics_json)
+        )
+
 
 @main.command()
 def banner():
@@ -131,6 +260,74 @@ def tag(ctx, **kwargs):
         ctx.obj["yc"].tag_repo()
 
 
+@git.command()
+@click.option(
+    "--dirty-scope",
+    type=click.Choice(DIRTY_SCOPES),
+    default=DEFAULT_DIRTY_SCOPE,
+    envvar="YEYO_DIRTY_SCOPE",
+    show_default=True,
+    help="How much of the repo to check for changes, see `yeyo bump patch --help`.",
+)
+@click.pass_context
+def status(ctx, dirty_scope):
+    """
+    List the changes that would stop a bump from committing, as JSON lines.
+
+    Changes to the config and the tracked files are expected and aren't listed. Exits with 1 if
+    there are other changes.
+    """
+    dirty_files = ctx.obj["yc"].dirty_files(scope=dirty_scope, config_path=ctx.obj["config_path"])
+    for dirty_file in dirty_files:
+        click.echo(json.dumps(dirty_file.to_dict()))
+    if dirty_files:
+        ctx.exit(1)
+
+
+@git.command()
+@click.option(
+    "--sorted/--latest",
+    "sort",
+    default=True,
+    help="List every matching tag sorted by version, or only the one with the latest version.",
+)
+@click.option("--stable/--all", default=False, help="If True, skip prereleases.")
+@click.option(
+    "--range",
+    "version_range",
+    default=None,
+    help='Only the versions in this comma separated range, e.g. ">=1.2.0,<2.0.0".',
+)
+@click.option("--reverse/--no-reverse", default=False, help="If True, sort newest first.")
+@click.pass_context
+def versions(ctx, sort, stable, version_range, reverse):
+    """
+    List the tags made from the tag template, sorted by their version.
+
+    Tags that don't match the tag template, or whose version isn't a semantic version, are skipped.
+    """
+    from yeyo import refs
+    from yeyo import versions as yeyo_versions
+
+    try:
+        tags = refs.tag_names_for_config(ctx.obj["config_path"])
+    except refs.YeyoNoRepoException as e:
+        raise click.ClickException(str(e))
+
+    try:
+        pattern = yeyo_versions.tag_pattern(ctx.obj["yc"].tag_template)
+        kwargs = {"pattern": pattern, "stable": stable, "version_range": version_range}
+        selected = (
+            yeyo_versions.select(tags, **kwargs) if sort else [yeyo_versions.latest(tags, **kwargs)]
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    for tag in reversed(selected) if reverse else selected:
+        if tag is not None:
+            click.echo(tag)
+
+
 @main.command()
 def version():
     """Print yeyo's version and exit."""
@@ -145,9 +342,37 @@ def dev():
 @dev.command()
 def test():
     """Run yeyo's tests through pytest."""
+    import py
+
     py.test.cmdline.main(["yeyo"])
 
 
+@dev.command(name="bench")
+@click.option(
+    "-s",
+    "--scale",
+    "scales",
+    multiple=True,
+    help="The synthetic repos to run against: small, medium or large. Defaults to small, medium.",
+)
+@click.option("-r", "--repeat", type=click.IntRange(min=1), help="Runs per bench, defaults to 5.")
+@click.option(
+    "-o", "--output", type=click.File("w"), default="-", help="Write the JSON results to this file."
+)
+def bench_command(scales, repeat, output):
+    """Benchmark yeyo against synthetic repos, writing the best time of each benchmark as JSON."""
+    from yeyo import bench
+
+    unknown = sorted(set(scales).difference(bench.SCALES))
+    if unknown:
+        raise click.BadParameter(
+            f"Unknown scales {unknown}, choose from {sorted(bench.SCALES)}.", param_hint="--scale"
+        )
+
+    report = bench.run_suite(scales or bench.DEFAULT_SCALES, repeat or bench.DEFAULT_REPEAT)
+    output.write(json.dumps(report, indent=2) + "\n")
+
+
 @main.command()
 @click.option("--starting-version", default=STARTING_VERSION, help="The version to start with.")
 @click.option(
@@ -188,6 +413,8 @@ def init(ctx, starting_version, tag_template, commit_template, default):
     * Adding or removing files, see: $ yeyo files --help
     * Version bumping, see: $ yeyo bump --help
     """
+    from semver import parse_version_info
+
     p = YeyoConfig(
         version=parse_version_info(starting_version),
         tag_template=tag_template,
@@ -227,6 +454,8 @@ def bump(ctx):
 @with_prerel
 @with_dryrun
 @with_git
+@with_jobs
+@with_plan
 def major(ctx, **kwargs):
     """Bump the major part of the version: X.0.0."""
     yc = ctx.obj["yc"]
@@ -241,6 +470,9 @@ def major(ctx, **kwargs):
         kwargs["dryrun"],
         kwargs["git_tag_before"],
         kwargs["git_tag_after"],
+        kwargs["jobs"],
+        kwargs["plan"],
+        kwargs["dirty_scope"],
     )
 
 
@@ -249,6 +481,8 @@ def major(ctx, **kwargs):
 @with_prerel
 @with_dryrun
 @with_git
+@with_jobs
+@with_plan
 def minor(ctx, **kwargs):
     """Bump the minor part of the version: 0.X.0."""
     yc = ctx.obj["yc"]
@@ -263,6 +497,9 @@ def minor(ctx, **kwargs):
         kwargs["dryrun"],
         kwargs["git_tag_before"],
         kwargs["git_tag_after"],
+        kwargs["jobs"],
+        kwargs["plan"],
+        kwargs["dirty_scope"],
     )
 
 
@@ -271,6 +508,8 @@ def minor(ctx, **kwargs):
 @with_prerel
 @with_dryrun
 @with_git
+@with_jobs
+@with_plan
 def patch(ctx, **kwargs):
     """Bump the patch part of the version: 0.0.X."""
     yc = ctx.obj["yc"]
@@ -285,26 +524,47 @@ def patch(ctx, **kwargs):
         kwargs["dryrun"],
         kwargs["git_tag_before"],
         kwargs["git_tag_after"],
+        kwargs["jobs"],
+        kwargs["plan"],
+        kwargs["dirty_scope"],
     )
 
 
 @bump.command()
 @click.option("-p", "--prerelease_token", type=click.Choice(["dev", "a", "b", "rc"]), default=None)
+@click.option(
+    "--avoid-existing-tags/--allow-existing-tags",
+    default=False,
+    help="If True, skip to the first prerelease number whose tag doesn't exist yet.",
+)
 @click.pass_context
 @with_prerel
 @with_dryrun
 @with_git
-def prerelease(ctx, prerelease_token, **kwargs):
+@with_jobs
+@with_plan
+def prerelease(ctx, prerelease_token, avoid_existing_tags, **kwargs):
     """Bump the prerelease part of the version."""
     yc = ctx.obj["yc"]
 
     new_config = yc.bump_prerelease(prerelease_token=prerelease_token)
+    if avoid_existing_tags:
+        from yeyo import refs
+
+        try:
+            tags = refs.tag_names_for_config(ctx.obj["config_path"])
+        except refs.YeyoNoRepoException as e:
+            raise click.ClickException(str(e))
+        new_config = new_config.avoid_existing_tags(tags)
     new_config.update(
         yc,
         ctx.obj["config_path"],
         kwargs["dryrun"],
         kwargs["git_tag_before"],
         kwargs["git_tag_after"],
+        kwargs["jobs"],
+        kwargs["plan"],
+        kwargs["dirty_scope"],
     )
 
 
@@ -312,6 +572,8 @@ def prerelease(ctx, prerelease_token, **kwargs):
 @click.pass_context
 @with_dryrun
 @with_git
+@with_jobs
+@with_plan
 def finalize(ctx, **kwargs):
     """Finalize the current version by dropping any prerelease information."""
     yc = ctx.obj["yc"]
@@ -323,14 +585,141 @@ def finalize(ctx, **kwargs):
         kwargs["dryrun"],
         kwargs["git_tag_before"],
         kwargs["git_tag_after"],
+        kwargs["jobs"],
+        kwargs["plan"],
+        kwargs["dirty_scope"],
     )
 
 
+@main.command()
+@click.argument("plan", type=click.Path(exists=True, dir_okay=False))
+@click.pass_context
+@with_git
+@with_jobs
+def apply(ctx, plan, **kwargs):
+    """
+    Apply a plan written by `yeyo bump ... --plan`, without scanning the files again.
+
+    Nothing is changed if the config, or any file in the plan, changed since the plan was made.
+
+    \b
+    $ yeyo bump minor --plan bump.ndjson
+    $ yeyo apply bump.ndjson
+    """
+    from yeyo.planfile import YeyoPlanException
+
+    try:
+        YeyoConfig.apply(
+            Path(plan),
+            ctx.obj["config_path"],
+            kwargs["git_tag_before"],
+            kwargs["git_tag_after"],
+            kwargs["jobs"],
+            kwargs["dirty_scope"],
+        )
+    except (YeyoUpdateException, YeyoPlanException) as e:
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.option(
+    "--rollback/--rollforward",
+    default=False,
+    help="Undo the interrupted bump, or finish it. Defaults to finishing it.",
+)
+@click.pass_context
+def recover(ctx, rollback):
+    """
+    Recover from a bump that was interrupted while replacing the files.
+
+    A bump replaces all of the files and the config, or none of them. If it's interrupted part way
+    through, e.g. by a crash, the bump's journal is left next to the config and other bumps refuse
+    to run until this command either finishes the bump or undoes it.
+    """
+    config = YeyoConfig.recover(ctx.obj["config_path"], rollback)
+    if config is None:
+        click.echo("There is no interrupted bump to recover.")
+    else:
+        click.echo(f"Recovered, the version is {config.version_string}.")
+
+
+def with_socket(f):
+    """Wrap a command to add the socket option, the Unix socket a yeyo server listens on."""
+
+    @click.option(
+        "--socket",
+        "socket_path",
+        envvar="YEYO_SOCKET",
+        default=None,
+        type=click.Path(dir_okay=False),
+        help="The server's Unix socket. Defaults to serve.sock in the cache next to the config.",
+    )
+    @functools.wraps(f)
+    def wrapper(*args, socket_path, **kwargs):
+        return f(*args, socket_path=Path(socket_path) if socket_path else None, **kwargs)
+
+    return wrapper
+
+
+@main.command()
+@with_socket
+@click.pass_context
+def serve(ctx, socket_path):
+    """
+    Serve bump, files, git and history commands from one long running process.
+
+    The server keeps the parsed config, compiled templates, file indexes and git repo in memory
+    between commands, and picks up any changes to them on disk. Commands are sent with `yeyo
+    client`, e.g.
+
+    \b
+    $ yeyo serve &
+    $ yeyo client bump patch
+    """
+    from yeyo import server
+
+    if socket_path is None:
+        socket_path = server.default_socket_path(ctx.obj["config_path"])
+        cache.ensure_cache_dir(socket_path.parent)
+
+    click.echo(f"Serving on {socket_path}.")
+    server.serve(socket_path)
+
+
+@main.command(context_settings={"ignore_unknown_options": True})
+@with_socket
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+@click.pass_context
+def client(ctx, socket_path, args):
+    """
+    Run a yeyo command through the server started by `yeyo serve`.
+
+    If no server is running, or the server doesn't run the command, it runs in this process instead.
+    """
+    from yeyo import server
+
+    if socket_path is None:
+        socket_path = server.default_socket_path(ctx.obj["config_path"])
+
+    argv = list(args)
+    response = server.request(socket_path, argv, os.getcwd()) if server.is_served(argv) else None
+    if response is None:
+        ctx.exit(main.main(args=argv, prog_name="yeyo", standalone_mode=False) or 0)
+
+    click.echo(response.stdout, nl=False)
+    click.echo(response.stderr, nl=False, err=True)
+    ctx.exit(response.exit_code)
+
+
 @main.group()
 @click.pass_context
 def files(ctx):
-    """Entrypoint for adding or removing files."""
-    ctx.obj["yc"] = YeyoConfig.from_yaml(ctx.obj["config_path"])
+    """
+    Entrypoint for adding or removing files.
+
+    If a .yeyo.d directory exists next to the config, the files are kept in a sharded registry in
+    that directory rather than in the config itself, see: $ yeyo files shard --help
+    """
 
 
 @files.command()
@@ -338,25 +727,89 @@ def files(ctx):
 @click.pass_context
 def ls(ctx, **kwargs):
     """List of the files present in yeyo's config."""
-    yc = ctx.obj["yc"]
+    yc = YeyoConfig.from_yaml(ctx.obj["config_path"])
     for f in yc.files:
         click.echo(str(f))
 
 
+def _read_entries(
+    paths: Iterable[str], template_string: str, from_file: Optional[TextIO]
+) -> List[Tuple[str, str]]:
+    """Collect the (path, template) entries from the arguments and the lines of from_file."""
+    entries = [(path, template_string) for path in paths]
+
+    if from_file is not None:
+        for line in from_file:
+            tokens = shlex.split(line, comments=True)
+            if not tokens:
+                continue
+
+            path, line_template = tokens[0], template_string
+            if len(tokens) == 3 and tokens[1] in ("-t", "--template_string"):
+                line_template = tokens[2]
+            elif len(tokens) != 1:
+                raise click.BadParameter(f"Unable to parse the entry: {line!r}.")
+            entries.append((path, line_template))
+
+    return entries
+
+
 @files.command()
 @click.pass_context
-@click.argument("path")
-def rm(ctx, path, **kwargs):
-    """Remove a file from yeyo's config."""
-    yc = ctx.obj["yc"]
+@click.argument("paths", nargs=-1)
+@with_from_file
+def rm(ctx, paths, from_file, **kwargs):
+    """
+    Remove one or more files from yeyo's config.
+
+    Paths can be globs, which are matched against the files in the config by the same rules as
+    `files add`, e.g.
+
+    $ yeyo files rm 'services/*/setup.py'
+
+    All of the files are removed with a single write of the config.
+    """
+    config_path = ctx.obj["config_path"]
+    sharded = registry.is_sharded(config_path)
+
+    removed = [path for path, _ in _read_entries(paths, YEYO_VERSION_TEMPLATE, from_file)]
+    globs = [path for path in removed if walk.is_pattern(path)]
+
+    yc = None
+    if globs or not sharded:
+        yc = YeyoConfig.from_yaml(config_path)
+        tracked = sorted(yc.string_files)
+        removed = [path for path in removed if not walk.is_pattern(path)]
+        for pattern in globs:
+            removed.extend(path for path in tracked if walk.match(pattern, path))
+
+    removed_paths = [Path(path) for path in removed]
+    if sharded:
+        registry.remove_paths(registry.registry_dir(config_path), map(str, removed_paths))
+    else:
+        yc.remove_files(removed_paths).to_json(config_path)
+
 
-    new_config = yc.remove_file(Path(path))
-    new_config.to_json(ctx.obj["config_path"])
+@files.command()
+@click.pass_context
+def shard(ctx):
+    """
+    Move the files into a sharded registry, in the .yeyo.d directory next to the config.
+
+    The registry has a shard per directory of tracked files, so adding or removing a file only
+    rewrites that directory's shard instead of the whole config. This helps when tracking a great
+    many files.
+    """
+    config_path = ctx.obj["config_path"]
+
+    yc = YeyoConfig.from_yaml(config_path)
+    registry.registry_dir(config_path).mkdir(exist_ok=True)
+    yc.to_yaml(config_path)
 
 
 @files.command()
 @click.pass_context
-@click.argument("path")
+@click.argument("paths", nargs=-1)
 @click.option(
     "-t",
     "--template_string",
@@ -364,8 +817,26 @@ def rm(ctx, path, **kwargs):
     type=str,
     help="The template string to find and replace with.",
 )
-def add(ctx, path, template_string):
-    """Add a file path and, optionally, an associated search string.
+@click.option(
+    "--pattern/--no-pattern",
+    default=False,
+    help=(
+        "If True, keep globs as patterns that are expanded on every bump, skipping files ignored "
+        "by git, rather than expanding them now."
+    ),
+)
+@click.option(
+    "--regex/--literal",
+    default=False,
+    help=(
+        "If True, the template strings are regular expressions in which yeyo_version matches the "
+        "version, and only the version is replaced."
+    ),
+)
+@with_from_file
+def add(ctx, paths, template_string, pattern, regex, from_file):
+    """
+    Add file paths and, optionally, an associated search string.
 
     Imagine we were starting with the same .yeyo.json as the init example -- so we've just run
     `yeyo init`. Now we want to add a python module to yeyo's tracking, and only replace cases where
@@ -395,11 +866,234 @@ def add(ctx, path, template_string):
     $ yeyo bump minor --dryrun
     Replacing line: __version__ = "0.0.0-dev.1" with __version__ = "0.1.0" in file __init__.py.
     ...
+
+    Many files can be added at once, from the arguments, a file or stdin, and paths can be globs
+    which are expanded against the working directory. All of the files are added with a single
+    write of the config. In a glob, `*` and `?` don't match a `/`, a `**` segment matches any number
+    of directories, and only regular files which git doesn't ignore are added. A glob that matches
+    no files is an error.
+
+    With --pattern, globs are added as is and expanded each time the version is bumped, so files
+    created later are picked up too.
+
+    \b
+    $ yeyo files add 'services/*/setup.py' VERSION
+    $ find . -name package.json | yeyo files add --from-file - -t '"version": "yeyo_version"'
+
+    With --regex, one template can match the version in varying contexts, e.g. any spacing and
+    quoting, or both == and >= pins, and the text around the version is left as it was.
+
+    \b
+    $ yeyo files add setup.py --regex -t 'version\\s*=\\s*"yeyo_version"'
+    $ yeyo files add requirements.txt --regex -t 'yeyo(?:==|>=)yeyo_version'
     """
-    yc = ctx.obj["yc"]
+    config_path = ctx.obj["config_path"]
+    template_type = REGEX_TEMPLATE if regex else LITERAL_TEMPLATE
+    directory_index = walk.DirectoryIndex(Path("."))
+
+    file_versions = []
+    for path, entry_template in _read_entries(paths, template_string, from_file):
+        if regex:
+            try:
+                rewrite.compile_template(entry_template)
+            except ValueError as e:
+                raise click.BadParameter(str(e))
+
+        if walk.is_pattern(path) and not pattern:
+            expanded = [p for p in directory_index.expand(path) if p.is_file()]
+            if not expanded:
+                raise click.BadParameter(f"No files match {path!r}.")
+        else:
+            expanded = [Path(path)]
+        file_versions.extend(FileVersion(p, entry_template, template_type) for p in expanded)
+
+    if registry.is_sharded(config_path):
+        registry.add_entries(
+            registry.registry_dir(config_path), [fv.to_dict() for fv in file_versions]
+        )
+        return
+
+    yc = YeyoConfig.from_yaml(config_path)
+    yc.add_files(file_versions).to_json(config_path)
+
+
+@main.group()
+@click.pass_context
+def history(ctx):
+    """
+    Entrypoint for querying the versions the config went through.
+
+    Every bump appends its version, along with the tag, commit and changed files, to a log in the
+    cache directory. Bumps made before the log existed can be backfilled from git with:
+
+    \b
+    $ yeyo history rebuild
+    """
+    from yeyo.history import History
+
+    ctx.obj["history"] = History.for_config(ctx.obj["config_path"])
+
+
+def _echo_entry(entry):
+    click.echo(json.dumps(entry.to_dict(), sort_keys=True))
+
 
-    new_config = yc.add_file(Path(path), template_string)
-    new_config.to_json(ctx.obj["config_path"])
+@history.command(name="ls")
+@click.pass_context
+def history_ls(ctx):
+    """List the versions in the history, oldest first, as JSON lines."""
+    for entry in ctx.obj["history"].entries():
+        _echo_entry(entry)
+
+
+@history.command()
+@click.argument("query")
+@click.pass_context
+def show(ctx, query):
+    """
+    Show the history entry for a version, tag or commit.
+
+    QUERY is looked up as a version first, then as a tag, then as a possibly abbreviated commit sha.
+    """
+    yeyo_history = ctx.obj["history"]
+    try:
+        entry = (
+            yeyo_history.by_version(query)
+            or yeyo_history.by_tag(query)
+            or yeyo_history.by_commit(query)
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    if entry is None:
+        raise click.ClickException(f"No version, tag or commit in the history matches {query}.")
+    _echo_entry(entry)
+
+
+@history.command()
+@click.argument("rev", default="HEAD")
+@click.pass_context
+def at(ctx, rev):
+    """Show the history entry of the version the repo was at as of the git revision REV."""
+    entry = ctx.obj["history"].at(git_repo(), rev)
+    if entry is None:
+        raise click.ClickException(f"No commit in the history of {rev} is in yeyo's history.")
+    _echo_entry(entry)
+
+
+@history.command()
+@click.pass_context
+def rebuild(ctx):
+    """Backfill the history from the commits that changed the version in the config."""
+    found = ctx.obj["history"].rebuild(git_repo(), ctx.obj["config_path"])
+    click.echo(f"Found {found} versions in git.")
+
+
+@main.group()
+@click.option(
+    "--root",
+    default=".",
+    type=click.Path(exists=True, file_okay=False),
+    help="The directory to look for projects under.",
+)
+@click.option(
+    "-p",
+    "--project",
+    "patterns",
+    multiple=True,
+    help=(
+        "Only the projects whose directory, relative to the root, matches this glob. May be given "
+        "more than once."
+    ),
+)
+@click.pass_context
+def workspace(ctx, root, patterns):
+    """
+    Entrypoint for running commands across every project of a monorepo.
+
+    A project is a directory under the root with a .yeyo.yaml, outside of the directories git
+    ignores. The directory listings are cached, so finding the projects again is cheap.
+    """
+    from yeyo import workspace as yeyo_workspace
+
+    ctx.obj["root"] = Path(root)
+    ctx.obj["projects"] = yeyo_workspace.select(yeyo_workspace.discover(Path(root)), patterns)
+
+
+def _echo_project_result(result):
+    click.echo(f"==> {result.project} <==")
+    click.echo(result.response.stdout, nl=False)
+    click.echo(result.response.stderr, nl=False, err=True)
+
+
+@workspace.command(name="ls")
+@click.pass_context
+def workspace_ls(ctx):
+    """List the directories of the projects, relative to the root."""
+    for project in ctx.obj["projects"]:
+        click.echo(str(project))
+
+
+@workspace.command(
+    context_settings={"ignore_unknown_options": True, "allow_interspersed_args": False}
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=None,
+    type=click.IntRange(min=1),
+    help="The number of projects to run at once, each in its own process. Defaults to the CPUs.",
+)
+@click.argument("args", nargs=-1, required=True, type=click.UNPROCESSED)
+@click.pass_context
+def run(ctx, jobs, args):
+    """
+    Run a bump, `files ls` or `git render-*` command in every project, in parallel.
+
+    Each project's output is printed after a `==> project <==` header, in the order of the projects,
+    and a project that fails doesn't stop the others. The exit code is 1 if any of them failed.
+
+    The workers don't touch git, the tags and commits of --git-tag-before and --git-tag-after are
+    made for every bumped project afterwards, one project at a time, e.g.
+
+    \b
+    $ yeyo workspace run bump patch --git-tag-after
+    $ yeyo workspace -p 'services/*' run -j 8 files ls
+    """
+    from yeyo import workspace as yeyo_workspace
+    from yeyo.config import YeyoDirtyRepoException
+
+    argv = list(args)
+    if not yeyo_workspace.is_workspace_command(argv):
+        commands = ", ".join(" ".join(c) for c in yeyo_workspace.WORKSPACE_COMMANDS)
+        raise click.UsageError(f"Only these commands run across a workspace: {commands}.")
+
+    argv, git_options = yeyo_workspace.split_git_options(argv)
+    root, projects = ctx.obj["root"], ctx.obj["projects"]
+
+    results = []
+    for result in yeyo_workspace.run(root, projects, argv, git_options, jobs):
+        _echo_project_result(result)
+        results.append(result)
+    failed = [result.project for result in results if result.response.exit_code != 0]
+
+    if git_options.deferred:
+        try:
+            for result in yeyo_workspace.commit_and_tag(root, results, git_options):
+                _echo_project_result(result)
+                if result.response.exit_code != 0:
+                    failed.append(result.project)
+        except YeyoDirtyRepoException as e:
+            raise click.ClickException(str(e))
+
+    if failed:
+        click.echo(
+            f"Failed in {len(failed)} of {len(projects)} projects: "
+            + ", ".join(str(project) for project in sorted(failed))
+            + ".",
+            err=True,
+        )
+        ctx.exit(1)
 
 
 _USAGE = """## Usage
@@ -436,10 +1130,8 @@ How to (mis)use yeyo.
 @click.pass_context
 def print_usage(ctx):
     """Echo the usage combined into a markdown format."""
-    groups = [files, bump, git]
+    groups = [files, bump, git, history, workspace]
     commands = [init, version]
 
-    t = Template(_USAGE)
-
     new_ctx = click.core.Context
-    click.echo(t.render(ctx=new_ctx, groups=groups, commands=commands))
+    click.echo(templates.render(_USAGE, ctx=new_ctx, groups=groups, commands=commands))
@@ -2,54 +2,181 @@
 # All Rights Reserved
 """Contains the YeyoConfig object."""
 
-import copy
-import fileinput
 import json
+import re
+from collections import defaultdict
 from io import StringIO
 from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
 from typing import NamedTuple
 from typing import Optional
 from typing import Set
-
-import git
-import semver
-from jinja2 import Template
-from ruamel import yaml
+from typing import Tuple
+from typing import Union
+
+from yeyo import cache
+from yeyo import fsutil
+from yeyo import history
+from yeyo import journal
+from yeyo import loader
+from yeyo import metrics
+from yeyo import planfile
+from yeyo import plumbing
+from yeyo import registry
+from yeyo import rewrite
+from yeyo import status
+from yeyo import templates
+from yeyo import walk
+from yeyo.index import OccurrenceIndex
+from yeyo.walk import DirectoryIndex
+
+if TYPE_CHECKING:
+    import git
+    import semver
+
+# The heavier dependencies, GitPython, ruamel.yaml and semver, are imported in the methods that use
+# them so that commands which don't need them start quickly. jinja2 is imported by yeyo.templates.
 
 YEYO_VERSION_TEMPLATE = "yeyo_version"
 DEFAULT_TAG_TEMPLATE = f"{{{{ {YEYO_VERSION_TEMPLATE} }}}}"
 DEFAULT_COMMIT_TEMPLATE = f"{{{{ {YEYO_VERSION_TEMPLATE} }}}}"
 DEFAULT_CONFIG_PATH = ".yeyo.yaml"
 
+# The types of match template, see FileVersion.
+LITERAL_TEMPLATE = "literal"
+REGEX_TEMPLATE = "regex"
+TEMPLATE_TYPES = (LITERAL_TEMPLATE, REGEX_TEMPLATE)
+
 
 class YeyoDirtyRepoException(Exception):
     """Raised when more files than just the tracked changes are raised."""
 
+    def __init__(self, message: str, dirty_files: Iterable["status.DirtyFile"] = ()):
+        """Initialize the exception with the files that made the repo dirty."""
+        super().__init__(message)
+        self.dirty_files = list(dirty_files)
+
+
+class YeyoUpdateException(Exception):
+    """Raised when one or more of the tracked files could not be updated."""
+
+
+def _raise_if_interrupted(config_path: Path):
+    if journal.journal_path(config_path).exists():
+        raise YeyoUpdateException(
+            f"A bump of {config_path} was interrupted, run `yeyo recover` before bumping again."
+        )
+
+
+def config_paths(config_path: Path = Path(DEFAULT_CONFIG_PATH)) -> List[Path]:
+    """Return the paths of the config, and of its shards if it's sharded."""
+    config_paths = [Path(config_path)]
+    if registry.is_sharded(config_path):
+        config_paths.extend(registry.shard_paths(registry.registry_dir(config_path)))
+    return config_paths
+
+
+def git_repo():
+    """Open the repo in the current directory, reusing it if it's kept in memory."""
+    repo = cache.recall("git", Path("."))
+    if repo is None:
+        with metrics.phase("git.open"):
+            import git
+
+            repo = git.Repo(".")
+        cache.remember("git", Path("."), repo)
+    return repo
+
+
+def git_commit_and_tag(
+    repo: "git.Repo", commit_paths: List[str], commit_string: str, tag_string: str
+) -> str:
+    """
+    Commit commit_paths to repo with commit_string, tag the commit, and return its sha.
+
+    The commit and tag are written directly, see yeyo.plumbing, unless the repo needs GitPython.
+    Then the paths are added by git, rather than GitPython, so git's attributes and filters apply.
+    """
+    try:
+        with metrics.phase("git.plumbing"):
+            return plumbing.commit_and_tag(repo, commit_paths, commit_string, tag_string)
+    except plumbing.YeyoPlumbingUnsupported:
+        with metrics.phase("git.commit"):
+            repo.git.add("--", *commit_paths)
+            commit_sha = repo.index.commit(commit_string).hexsha
+        with metrics.phase("git.tag"):
+            repo.create_tag(tag_string)
+        return commit_sha
+
 
 class FileVersion(NamedTuple):
-    """Contains a file_path and a template to use for search and replace."""
+    """
+    Contains a file_path and a template to use for search and replace.
+
+    The template is literal text by default. With the regex template type it's a regular expression
+    in which yeyo_version matches the version, and only the version is replaced.
+    """
 
     file_path: Path
     match_template: str
+    template_type: str = LITERAL_TEMPLATE
+
+    @property
+    def is_pattern(self) -> bool:
+        """Return True if file_path is a glob pattern, rather than the path of a single file."""
+        return walk.is_pattern(str(self.file_path))
+
+    def to_dict(self):
+        """Convert the file version into its dict representation in the config."""
+        d = {"file_path": str(self.file_path), "match_template": self.match_template}
+        if self.template_type != LITERAL_TEMPLATE:
+            d["template_type"] = self.template_type
+        return d
 
-    def replace(self, s: str, v1: semver.VersionInfo, v2: semver.VersionInfo) -> str:
+    @classmethod
+    def from_dict(cls, obj) -> "FileVersion":
+        """Create a file version from its dict representation in the config."""
+        return cls(
+            Path(obj["file_path"]),
+            obj["match_template"],
+            obj.get("template_type", LITERAL_TEMPLATE),
+        )
+
+    def replacement(self, v1: str, v2: str) -> Union[rewrite.Replacement, rewrite.RegexTemplate]:
+        """Return the (search, replace) strings, or regex template, changing version v1 into v2."""
+        if self.template_type == REGEX_TEMPLATE:
+            return rewrite.RegexTemplate(self.match_template, v1, v2)
+
+        search_string = self.match_template.replace(YEYO_VERSION_TEMPLATE, v1)
+        replace_string = self.match_template.replace(YEYO_VERSION_TEMPLATE, v2)
+        return search_string, replace_string
+
+    def replace(self, s: str, v1: "semver.VersionInfo", v2: "semver.VersionInfo") -> str:
         """Given the input string, s, use the template to find v1 and replace it with v2."""
+        if self.template_type == REGEX_TEMPLATE:
+            plan = rewrite.compile_plan({self.file_path: [self.replacement(str(v1), str(v2))]})[0]
+            return rewrite.patch_bytes(plan, s.encode()).decode()
 
-        search_string = self.match_template.replace(YEYO_VERSION_TEMPLATE, str(v1))
-        replace_string = self.match_template.replace(YEYO_VERSION_TEMPLATE, str(v2))
+        search_string, replace_string = self.replacement(str(v1), str(v2))
         return s.replace(search_string, replace_string)
 
 
 class YeyoConfig(NamedTuple):
     """The base Yeyo config object."""
 
-    version: semver.VersionInfo
+    version: "semver.VersionInfo"
     tag_template: str = DEFAULT_TAG_TEMPLATE
     commit_template: str = DEFAULT_COMMIT_TEMPLATE
-    files: Optional[Set[FileVersion]] = set()
+    files: FrozenSet[FileVersion] = frozenset()
 
     def __repr__(self):
         """Return the string representation."""
+        from ruamel import yaml
+
         sio = StringIO()
         yaml.round_trip_dump(self.to_dict(), sio, default_flow_style=False)
         return sio.getvalue()
@@ -60,21 +187,17 @@ class YeyoConfig(NamedTuple):
             "version": self.version_string,
             "tag_template": self.tag_template,
             "commit_template": self.commit_template,
-            "files": [
-                {"file_path": str(p.file_path), "match_template": p.match_template}
-                for p in sorted(self.files, key=lambda x: x.file_path)
-            ],
+            "files": [p.to_dict() for p in sorted(self.files, key=lambda x: x.file_path)],
         }
 
     @classmethod
     def from_dict(cls, obj):
         """Given the dict obj, parse it into the a YeyoConfig."""
+        import semver
+
         version = semver.parse_version_info(obj["version"])
 
-        files = []
-        for fv in obj["files"]:
-            files.append(FileVersion(Path(fv["file_path"]), fv["match_template"]))
-        files = set(files)
+        files = frozenset(FileVersion.from_dict(fv) for fv in obj["files"])
 
         tag_template = obj.get("tag_template", DEFAULT_TAG_TEMPLATE)
         commit_template = obj.get("commit_template", DEFAULT_COMMIT_TEMPLATE)
@@ -89,25 +212,34 @@ class YeyoConfig(NamedTuple):
 
     def remove_file(self, file_path: Path) -> "YeyoConfig":
         """Create a new config object with file_path removed from the files."""
-        file_versions = {fv for fv in self.files if fv.file_path != file_path}
-        return YeyoConfig(self.version, self.tag_template, self.commit_template, file_versions)
+        return self.remove_files([file_path])
 
     def add_file(self, file_path: Path, match_template: str) -> "YeyoConfig":
         """Create a new config object with file_path added to the files."""
-        file_copy = copy.copy(self.files)
-        file_copy.add(FileVersion(file_path, match_template))
+        return self.add_files([FileVersion(file_path, match_template)])
 
-        return YeyoConfig(self.version, self.tag_template, self.commit_template, file_copy)
+    def remove_files(self, file_paths: Iterable[Path]) -> "YeyoConfig":
+        """Create a new config object with all of file_paths removed from the files."""
+        removed = set(file_paths)
+        return self._replace(
+            files=frozenset(fv for fv in self.files if fv.file_path not in removed)
+        )
+
+    def add_files(self, file_versions: Iterable[FileVersion]) -> "YeyoConfig":
+        """Create a new config object with all of file_versions added to the files."""
+        return self._replace(files=self.files.union(file_versions))
 
     def get_templated_tag(self, **kwargs):
         """Render the tag template, kwargs are passed to the jinja template."""
-        t = Template(self.tag_template)
-        return t.render(yeyo_version=self.version_string, files=self.files, **kwargs)
+        return templates.render(
+            self.tag_template, yeyo_version=self.version_string, files=self.files, **kwargs
+        )
 
     def get_templated_commit(self, **kwargs):
         """Render the commit template, kwargs are passed to the jinja template."""
-        t = Template(self.commit_template)
-        return t.render(yeyo_version=self.version_string, files=self.files, **kwargs)
+        return templates.render(
+            self.commit_template, yeyo_version=self.version_string, files=self.files, **kwargs
+        )
 
     @classmethod
     def from_version_string(
@@ -115,17 +247,17 @@ class YeyoConfig(NamedTuple):
         version_string: str,
         tag_template: str,
         commit_template: str,
-        file_versions: Optional[Set[FileVersion]] = None,
+        file_versions: Optional[Iterable[FileVersion]] = None,
     ):
         """Create a YeyoConfig from a version string."""
+        import semver
 
-        if file_versions is None:
-            file_versions = set()
-
-        config = cls(semver.parse_version_info(version_string), tag_template, commit_template)
-        for f in file_versions:
-            config = config.add_file(f.file_path, f.match_template)
-        return config
+        return cls(
+            semver.parse_version_info(version_string),
+            tag_template,
+            commit_template,
+            frozenset(file_versions or ()),
+        )
 
     @classmethod
     def from_json(cls, p: Path):
@@ -141,34 +273,213 @@ class YeyoConfig(NamedTuple):
 
     @classmethod
     def from_yaml(cls, p: Path):
-        """Create a YeyoConfig from a yaml file."""
-        with open(p) as out_handler:
-            d = yaml.round_trip_load(out_handler)
+        """Create a YeyoConfig from a yaml file, using the parse cache when it's valid."""
+        with metrics.phase("config.load"):
+            d = loader.load_yaml(p)
+            if registry.is_sharded(p):
+                d = dict(
+                    d, files=d.get("files", []) + registry.load_entries(registry.registry_dir(p))
+                )
             return cls.from_dict(d)
 
     def to_yaml(self, p: Path):
-        """Write the YeyoConfig to a yaml file."""
-        with open(p, "w") as out_handler:
-            yaml.round_trip_dump(self.to_dict(), out_handler, default_flow_style=False)
-
-    def _update_files(self, old_yeyo_config: "YeyoConfig", dryrun: bool):
-        inplace = not dryrun
+        """Write the YeyoConfig to a yaml file, or to the sharded registry if there is one."""
+        with metrics.phase("config.write"):
+            d = self.to_dict()
+            if registry.is_sharded(p):
+                registry.sync(registry.registry_dir(p), d["files"])
+                d["files"] = []
+            loader.dump_yaml(d, p)
+
+    def _to_yaml_durably(self, p: Path, jobs: Optional[int] = None):
+        """
+        Write the config as to_yaml does, then flush it and its shards to disk in one batch.
+
+        A journal may only be finished once this returns, see yeyo.journal.
+        """
+        self.to_yaml(p)
+        paths = config_paths(p)
+        fsutil.fsync_files(paths, jobs)
+        directories = [path.parent for path in paths]
+        if registry.is_sharded(p):
+            directories.append(registry.registry_dir(p))
+        fsutil.fsync_dirs(directories)
+
+    def resolve_files(
+        self, directory_index: Optional[DirectoryIndex] = None
+    ) -> FrozenSet[FileVersion]:
+        """
+        Expand the files whose path is a glob pattern into the files that match it.
+
+        Patterns are expanded through directory_index, which skips the files ignored by git.
+        """
+        if not any(fv.is_pattern for fv in self.files):
+            return self.files
+
+        if directory_index is None:
+            directory_index = DirectoryIndex(Path("."))
+
+        resolved = set()
+        with metrics.phase("files.resolve"):
+            for fv in self.files:
+                if fv.is_pattern:
+                    matches = directory_index.expand(str(fv.file_path))
+                    resolved.update(fv._replace(file_path=p) for p in matches)
+                else:
+                    resolved.add(fv)
+        return frozenset(resolved)
+
+    def _compile_plan(
+        self, old_yeyo_config: "YeyoConfig", files: Optional[FrozenSet[FileVersion]] = None
+    ) -> List[rewrite.FilePlan]:
+        """Compile the replacements for this bump once, grouped so each file is rewritten once."""
+        old_version_string = old_yeyo_config.version_string
+        new_version_string = self.version_string
+
+        replacements: Dict[Path, List[Union[rewrite.Replacement, rewrite.RegexTemplate]]] = (
+            defaultdict(list)
+        )
+        for fv in self.files if files is None else files:
+            replacements[fv.file_path].append(
+                fv.replacement(old_version_string, new_version_string)
+            )
+        return rewrite.compile_plan(replacements)
 
-        for fv in self.files:
-            with fileinput.input(files=[str(fv.file_path)], inplace=inplace) as f:
-                for line in f:
+    def _scan_files(
+        self,
+        old_yeyo_config: "YeyoConfig",
+        jobs: Optional[int] = None,
+        occurrence_index: Optional[OccurrenceIndex] = None,
+        files: Optional[FrozenSet[FileVersion]] = None,
+        digest: bool = False,
+    ) -> Tuple[List[rewrite.FilePlan], List[rewrite.FileScan]]:
+        """
+        Scan the files for this bump, printing each change, without modifying them.
+
+        A file with regex templates that has no match is an error, since the templates were chosen
+        to match it, while a literal template not matching is the usual way of skipping a file.
+        """
+        plans = self._compile_plan(old_yeyo_config, files)
+        lookup = occurrence_index.lookup if occurrence_index is not None else None
+
+        errors = []
+        scans = []
+        with metrics.phase("files.scan"):
+            for plan, scan in zip(plans, rewrite.scan_files(plans, jobs, lookup, digest)):
+                for message in scan.messages:
+                    print(message)
+                if scan.error is not None:
+                    errors.append(f"{scan.file_path}: {scan.error}")
+                elif plan.regexes and not scan.spans:
+                    errors.append(f"{scan.file_path}: None of its regex templates match.")
+                scans.append(scan)
+
+        if errors:
+            raise YeyoUpdateException("Unable to scan files:\n" + "\n".join(errors))
+
+        return plans, scans
+
+    def _commit_files(
+        self,
+        old_yeyo_config: "YeyoConfig",
+        config_path: Path,
+        plans: List[rewrite.FilePlan],
+        matched: List[rewrite.FileScan],
+        jobs: Optional[int] = None,
+        occurrence_index: Optional[OccurrenceIndex] = None,
+    ):
+        """Replace the matched files and then the config as one transaction, see yeyo.journal."""
+        plans_by_path = {plan.file_path: plan for plan in plans}
+        finds = None
+        if occurrence_index is not None:
+            finds = [rewrite.next_pattern(plans_by_path[scan.file_path]) for scan in matched]
+        with metrics.phase("files.stage"):
+            staged_files = list(rewrite.stage_files(matched, jobs, finds))
+        errors = [f"{s.file_path}: {s.error}" for s in staged_files if s.error is not None]
+        if errors:
+            rewrite.discard_staged(staged_files)
+            raise YeyoUpdateException(
+                "Unable to update files, none were changed:\n" + "\n".join(errors)
+            )
 
-                    filename = fileinput.filename()
-                    new_line = fv.replace(line, old_yeyo_config.version, self.version)
+        try:
+            with metrics.phase("files.journal"):
+                bump_journal = journal.begin(
+                    config_path, old_yeyo_config.to_dict(), self.to_dict(), staged_files, jobs
+                )
+        except BaseException:
+            rewrite.discard_staged(staged_files)
+            raise
+
+        try:
+            with metrics.phase("files.commit"):
+                journal.commit(bump_journal)
+            self._to_yaml_durably(config_path, jobs)
+        except BaseException:
+            journal.rollback(bump_journal)
+            old_yeyo_config._to_yaml_durably(config_path, jobs)
+            journal.finish(bump_journal)
+            raise
+
+        journal.finish(bump_journal)
+
+        metrics.count("files_rewritten", len(staged_files))
+
+        if occurrence_index is not None:
+            with metrics.phase("index.record"):
+                for staged in staged_files:
+                    occurrence_index.record(plans_by_path[staged.file_path], staged)
+                occurrence_index.save()
+
+    def _rewrite_scans(
+        self,
+        old_yeyo_config: "YeyoConfig",
+        config_path: Path,
+        plans: List[rewrite.FilePlan],
+        scans: List[rewrite.FileScan],
+        dryrun: bool,
+        jobs: Optional[int] = None,
+        occurrence_index: Optional[OccurrenceIndex] = None,
+    ) -> List[Path]:
+        """
+        Rewrite the scanned files that had a match and then the config, unless it's a dryrun.
+
+        Returns the paths of the rewritten files.
+        """
+        matched = [scan for scan in scans if scan.spans]
+        metrics.count("files_untouched", len(scans) - len(matched))
+
+        rewritten = 0
+        if not dryrun:
+            self._commit_files(old_yeyo_config, config_path, plans, matched, jobs, occurrence_index)
+            rewritten = len(matched)
+
+        print(
+            f"Files matched: {len(matched)}, rewritten: {rewritten}, "
+            f"untouched: {len(scans) - len(matched)}."
+        )
+        return [scan.file_path for scan in matched] if rewritten else []
 
-                    if dryrun and old_yeyo_config.version_string in line:
-                        print(
-                            f"Replacing line: {line} with {new_line} in file {filename}.".replace(
-                                "\n", ""
-                            )
-                        )
-                    elif not dryrun:
-                        print(new_line, end="")
+    def _update_files(
+        self,
+        old_yeyo_config: "YeyoConfig",
+        config_path: Path,
+        dryrun: bool,
+        jobs: Optional[int] = None,
+        occurrence_index: Optional[OccurrenceIndex] = None,
+        files: Optional[FrozenSet[FileVersion]] = None,
+        plan_path: Optional[Path] = None,
+    ) -> List[Path]:
+        plans, scans = self._scan_files(
+            old_yeyo_config, jobs, occurrence_index, files, digest=plan_path is not None
+        )
+        if plan_path is not None:
+            planfile.write_plan(
+                plan_path, old_yeyo_config.version_string, self.to_dict(), plans, scans
+            )
+        return self._rewrite_scans(
+            old_yeyo_config, config_path, plans, scans, dryrun, jobs, occurrence_index
+        )
 
     def update(
         self,
@@ -177,13 +488,42 @@ class YeyoConfig(NamedTuple):
         dryrun: bool = False,
         git_tag_before: bool = False,
         git_tag_after: bool = False,
+        jobs: Optional[int] = None,
+        plan_path: Optional[Path] = None,
+        dirty_scope: str = status.DEFAULT_DIRTY_SCOPE,
     ):
-        """Find the version from the prior config and replace them."""
+        """
+        Find the version from the prior config and replace them.
+
+        The tracked files are rewritten concurrently by at most `jobs` threads, and replaced along
+        with the config all at once. If plan_path is given, the scan is written there as a plan for
+        `apply` and, like a dryrun, nothing changes. Otherwise the new version is appended to the
+        history, see yeyo.history. Before committing and tagging after the bump, the repo is
+        checked for other changes within dirty_scope, see yeyo.status.
+        """
+        dryrun = dryrun or plan_path is not None
+        if not dryrun:
+            _raise_if_interrupted(config_path)
+
         if git_tag_before and not dryrun:
             self._tag_repo()
 
+        files = self.files
+        changed_files: List[Path] = []
         if self.files:
-            self._update_files(old_yeyo_config, dryrun)
+            directory_index = DirectoryIndex.for_config(config_path)
+            files = self.resolve_files(directory_index)
+            if not dryrun:
+                directory_index.save()
+
+            occurrence_index = OccurrenceIndex.for_config(config_path)
+            changed_files = self._update_files(
+                old_yeyo_config, config_path, dryrun, jobs, occurrence_index, files, plan_path
+            )
+        elif plan_path is not None:
+            planfile.write_plan(plan_path, old_yeyo_config.version_string, self.to_dict(), [], [])
+        elif not dryrun:
+            self.to_yaml(config_path)
 
         if dryrun:
             print(f"\nNew Config:\n\n{self}")
@@ -191,42 +531,155 @@ class YeyoConfig(NamedTuple):
             print(f"Git tag after: {git_tag_after}")
             print(f"Tag Template: {self.get_templated_tag()}")
             print(f"Commit Template: {self.get_templated_commit()}")
+        elif git_tag_after:
+            self._tag_after(config_path, {fv.file_path for fv in files}, changed_files, dirty_scope)
         else:
-            self.to_yaml(config_path)
+            self._record_history(config_path, changed_files)
+
+    @classmethod
+    def apply(
+        cls,
+        plan_path: Path,
+        config_path: Path,
+        git_tag_before: bool = False,
+        git_tag_after: bool = False,
+        jobs: Optional[int] = None,
+        dirty_scope: str = status.DEFAULT_DIRTY_SCOPE,
+    ) -> "YeyoConfig":
+        """
+        Apply the plan at plan_path, written by a bump, without scanning the files again.
+
+        Nothing is changed if the config or any of the planned files changed since the plan was
+        made. Returns the config after the bump.
+        """
+        _raise_if_interrupted(config_path)
+        bump_plan = planfile.read_plan(plan_path)
+
+        current = cls.from_yaml(config_path)
+        if current.to_dict() != dict(bump_plan.config, version=bump_plan.old_version):
+            raise YeyoUpdateException(
+                f"The config at {config_path} changed since the plan at {plan_path} was made."
+            )
+
+        stale = planfile.stale_files(bump_plan, jobs)
+        if stale:
+            raise YeyoUpdateException("The plan is stale:\n" + "\n".join(stale))
 
-            if git_tag_after:
-                self._tag_after()
+        if git_tag_before:
+            current._tag_repo()
+
+        new_config = cls.from_dict(bump_plan.config)
+        occurrence_index = OccurrenceIndex.for_config(config_path)
+        changed_files = new_config._rewrite_scans(
+            current, config_path, bump_plan.plans, bump_plan.scans, False, jobs, occurrence_index
+        )
+
+        if git_tag_after:
+            new_config._tag_after(
+                config_path,
+                {scan.file_path for scan in bump_plan.scans},
+                changed_files,
+                dirty_scope,
+            )
+        else:
+            new_config._record_history(config_path, changed_files)
+
+        return new_config
+
+    @classmethod
+    def recover(cls, config_path: Path, rollback: bool = False) -> Optional["YeyoConfig"]:
+        """
+        Finish, or with rollback undo, an interrupted bump of the config at config_path.
+
+        Returns the config as of the recovery, or None if there was no interrupted bump.
+        """
+        bump_journal = journal.load(config_path)
+        if bump_journal is None:
+            return None
+
+        if rollback:
+            journal.rollback(bump_journal)
+            config = cls.from_dict(bump_journal.old_config)
+        else:
+            journal.roll_forward(bump_journal)
+            config = cls.from_dict(bump_journal.new_config)
+
+        config._to_yaml_durably(config_path)
+        journal.finish(bump_journal)
+        return config
 
     @property
     def string_files(self):
         """Convert the set of Paths at self.files to a set of strings."""
         return {str(p.file_path) for p in self.files}
 
-    def _tag_after(self: "YeyoConfig"):
-        repo = git.Repo(".")
+    def _record_history(
+        self,
+        config_path: Path,
+        changed_files: Iterable[Path],
+        tag: Optional[str] = None,
+        commit: Optional[str] = None,
+    ):
+        entry = history.new_entry(self.version_string, [str(p) for p in changed_files], tag, commit)
+        history.History.for_config(config_path).append(entry)
 
-        file_paths = {p.file_path for p in self.files}.union({Path(DEFAULT_CONFIG_PATH)})
-        extra_files = {Path(p) for p in repo.untracked_files} - file_paths
+    def dirty_files(
+        self,
+        file_paths: Optional[Set[Path]] = None,
+        scope: str = status.DEFAULT_DIRTY_SCOPE,
+        config_path: Path = Path(DEFAULT_CONFIG_PATH),
+    ) -> List[status.DirtyFile]:
+        """
+        Return the files with changes in the repo other than file_paths and the config.
+
+        file_paths defaults to the tracked files, and scope sets how much of the repo is checked,
+        see yeyo.status. config_path is the path of the config and its shards to leave out.
+        """
+        if file_paths is None:
+            file_paths = {fv.file_path for fv in self.resolve_files()}
+
+        allowed_paths = set(file_paths).union(config_paths(config_path))
+        with metrics.phase("git.status"):
+            return status.dirty_files(git_repo(), allowed_paths, scope)
+
+    def _tag_after(
+        self: "YeyoConfig",
+        config_path: Path = Path(DEFAULT_CONFIG_PATH),
+        file_paths: Optional[Set[Path]] = None,
+        changed_files: Optional[Iterable[Path]] = None,
+        dirty_scope: str = status.DEFAULT_DIRTY_SCOPE,
+    ):
+        if file_paths is None:
+            file_paths = {fv.file_path for fv in self.resolve_files()}
+        if changed_files is None:
+            changed_files = file_paths
+
+        repo = git_repo()
+
+        extra_files = self.dirty_files(file_paths, dirty_scope, config_path)
         if extra_files:
             raise YeyoDirtyRepoException(
-                f"Repo is dirty, these extra files have changes: {extra_files}."
+                "Repo is dirty, these extra files have changes: "
+                + ", ".join(str(f) for f in extra_files)
+                + ".",
+                extra_files,
             )
 
-        if self.files:
-            repo.index.add(self.string_files)
-
-        repo.index.add([str(DEFAULT_CONFIG_PATH)])
-
-        commit_string = self.get_templated_commit()
-        repo.index.commit(commit_string)
+        commit_paths = sorted(
+            {str(p) for p in changed_files}.union(map(str, config_paths(config_path)))
+        )
+        tag_string = self.get_templated_tag()
+        commit_sha = git_commit_and_tag(repo, commit_paths, self.get_templated_commit(), tag_string)
 
-        self._tag_repo()
+        self._record_history(config_path, changed_files, tag_string, commit_sha)
 
-    def _tag_repo(self: "YeyoConfig"):
+    def _tag_repo(self: "YeyoConfig") -> str:
         tag_string = self.get_templated_tag()
 
-        repo = git.Repo(".")
-        repo.create_tag(tag_string)
+        repo = git_repo()
+        with metrics.phase("git.tag"):
+            repo.create_tag(tag_string)
+        return tag_string
 
     def tag_repo(self: "YeyoConfig"):
         """Tag the current repo with the templated string."""
@@ -235,80 +688,100 @@ class YeyoConfig(NamedTuple):
     def _new_version(self, func, *args, **kwargs):
         return func(self.version_string, *args, **kwargs)
 
+    def _with_version(self, version_string: str) -> "YeyoConfig":
+        """
+        Return a copy of the config at version_string, which shares the same files.
+
+        The files are immutable, so sharing them makes deriving a new version independent of how
+        many files are tracked.
+        """
+        import semver
+
+        return self._replace(version=semver.parse_version_info(version_string))
+
     def bump_major(self):
         """Bump the config to the next major version."""
-        return YeyoConfig.from_version_string(
-            self._new_version(semver.bump_major),
-            self.tag_template,
-            self.commit_template,
-            self.files,
-        )
+        import semver
+
+        return self._with_version(self._new_version(semver.bump_major))
 
     def bump_minor(self):
         """Bump the config to the next minor version."""
-        return YeyoConfig.from_version_string(
-            self._new_version(semver.bump_minor),
-            self.tag_template,
-            self.commit_template,
-            self.files,
-        )
+        import semver
+
+        return self._with_version(self._new_version(semver.bump_minor))
 
     def bump_patch(self):
         """Bump the config to the next patch version."""
-        return YeyoConfig.from_version_string(
-            self._new_version(semver.bump_patch),
-            self.tag_template,
-            self.commit_template,
-            self.files,
-        )
+        import semver
+
+        return self._with_version(self._new_version(semver.bump_patch))
 
     def bump_build(self):
         """Bump the config to the next build version."""
-        return YeyoConfig.from_version_string(
-            self._new_version(semver.bump_build),
-            self.tag_template,
-            self.commit_template,
-            self.files,
-        )
+        import semver
+
+        return self._with_version(self._new_version(semver.bump_build))
 
     def bump_prerelease(self, prerelease_token: Optional[str] = None):
         """Bump the config to the next prerelease version."""
+        import semver
+
         if self.version.prerelease is None:
-            return YeyoConfig.from_version_string(
-                self._new_version(semver.bump_prerelease, token="dev"),
-                self.tag_template,
-                self.commit_template,
-                self.files,
-            )
+            return self._with_version(self._new_version(semver.bump_prerelease, token="dev"))
 
         if prerelease_token is None and self.version.prerelease:
-            return YeyoConfig.from_version_string(
-                self._new_version(semver.bump_prerelease, token=self.version.prerelease),
-                self.tag_template,
-                self.commit_template,
-                self.files,
+            return self._with_version(
+                self._new_version(semver.bump_prerelease, token=self.version.prerelease)
             )
 
         finalized = self.finalize()
-        return YeyoConfig.from_version_string(
-            finalized._new_version(semver.bump_prerelease, token=prerelease_token),
-            self.tag_template,
-            self.commit_template,
-            self.files,
+        return self._with_version(
+            finalized._new_version(semver.bump_prerelease, token=prerelease_token)
         )
 
+    def avoid_existing_tags(self, tag_names: Iterable[str]) -> "YeyoConfig":
+        """
+        Move the prerelease number past any that's already tagged and return the config.
+
+        The tags made from the tag template for the same version and prerelease token are taken,
+        e.g. if the tags for 1.0.0-rc.2 and 1.0.0-rc.3 exist, 1.0.0-rc.2 becomes 1.0.0-rc.4.
+        """
+        from yeyo import versions
+
+        match = re.fullmatch(r"(.*?)(\d+)", self.version.prerelease or "")
+        if match is None:
+            return self
+
+        base = f"{self.version.major}.{self.version.minor}.{self.version.patch}-{match.group(1)}"
+        pattern = versions.tag_pattern(self.tag_template)
+
+        taken = set()
+        for tag in tag_names:
+            tag_match = pattern.fullmatch(tag)
+            if tag_match is None:
+                continue
+            version_string = tag_match.group("version").partition("+")[0]
+            number = version_string[len(base) :]
+            if version_string.startswith(base) and number.isdigit():
+                taken.add(int(number))
+
+        number = int(match.group(2))
+        while number in taken:
+            number += 1
+        return self._with_version(f"{base}{number}")
+
     def finalize(self):
         """Finalize the current version and return the config."""
-        return YeyoConfig.from_version_string(
-            self._new_version(semver.finalize_version),
-            self.tag_template,
-            self.commit_template,
-            self.files,
-        )
+        import semver
+
+        return self._with_version(self._new_version(semver.finalize_version))
 
     @property
     def version_string(self):
         """Pretty format the underlying version."""
+        import semver
+
         return semver.format_version(
             self.version.major,
             self.version.minor,
@@ -0,0 +1,81 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""Small filesystem helpers shared across yeyo."""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable
+from typing import Optional
+
+
+def _umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def fsync_file(p: Path):
+    """Flush the contents of the file at p to disk."""
+    fd = os.open(str(p), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_files(paths: Iterable[Path], jobs: Optional[int] = None):
+    """Flush the files at paths to disk together with at most jobs threads, not one at a time."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(fsync_file, paths))
+
+
+def fsync_dirs(directories: Iterable[Path]):
+    """
+    Flush the entries of each directory to disk once, so renames and links in them are durable.
+
+    Directories can't be opened on Windows, where this does nothing.
+    """
+    if os.name == "nt":
+        return
+
+    for directory in set(Path(d) for d in directories):
+        fd = os.open(str(directory), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_atomic(p: Path, data: bytes, durable: bool = False):
+    """
+    Write data to a temporary file next to p, then move it into place.
+
+    Readers either see the old contents of p or the new ones, never a partially written file. The
+    file keeps the mode of the one it replaces. If durable is True, the file and the rename are
+    flushed to disk before returning.
+    """
+    p = Path(p)
+    fd, tmp_name = tempfile.mkstemp(dir=str(p.parent), prefix=f".{p.name}.")
+    try:
+        with open(fd, "wb") as out_handler:
+            out_handler.write(data)
+            if durable:
+                out_handler.flush()
+                os.fsync(out_handler.fileno())
+
+        if p.exists():
+            shutil.copymode(str(p), tmp_name)
+        else:
+            os.chmod(tmp_name, 0o666 & ~_umask())
+
+        os.replace(tmp_name, str(p))
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+    if durable:
+        fsync_dirs([p.parent])
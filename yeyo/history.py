@@ -0,0 +1,437 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+An append-only log of the versions a config went through, with an index for fast lookups.
+
+Each bump appends one line of JSON to the log, with the new version, the tag and commit that were
+made for it, if any, when it happened and the files it changed. The entries of bumps that weren't
+committed can't be rebuilt, so the log isn't kept in the cache but in its own directory next to the
+config, which git ignores. The committed entries can be backfilled from git with
+`yeyo history rebuild`. The index can always be rebuilt from the log, and lives in the cache.
+
+The index is a file of fixed-width records, each a key padded to the width of the longest key and
+the byte offset of its entry in the log, sorted by key in a section for each of version, tag and
+commit. A lookup is a binary search that reads O(log n) records of the index, plus a single read of
+the log. The index records how much of the log it covers, and entries appended since are merged
+into it by the next lookup, so appending never reads the log.
+"""
+
+import contextlib
+import io
+import json
+import os
+import struct
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import BinaryIO
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from yeyo import cache
+from yeyo import fsutil
+
+if TYPE_CHECKING:
+    import git
+
+HISTORY_DIR_NAME = ".yeyo.history"
+HISTORY_NAME = "history.ndjson"
+HISTORY_INDEX_NAME = "history.index"
+
+# The fields of an entry the index sorts by, a commit may be looked up by any prefix of its sha.
+INDEXED_FIELDS = ("version", "tag", "commit")
+
+# The index starts with a magic number and the inode and size of the log it covers. Then for each
+# of INDEXED_FIELDS, there's the number of records and the width of their keys, then the records.
+INDEX_MAGIC = b"yeyohix1"
+_HEADER = struct.Struct(">8sQQ")
+_SECTION = struct.Struct(">QQ")
+_OFFSET = struct.Struct(">Q")
+
+# A key of the index, and the offset of its entry in the log.
+Record = Tuple[bytes, int]
+
+
+class HistoryEntry(NamedTuple):
+    """A version of the config, and the tag and commit it was released with."""
+
+    version: str
+    tag: Optional[str]
+    commit: Optional[str]
+    timestamp: float
+    files: List[str]
+
+    def to_dict(self):
+        """Convert the entry to a dictionary."""
+        return self._asdict()
+
+
+class _Section(NamedTuple):
+    """Where the records of a field start in the index, how many there are and their key width."""
+
+    start: int
+    count: int
+    width: int
+
+    @property
+    def record_size(self) -> int:
+        return self.width + _OFFSET.size
+
+
+class HistoryIndex:
+    """
+    The index of a log, read from in_handler a record at a time.
+
+    The index covers the first size bytes of the log whose inode is inode.
+    """
+
+    def __init__(self, in_handler: BinaryIO):
+        """Read the header of the index in in_handler, raising ValueError if it isn't an index."""
+        self._in_handler = in_handler
+        magic, self.inode, self.size = _HEADER.unpack(self._read(0, _HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a history index.")
+
+        self.sections: Dict[str, _Section] = {}
+        start = _HEADER.size
+        for field in INDEXED_FIELDS:
+            count, width = _SECTION.unpack(self._read(start, _SECTION.size))
+            section = _Section(start + _SECTION.size, count, width)
+            self.sections[field] = section
+            start = section.start + count * section.record_size
+
+    def _read(self, offset: int, size: int) -> bytes:
+        self._in_handler.seek(offset)
+        data = self._in_handler.read(size)
+        if len(data) != size:
+            raise ValueError("The history index is truncated.")
+        return data
+
+    @staticmethod
+    def _unpack(section: _Section, data: bytes) -> Record:
+        return data[: section.width].rstrip(b"\0"), _OFFSET.unpack(data[section.width :])[0]
+
+    def _record(self, field: str, i: int) -> Record:
+        section = self.sections[field]
+        data = self._read(section.start + i * section.record_size, section.record_size)
+        return self._unpack(section, data)
+
+    def records(self, field: str) -> List[Record]:
+        """Return every record of field, sorted, in a single read."""
+        section = self.sections[field]
+        data = self._read(section.start, section.count * section.record_size)
+        return [
+            self._unpack(section, data[i : i + section.record_size])
+            for i in range(0, len(data), section.record_size)
+        ]
+
+    def _bisect(self, field: str, key: bytes, right: bool = False) -> int:
+        """Return where key goes among the keys of field, to the left or right of equal keys."""
+        lo, hi = 0, self.sections[field].count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, _ = self._record(field, mid)
+            if mid_key < key or (right and mid_key == key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def latest(self, field: str, key: str) -> Optional[int]:
+        """Return the offset of the latest entry whose field is key, or None if there isn't one."""
+        encoded = key.encode()
+        i = self._bisect(field, encoded, right=True)
+        if i == 0:
+            return None
+        found, offset = self._record(field, i - 1)
+        return offset if found == encoded else None
+
+    def prefixed(self, field: str, prefix: str) -> Dict[str, int]:
+        """
+        Return the keys of field starting with prefix, and the offset of each key's last entry.
+
+        The matching records are contiguous, so they're read from the first one on.
+        """
+        encoded = prefix.encode()
+        matches: Dict[str, int] = {}
+        for i in range(self._bisect(field, encoded), self.sections[field].count):
+            key, offset = self._record(field, i)
+            if not key.startswith(encoded):
+                break
+            matches[key.decode()] = offset
+        return matches
+
+
+def _index_bytes(inode: int, size: int, fields: Dict[str, List[Record]]) -> bytes:
+    """Return the index of the first size bytes of the log with inode inode, see HistoryIndex."""
+    parts = [_HEADER.pack(INDEX_MAGIC, inode, size)]
+    for field in INDEXED_FIELDS:
+        records = sorted(fields[field])
+        width = max((len(key) for key, _ in records), default=0)
+        parts.append(_SECTION.pack(len(records), width))
+        parts.extend(key.ljust(width, b"\0") + _OFFSET.pack(offset) for key, offset in records)
+    return b"".join(parts)
+
+
+def _read_lines(in_handler, offset: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield the complete lines from offset on, with their offsets. A torn last line is skipped."""
+    in_handler.seek(offset)
+    for line in in_handler:
+        if not line.endswith(b"\n"):
+            return
+        yield offset, line
+        offset += len(line)
+
+
+class History:
+    """The history log for one config, and its index."""
+
+    def __init__(self, log_path: Path, index_path: Path):
+        """Initialize the history with the log at log_path and the index at index_path."""
+        self.log_path = log_path
+        self.index_path = index_path
+        # The index, when it couldn't be written to index_path, e.g. the directory is read-only.
+        self._index_data: Optional[bytes] = None
+
+    @classmethod
+    def for_config(cls, config_path: Path) -> "History":
+        """
+        Return the history of the config at config_path.
+
+        A log left in the cache directory by an earlier version of yeyo is moved out of it. The
+        index is checked against the log whenever it's used, so a history kept in memory is reused
+        as is.
+        """
+        history = cache.recall("history", config_path)
+        if history is None:
+            log_path = Path(config_path).parent / HISTORY_DIR_NAME / HISTORY_NAME
+            legacy_path = cache.cache_path(config_path, HISTORY_NAME)
+            if legacy_path.is_file() and not log_path.exists():
+                cache.ensure_cache_dir(log_path.parent)
+                os.replace(legacy_path, log_path)
+
+            history = cls(log_path, cache.cache_path(config_path, HISTORY_INDEX_NAME))
+            cache.remember("history", config_path, history)
+        return history
+
+    def append(self, entry: HistoryEntry):
+        """
+        Append entry to the log in a single write, so readers see all of it or none of it.
+
+        The entry is flushed to disk before returning.
+        """
+        cache.ensure_cache_dir(self.log_path.parent)
+        line = json.dumps(entry.to_dict(), sort_keys=True).encode() + b"\n"
+
+        with open(self.log_path, "ab+") as out_handler:
+            # A crash may have torn the last line, so start a new line rather than extend it.
+            size = out_handler.seek(0, os.SEEK_END)
+            if size:
+                out_handler.seek(size - 1)
+                if out_handler.read(1) != b"\n":
+                    line = b"\n" + line
+            out_handler.write(line)
+            out_handler.flush()
+            os.fsync(out_handler.fileno())
+
+    def size(self) -> int:
+        """Return the size of the log, which is the offset the next entry is appended at."""
+        try:
+            return os.stat(self.log_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def entries(self, offset: int = 0) -> Iterator[HistoryEntry]:
+        """Yield the entries of the log from offset on, see size, oldest first."""
+        try:
+            with open(self.log_path, "rb") as in_handler:
+                for _, line in _read_lines(in_handler, offset):
+                    entry = _parse(line)
+                    if entry is not None:
+                        yield entry
+        except FileNotFoundError:
+            return
+
+    def _open_index_file(self) -> Optional[BinaryIO]:
+        if self._index_data is not None:
+            return io.BytesIO(self._index_data)
+        try:
+            return open(self.index_path, "rb")
+        except OSError:
+            return None
+
+    def _update_index(self, history_index: Optional[HistoryIndex], stat: os.stat_result) -> bytes:
+        """Merge the entries appended to the log since history_index into it, and save it."""
+        fields: Dict[str, List[Record]] = {field: [] for field in INDEXED_FIELDS}
+        size = 0
+        if history_index is not None:
+            fields = {field: history_index.records(field) for field in INDEXED_FIELDS}
+            size = history_index.size
+
+        with open(self.log_path, "rb") as in_handler:
+            for offset, line in _read_lines(in_handler, size):
+                size = offset + len(line)
+                entry = _parse(line)
+                if entry is None:
+                    continue
+                for field in INDEXED_FIELDS:
+                    key = getattr(entry, field)
+                    if key is not None:
+                        fields[field].append((key.encode(), offset))
+
+        data = _index_bytes(stat.st_ino, size, fields)
+        # An index that can't be written is kept in memory instead.
+        self._index_data = None if cache.write(self.index_path, data) else data
+        return data
+
+    @contextlib.contextmanager
+    def open_index(self) -> Iterator[Optional[HistoryIndex]]:
+        """
+        Open the index, after indexing whatever was appended to the log since it was saved.
+
+        Yields None if there's no log.
+        """
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            yield None
+            return
+
+        in_handler = self._open_index_file()
+        try:
+            history_index = None
+            if in_handler is not None:
+                with contextlib.suppress(ValueError, struct.error):
+                    history_index = HistoryIndex(in_handler)
+            if history_index is not None and (
+                history_index.inode != stat.st_ino or history_index.size > stat.st_size
+            ):
+                # The log was replaced, e.g. by a rebuild, so it's indexed from the start.
+                history_index = None
+
+            if history_index is None or history_index.size < stat.st_size:
+                data = self._update_index(history_index, stat)
+                if in_handler is not None:
+                    in_handler.close()
+                in_handler = io.BytesIO(data)
+                history_index = HistoryIndex(in_handler)
+
+            yield history_index
+        finally:
+            if in_handler is not None:
+                in_handler.close()
+
+    def _read_at(self, offset: int) -> HistoryEntry:
+        with open(self.log_path, "rb") as in_handler:
+            in_handler.seek(offset)
+            entry = _parse(in_handler.readline())
+        if entry is None:
+            raise ValueError(f"The history at {self.log_path} has no entry at offset {offset}.")
+        return entry
+
+    def find(self, field: str, key: str) -> Optional[HistoryEntry]:
+        """Return the latest entry whose field is key, or None if there isn't one."""
+        with self.open_index() as history_index:
+            offset = None if history_index is None else history_index.latest(field, key)
+        return None if offset is None else self._read_at(offset)
+
+    def by_version(self, version: str) -> Optional[HistoryEntry]:
+        """Return the latest entry for version."""
+        return self.find("version", version)
+
+    def by_tag(self, tag: str) -> Optional[HistoryEntry]:
+        """Return the latest entry tagged tag."""
+        return self.find("tag", tag)
+
+    def by_commit(self, sha: str) -> Optional[HistoryEntry]:
+        """
+        Return the entry made by the commit sha, or whose commit starts with sha.
+
+        An abbreviated sha that matches more than one commit raises a ValueError.
+        """
+        with self.open_index() as history_index:
+            commits = {} if history_index is None else history_index.prefixed("commit", sha)
+        if len(commits) > 1:
+            raise ValueError(f"The commit {sha} is ambiguous, it matches: {sorted(commits)}.")
+        if not commits:
+            return None
+        (offset,) = commits.values()
+        return self._read_at(offset)
+
+    def at(self, repo: "git.Repo", rev: str = "HEAD") -> Optional[HistoryEntry]:
+        """
+        Return the entry of the version the repo was at as of rev.
+
+        That's the entry of the nearest commit in rev's history with an entry, so only the commits
+        since the last bump are walked.
+        """
+        for commit in repo.iter_commits(rev):
+            entry = self.by_commit(commit.hexsha)
+            if entry is not None:
+                return entry
+        return None
+
+    def replace(self, entries: List[HistoryEntry]):
+        """Replace the log with entries, atomically and durably."""
+        data = b"".join(
+            json.dumps(entry.to_dict(), sort_keys=True).encode() + b"\n" for entry in entries
+        )
+        cache.ensure_cache_dir(self.log_path.parent)
+        fsutil.write_atomic(self.log_path, data, durable=True)
+        self._index_data = None
+
+    def rebuild(self, repo: "git.Repo", config_path: Path) -> int:
+        """
+        Backfill the log from the commits that changed the version in the config at config_path.
+
+        Entries that weren't committed are kept, since git has no record of them, and the rest are
+        replaced by what's found in git. Returns the number of entries found in git.
+        """
+        from ruamel.yaml import YAML
+
+        yaml = YAML(typ="safe")
+        tags: Dict[str, List[str]] = {}
+        for tag_ref in repo.tags:
+            tags.setdefault(tag_ref.commit.hexsha, []).append(tag_ref.name)
+
+        found = []
+        previous_version = None
+        rel_path = Path(config_path).resolve().relative_to(Path(repo.working_tree_dir).resolve())
+        for commit in repo.iter_commits(paths=str(rel_path), reverse=True):
+            try:
+                blob = commit.tree / rel_path.as_posix()
+            except KeyError:
+                continue
+
+            version = (yaml.load(blob.data_stream.read()) or {}).get("version")
+            if version is None or version == previous_version:
+                continue
+
+            previous_version = version
+            tag = min(tags[commit.hexsha]) if commit.hexsha in tags else None
+            files = sorted(p for p in commit.stats.files if p != rel_path.as_posix())
+            found.append(
+                HistoryEntry(version, tag, commit.hexsha, float(commit.committed_date), files)
+            )
+
+        uncommitted = [entry for entry in self.entries() if entry.commit is None]
+        self.replace(sorted(found + uncommitted, key=lambda entry: entry.timestamp))
+        return len(found)
+
+
+def _parse(line: bytes) -> Optional[HistoryEntry]:
+    try:
+        return HistoryEntry(**json.loads(line))
+    except (ValueError, TypeError):
+        return None
+
+
+def new_entry(
+    version: str, files: List[str], tag: Optional[str] = None, commit: Optional[str] = None
+) -> HistoryEntry:
+    """Create an entry for version, made now."""
+    return HistoryEntry(version, tag, commit, time.time(), sorted(files))
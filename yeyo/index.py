@@ -0,0 +1,161 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+A persistent index of where the version occurs in each tracked file.
+
+After a bump rewrites a file, the offsets of the new version in it are recorded along with the
+file's size, mtime and sha256. On the next bump, a file whose entry is still valid is patched at
+those offsets directly instead of being scanned. An entry is valid if the file's size and mtime are
+unchanged, or, failing that, if the file's contents still hash to the recorded sha256.
+
+The occurrences are found by searching the rewritten file for what the next bump will search for,
+so they include any copy of the new version that was already in the file, and using the index gives
+the same result as scanning. Any other change to the file invalidates its entry and it's scanned in
+full.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from yeyo import cache
+from yeyo import rewrite
+
+INDEX_NAME = "index.json"
+
+# An mtime this close to when the entry was recorded may not have ticked over on a later write.
+RACY_WINDOW_NS = 2_000_000_000
+
+Occurrence = Tuple[int, int, str]
+
+
+class IndexEntry(NamedTuple):
+    """The occurrences of a file's search strings, and the state of the file they were found in."""
+
+    size: int
+    mtime_ns: int
+    recorded_ns: int
+    sha256: str
+    searches: List[str]
+    occurrences: List[Occurrence]
+
+
+def file_sha256(file_path: Path) -> str:
+    """Hash the contents of file_path in bounded chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as in_handler:
+        for chunk in iter(lambda: in_handler.read(rewrite.CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OccurrenceIndex:
+    """The occurrence index for the files of one config."""
+
+    def __init__(self, path: Path, entries: Optional[Dict[str, IndexEntry]] = None):
+        """Initialize the index, which is stored at path."""
+        self.path = path
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def for_config(cls, config_path: Path) -> "OccurrenceIndex":
+        """
+        Load the index kept in the cache directory next to config_path.
+
+        Entries are validated against the files when they're looked up, so an index kept in memory
+        is reused as is.
+        """
+        occurrence_index = cache.recall("index", config_path)
+        if occurrence_index is None:
+            occurrence_index = cls.load(cache.cache_path(config_path, INDEX_NAME))
+            cache.remember("index", config_path, occurrence_index)
+        return occurrence_index
+
+    @classmethod
+    def load(cls, path: Path) -> "OccurrenceIndex":
+        """Load the index at path, a missing or unreadable index is treated as empty."""
+        try:
+            with open(path) as in_handler:
+                d = json.load(in_handler)
+            entries = {
+                p: IndexEntry(
+                    e["size"],
+                    e["mtime_ns"],
+                    e["recorded_ns"],
+                    e["sha256"],
+                    e["searches"],
+                    [tuple(o) for o in e["occurrences"]],
+                )
+                for p, e in d["files"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            entries = {}
+        return cls(path, entries)
+
+    def save(self):
+        """Write the index back to its path."""
+        d = {"files": {p: e._asdict() for p, e in sorted(self.entries.items())}}
+        cache.write(self.path, json.dumps(d).encode())
+
+    def _is_fresh(self, file_path: Path, entry: IndexEntry) -> bool:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+
+        if stat.st_size != entry.size:
+            return False
+
+        racy = stat.st_mtime_ns + RACY_WINDOW_NS >= entry.recorded_ns
+        if stat.st_mtime_ns == entry.mtime_ns and not racy:
+            return True
+
+        return file_sha256(file_path) == entry.sha256
+
+    def lookup(self, plan: rewrite.FilePlan) -> Optional[List[rewrite.Span]]:
+        """Return the spans to replace in the plan's file, or None if the file must be scanned."""
+        entry = self.entries.get(str(plan.file_path))
+        if entry is None or plan.regexes:
+            return None
+
+        searches = sorted(s.decode(plan.encoding) for s in plan.replacements)
+        if entry.searches != searches or not self._is_fresh(plan.file_path, entry):
+            return None
+
+        spans = []
+        for start, end, text in entry.occurrences:
+            old = text.encode(plan.encoding)
+            spans.append(rewrite.Span(start, end, plan.replacements[old], old))
+        return spans
+
+    def record(self, plan: rewrite.FilePlan, staged: rewrite.StagedFile):
+        """
+        Record the occurrences found in the staged file, after it replaced the plan's file.
+
+        Files with regex templates aren't recorded, the text their patterns match around the version
+        can change without the version moving, so they're always scanned.
+        """
+        if plan.regexes or staged.occurrences is None:
+            self.discard(plan.file_path)
+            return
+
+        stat = os.stat(plan.file_path)
+        self.entries[str(plan.file_path)] = IndexEntry(
+            stat.st_size,
+            stat.st_mtime_ns,
+            time.time_ns(),
+            staged.sha256,
+            sorted({s.decode(plan.encoding) for s in plan.replacements.values()}),
+            [(start, end, text.decode(plan.encoding)) for start, end, text in staged.occurrences],
+        )
+
+    def discard(self, file_path: Path):
+        """Forget the entry for file_path, if there is one."""
+        self.entries.pop(str(file_path), None)
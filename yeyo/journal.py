@@ -0,0 +1,175 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+A write-ahead journal that makes rewriting the tracked files and the config all or nothing.
+
+A bump first stages the new contents of every file in a temporary file next to it, and links a
+backup of each original. Once the staged files are flushed to disk, in one batch, the journal is
+written next to the config. Only then are the staged files renamed over the originals and the
+config written, and once the config and its shards are flushed to disk, the backups and the journal
+are removed.
+
+If the bump is interrupted after the journal is written, the journal has everything needed to either
+roll the bump back, from the backups, or forward, from the staged files, see `yeyo recover`.
+"""
+
+import contextlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from yeyo import fsutil
+from yeyo import rewrite
+from yeyo.index import file_sha256
+
+JOURNAL_NAME = ".yeyo.journal"
+
+
+class YeyoJournalException(Exception):
+    """Raised when an interrupted bump can't be recovered."""
+
+
+class JournalEntry(NamedTuple):
+    """A file being replaced by its staged copy, with a backup of the original."""
+
+    file_path: Path
+    staged_path: Path
+    backup_path: Path
+    sha256: str
+
+
+class Journal(NamedTuple):
+    """The files and configs of a bump that is in progress."""
+
+    path: Path
+    old_config: Dict[str, Any]
+    new_config: Dict[str, Any]
+    entries: List[JournalEntry]
+
+    def to_dict(self):
+        """Convert the journal into a dict representation."""
+        return {
+            "old_config": self.old_config,
+            "new_config": self.new_config,
+            "entries": [
+                [str(e.file_path), str(e.staged_path), str(e.backup_path), e.sha256]
+                for e in self.entries
+            ],
+        }
+
+
+def journal_path(config_path: Path) -> Path:
+    """Return the path of the journal for the config at config_path."""
+    return Path(config_path).parent / JOURNAL_NAME
+
+
+def load(config_path: Path) -> Optional[Journal]:
+    """Load the journal of an interrupted bump of the config at config_path, if there is one."""
+    p = journal_path(config_path)
+    try:
+        with open(p) as in_handler:
+            d = json.load(in_handler)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        raise YeyoJournalException(f"The journal at {p} is unreadable: {e}")
+
+    entries = [JournalEntry(Path(f), Path(s), Path(b), h) for f, s, b, h in d["entries"]]
+    return Journal(p, d["old_config"], d["new_config"], entries)
+
+
+def _backup_path(staged_path: Path) -> Path:
+    return staged_path.with_name(staged_path.name + ".orig")
+
+
+def _link_backup(file_path: Path, backup_path: Path):
+    """Keep the original file at backup_path, as a hard link where the filesystem allows it."""
+    try:
+        os.link(str(file_path), str(backup_path))
+    except OSError:
+        shutil.copy2(str(file_path), str(backup_path))
+
+
+def _directories(journal: Journal) -> List[Path]:
+    return [e.file_path.parent for e in journal.entries]
+
+
+def begin(
+    config_path: Path,
+    old_config: Dict[str, Any],
+    new_config: Dict[str, Any],
+    staged_files: List[rewrite.StagedFile],
+    jobs: Optional[int] = None,
+) -> Journal:
+    """
+    Flush the staged files to disk and journal them, nothing is replaced yet.
+
+    The staged files are flushed together with at most jobs threads rather than as each is written.
+    """
+    fsutil.fsync_files([staged.staged_path for staged in staged_files], jobs)
+
+    entries = []
+    journal = Journal(journal_path(config_path), old_config, new_config, entries)
+    try:
+        for staged in staged_files:
+            backup_path = _backup_path(staged.staged_path)
+            _link_backup(staged.file_path, backup_path)
+            entries.append(
+                JournalEntry(staged.file_path, staged.staged_path, backup_path, staged.sha256)
+            )
+
+        fsutil.fsync_dirs(_directories(journal))
+        fsutil.write_atomic(journal.path, json.dumps(journal.to_dict()).encode(), durable=True)
+    except BaseException:
+        for entry in entries:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(str(entry.backup_path))
+        raise
+
+    return journal
+
+
+def commit(journal: Journal):
+    """Move each staged file over its original."""
+    for entry in journal.entries:
+        os.replace(str(entry.staged_path), str(entry.file_path))
+    fsutil.fsync_dirs(_directories(journal))
+
+
+def roll_forward(journal: Journal):
+    """Finish moving the staged files into place after an interrupted commit."""
+    for entry in journal.entries:
+        if entry.staged_path.exists():
+            os.replace(str(entry.staged_path), str(entry.file_path))
+        elif file_sha256(entry.file_path) != entry.sha256:
+            raise YeyoJournalException(
+                f"Can't roll forward, {entry.file_path} is neither staged nor bumped."
+            )
+    fsutil.fsync_dirs(_directories(journal))
+
+
+def rollback(journal: Journal):
+    """Restore each original file from its backup, and remove the staged files."""
+    for entry in journal.entries:
+        if entry.backup_path.exists():
+            os.replace(str(entry.backup_path), str(entry.file_path))
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(str(entry.staged_path))
+    fsutil.fsync_dirs(_directories(journal))
+
+
+def finish(journal: Journal):
+    """Remove the backups and then the journal, once the files and config are consistent."""
+    for entry in journal.entries:
+        for p in (entry.backup_path, entry.staged_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(str(p))
+
+    os.unlink(str(journal.path))
+    fsutil.fsync_dirs([journal.path.parent])
@@ -0,0 +1,91 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Loads and dumps yeyo's yaml config, with a binary cache of the parsed config.
+
+Parsing yaml is by far the slowest part of loading a large config, so the parsed config is written
+to the cache directory with marshal, keyed by the size, mtime and sha256 of the yaml file. The key
+is written first, as a line of json, and the parsed config is only unmarshaled once the key is read
+and still matches, in which case it's loaded instead of the yaml.
+"""
+
+import hashlib
+import json
+import marshal
+import os
+from io import StringIO
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from yeyo import cache
+from yeyo import fsutil
+
+CacheKey = Tuple[int, int, str]
+
+
+def _cache_file(p: Path) -> Path:
+    return cache.cache_path(p, f"{Path(p).name}.marshal")
+
+
+def _read_cache(p: Path, key: CacheKey) -> Optional[Dict[str, Any]]:
+    """Return the config cached for the yaml at p, or None if it isn't cached under key."""
+    try:
+        with open(_cache_file(p), "rb") as in_handler:
+            if tuple(json.loads(in_handler.readline())) != key:
+                return None
+            return marshal.load(in_handler)
+    except (OSError, ValueError, TypeError, EOFError):
+        # A missing or corrupt cache, which is rewritten after parsing the yaml.
+        return None
+
+
+def _write_cache(p: Path, key: CacheKey, d: Dict[str, Any]):
+    cache.remember("yaml", p, (key, d))
+    try:
+        data = json.dumps(list(key)).encode() + b"\n" + marshal.dumps(d)
+    except ValueError:
+        # The config has values marshal can't write, e.g. yaml timestamps, so it isn't cached.
+        return
+    cache.write(_cache_file(p), data)
+
+
+def _cache_key(p: Path) -> Tuple[CacheKey, bytes]:
+    with open(p, "rb") as in_handler:
+        stat = os.fstat(in_handler.fileno())
+        data = in_handler.read()
+    return (stat.st_size, stat.st_mtime_ns, hashlib.sha256(data).hexdigest()), data
+
+
+def load_yaml(p: Path) -> Dict[str, Any]:
+    """Load the yaml config at p, from the cache if it's still valid."""
+    key, data = _cache_key(p)
+
+    remembered = cache.recall("yaml", p)
+    if remembered is not None and remembered[0] == key:
+        return remembered[1]
+
+    cached = _read_cache(p, key)
+    if cached is not None:
+        cache.remember("yaml", p, (key, cached))
+        return cached
+
+    from ruamel.yaml import YAML
+
+    d = YAML(typ="safe").load(data)
+    _write_cache(p, key, d)
+    return d
+
+
+def dump_yaml(d: Dict[str, Any], p: Path):
+    """Write d to the yaml config at p, and cache it so the next load doesn't parse it."""
+    from ruamel import yaml
+
+    sio = StringIO()
+    yaml.round_trip_dump(d, sio, default_flow_style=False)
+    fsutil.write_atomic(p, sio.getvalue().encode())
+
+    key, _ = _cache_key(p)
+    _write_cache(p, key, d)
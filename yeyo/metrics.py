@@ -0,0 +1,111 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Records the wall and CPU time of each phase of a command, and counters such as bytes read.
+
+Recording is off unless `yeyo --timings` or `yeyo --metrics-json FILE` is given. While it's off,
+`phase` returns a shared no-op context manager and `count` returns immediately, so the
+instrumentation costs next to nothing.
+
+Phases are named by what they do, e.g. `files.scan`, and may nest, in which case the time of the
+inner phase is also part of the outer one. git subprocesses are counted through an audit hook, which
+needs Python 3.8 or later.
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from typing import Any
+from typing import ContextManager
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class Recorder:
+    """The timings of each phase and the counters recorded for a command."""
+
+    def __init__(self):
+        """Initialize an empty recorder."""
+        self.phases: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the body of the with statement as the phase name."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with self._lock:
+                timing = self.phases.setdefault(name, [0.0, 0.0, 0])
+                timing[0] += wall
+                timing[1] += cpu
+                timing[2] += 1
+
+    def count(self, name: str, n: int = 1):
+        """Add n to the counter name."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the recorded metrics into a dict representation."""
+        return {
+            "phases": {
+                name: {"wall_seconds": wall, "cpu_seconds": cpu, "calls": calls}
+                for name, (wall, cpu, calls) in self.phases.items()
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+
+_recorder: Optional[Recorder] = None
+_audit_hook_added = False
+
+
+def _audit_hook(event: str, args):
+    if _recorder is None or event != "subprocess.Popen":
+        return
+
+    executable, popen_args = args[0], args[1]
+    if executable is None:
+        executable = popen_args if isinstance(popen_args, (str, bytes)) else popen_args[0]
+    if os.path.basename(os.fsdecode(executable)).startswith("git"):
+        _recorder.count("git_subprocesses")
+
+
+def enable() -> Recorder:
+    """Start recording into a new recorder, which is returned."""
+    global _recorder, _audit_hook_added
+
+    _recorder = Recorder()
+    if not _audit_hook_added and hasattr(sys, "addaudithook"):
+        sys.addaudithook(_audit_hook)
+        _audit_hook_added = True
+    return _recorder
+
+
+def disable():
+    """Stop recording."""
+    global _recorder
+    _recorder = None
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Return a context manager that times its body as the phase name, if recording."""
+    if _recorder is None:
+        return _NULL_PHASE
+    return _recorder.phase(name)
+
+
+def count(name: str, n: int = 1):
+    """Add n to the counter name, if recording."""
+    if _recorder is not None:
+        _recorder.count(name, n)
@@ -0,0 +1,150 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Reads and writes bump plans, the result of scanning the files for a bump, as NDJSON.
+
+The first line of a plan is a header with the version being bumped from and the config after the
+bump. Each following line is a file record with the file's replacements, the spans to patch and the
+sha256 of the contents they were found in, so a plan can be reviewed and later applied without
+scanning the files again.
+
+Text is decoded with the file's encoding, bytes that don't decode are kept as lone surrogates so
+they round trip through the JSON.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from yeyo import rewrite
+from yeyo.index import file_sha256
+
+PLAN_FORMAT = 1
+
+
+class YeyoPlanException(Exception):
+    """Raised when a plan can't be read."""
+
+
+class BumpPlan(NamedTuple):
+    """A plan read back from a file, the scans line up with the plans."""
+
+    old_version: str
+    config: Dict[str, Any]
+    plans: List[rewrite.FilePlan]
+    scans: List[rewrite.FileScan]
+
+
+def _decode(b: bytes, encoding: str) -> str:
+    return b.decode(encoding, errors="surrogateescape")
+
+
+def _encode(s: str, encoding: str) -> bytes:
+    return s.encode(encoding, errors="surrogateescape")
+
+
+def _file_record(plan: rewrite.FilePlan, scan: rewrite.FileScan) -> Dict[str, Any]:
+    encoding = plan.encoding
+    return {
+        "type": "file",
+        "file_path": str(plan.file_path),
+        "encoding": encoding,
+        "sha256": scan.sha256,
+        "replacements": [
+            [_decode(old, encoding), _decode(new, encoding)]
+            for old, new in sorted(plan.replacements.items())
+        ],
+        "regex_templates": [list(regex) for regex in plan.regexes],
+        "spans": [
+            [s.start, s.end, _decode(s.old, encoding), _decode(s.new, encoding)] for s in scan.spans
+        ],
+        "messages": scan.messages,
+    }
+
+
+def write_plan(
+    p: Path,
+    old_version: str,
+    config: Dict[str, Any],
+    plans: List[rewrite.FilePlan],
+    scans: List[rewrite.FileScan],
+):
+    """
+    Write the header and then a record per scanned file to p.
+
+    The scans must have been made with a digest, so the files can be checked before applying.
+    """
+    with open(p, "w") as out_handler:
+        header = {
+            "type": "header",
+            "format": PLAN_FORMAT,
+            "old_version": old_version,
+            "config": config,
+        }
+        out_handler.write(json.dumps(header) + "\n")
+
+        for plan, scan in zip(plans, scans):
+            out_handler.write(json.dumps(_file_record(plan, scan)) + "\n")
+
+
+def read_plan(p: Path) -> BumpPlan:
+    """Read the plan at p."""
+    with open(p) as in_handler:
+        try:
+            records = [json.loads(line) for line in in_handler if line.strip()]
+        except ValueError as e:
+            raise YeyoPlanException(f"{p} is not a valid plan: {e}")
+
+    if not records or records[0].get("type") != "header":
+        raise YeyoPlanException(f"{p} is not a valid plan: it has no header.")
+
+    header, file_records = records[0], records[1:]
+    if header.get("format") != PLAN_FORMAT:
+        raise YeyoPlanException(f"{p} has an unsupported plan format: {header.get('format')}.")
+
+    try:
+        replacements = {
+            Path(r["file_path"]): [tuple(x) for x in r["replacements"]]
+            + [rewrite.RegexTemplate(*x) for x in r.get("regex_templates", [])]
+            for r in file_records
+        }
+        encodings = {r["encoding"] for r in file_records}
+        if len(encodings) > 1:
+            raise YeyoPlanException(f"{p} mixes encodings: {sorted(encodings)}.")
+        plans = rewrite.compile_plan(replacements, encodings.pop() if encodings else "utf-8")
+
+        scans = []
+        for r in sorted(file_records, key=lambda r: Path(r["file_path"])):
+            encoding = r["encoding"]
+            spans = [
+                rewrite.Span(start, end, _encode(new, encoding), _encode(old, encoding))
+                for start, end, old, new in r["spans"]
+            ]
+            scans.append(
+                rewrite.FileScan(Path(r["file_path"]), spans, r["messages"], None, r["sha256"])
+            )
+
+        return BumpPlan(header["old_version"], header["config"], plans, scans)
+    except (KeyError, TypeError, ValueError) as e:
+        raise YeyoPlanException(f"{p} is not a valid plan: {e!r}")
+
+
+def _changed(scan: rewrite.FileScan) -> Optional[str]:
+    try:
+        sha256 = file_sha256(scan.file_path)
+    except OSError as e:
+        return f"{scan.file_path}: {e}"
+    if sha256 != scan.sha256:
+        return f"{scan.file_path}: its contents changed since the plan was made."
+    return None
+
+
+def stale_files(bump_plan: BumpPlan, jobs: Optional[int] = None) -> List[str]:
+    """Hash the planned files with at most jobs threads, describing each one that changed."""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return [c for c in executor.map(_changed, bump_plan.scans) if c is not None]
@@ -0,0 +1,328 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Commits a bump's files and tags the commit by writing git objects and refs directly.
+
+Committing through GitPython's index reads and rewrites the whole index to build the tree, and
+tagging spawns git. Instead, only the changed files are hashed into blobs, and the new tree is built
+from the parent commit's tree by rewriting just the trees along the changed paths. The commit, the
+tag object of an annotated tag and the trees are written to the object database, and then the
+index is refreshed for the changed paths, the branch moved to the commit and the tag created.
+
+Blobs are hashed from the bytes in the work tree, so anything that makes git convert a file when
+adding it, e.g. a `text`, `eol` or `filter` attribute or core.autocrlf, needs git. That, and
+anything else this path doesn't handle, e.g. a repo without commits, commit hooks, symlinks or
+SHA-256 object names, raises YeyoPlumbingUnsupported before anything is written, and the caller
+falls back to GitPython. A path outside the work tree raises YeyoPathException, also before
+anything is written.
+"""
+
+import io
+import os
+import stat
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from yeyo import refs
+
+if TYPE_CHECKING:
+    import git
+
+TREE_MODE = b"40000"
+HOOKS = ("pre-commit", "commit-msg", "post-commit")
+
+# The attributes that make git convert a file's contents when it's added.
+CONVERSION_ATTRIBUTES = ("text", "eol", "crlf", "filter", "ident", "working-tree-encoding")
+
+# A nested dict of the changes to a tree, by entry name, with a (mode, binsha) pair for each blob.
+TreeChanges = Dict[bytes, Union[Tuple[bytes, bytes], "TreeChanges"]]
+
+
+class YeyoPlumbingUnsupported(Exception):
+    """Raised when the repo needs something only the GitPython path handles."""
+
+
+class YeyoRefException(Exception):
+    """Raised when a ref can't be updated, e.g. the tag exists or the branch moved."""
+
+
+class YeyoPathException(Exception):
+    """Raised when a path to commit is outside the work tree."""
+
+
+def _store(odb, kind: bytes, data: Union[bytes, io.BufferedReader], size: int) -> bytes:
+    from gitdb import IStream
+
+    stream = io.BytesIO(data) if isinstance(data, bytes) else data
+    return odb.store(IStream(kind, size, stream)).binsha
+
+
+def _read_tree(odb, binsha: bytes) -> Dict[bytes, Tuple[bytes, bytes]]:
+    data = odb.stream(binsha).read()
+    entries = {}
+    i = 0
+    while i < len(data):
+        space = data.index(b" ", i)
+        nul = data.index(b"\0", space)
+        entries[data[space + 1 : nul]] = (data[i:space], data[nul + 1 : nul + 21])
+        i = nul + 21
+    return entries
+
+
+def _tree_sort_key(item: Tuple[bytes, Tuple[bytes, bytes]]) -> bytes:
+    # git sorts a subtree as if its name ended with a slash.
+    name, (mode, _) = item
+    return name + b"/" if mode == TREE_MODE else name
+
+
+def patch_tree(odb, binsha: Optional[bytes], changes: TreeChanges) -> bytes:
+    """
+    Write the tree binsha with changes applied to odb, and return the new tree's binsha.
+
+    binsha is None for a tree that doesn't exist yet.
+    """
+    entries = _read_tree(odb, binsha) if binsha is not None else {}
+    for name, change in changes.items():
+        existing = entries.get(name)
+        if isinstance(change, dict):
+            if existing is not None and existing[0] != TREE_MODE:
+                raise YeyoPlumbingUnsupported(f"{name!r} changes from a file to a directory.")
+            subtree = existing[1] if existing is not None else None
+            entries[name] = (TREE_MODE, patch_tree(odb, subtree, change))
+        else:
+            if existing is not None and existing[0] == TREE_MODE:
+                raise YeyoPlumbingUnsupported(f"{name!r} changes from a directory to a file.")
+            entries[name] = change
+
+    data = b"".join(
+        mode + b" " + name + b"\0" + sha
+        for name, (mode, sha) in sorted(entries.items(), key=_tree_sort_key)
+    )
+    return _store(odb, b"tree", data, len(data))
+
+
+def _blob_mode(st: os.stat_result, work_tree_file: Path) -> bytes:
+    if stat.S_ISLNK(st.st_mode):
+        raise YeyoPlumbingUnsupported(f"{work_tree_file} is a symlink.")
+    if not stat.S_ISREG(st.st_mode):
+        raise YeyoPlumbingUnsupported(f"{work_tree_file} isn't a regular file.")
+    return b"100755" if st.st_mode & stat.S_IXUSR else b"100644"
+
+
+def hash_changes(odb, work_tree: Path, paths: Iterable[str]) -> TreeChanges:
+    """Write a blob for each of paths, relative to work_tree, and return them as tree changes."""
+    changes: TreeChanges = {}
+    for path in paths:
+        work_tree_file = work_tree / path
+        try:
+            st = os.lstat(work_tree_file)
+        except FileNotFoundError:
+            raise YeyoPlumbingUnsupported(f"{work_tree_file} was deleted.")
+        mode = _blob_mode(st, work_tree_file)
+
+        with open(work_tree_file, "rb") as in_handler:
+            binsha = _store(odb, b"blob", in_handler, st.st_size)
+
+        *directories, name = Path(path).as_posix().encode().split(b"/")
+        subtree = changes
+        for directory in directories:
+            subtree = subtree.setdefault(directory, {})
+        subtree[name] = (mode, binsha)
+    return changes
+
+
+def _signature(actor: "git.Actor", timestamp: int) -> bytes:
+    offset = time.localtime(timestamp).tm_gmtoff
+    sign = "+" if offset >= 0 else "-"
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    return f"{actor.name} <{actor.email}> {timestamp} {sign}{hours:02}{minutes:02}".encode()
+
+
+def _lock_ref(ref_path: Path) -> int:
+    ref_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        return os.open(f"{ref_path}.lock", os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except FileExistsError:
+        raise YeyoRefException(f"{ref_path} is locked by another git process.")
+
+
+def update_ref(
+    refs_dir: Path, ref: str, new: str, old: Optional[str], log_entry: Optional[bytes] = None
+):
+    """
+    Point ref in refs_dir at new, if it's still at old, or with old None, doesn't exist yet.
+
+    If log_entry is given and the ref has a reflog, it's appended to the reflog.
+    """
+    ref_path = refs_dir / ref
+    lock_path = Path(f"{ref_path}.lock")
+    fd = _lock_ref(ref_path)
+    try:
+        with os.fdopen(fd, "w") as out_handler:
+            out_handler.write(new + "\n")
+
+        current = refs.read_ref(refs_dir, ref)
+        if current != old:
+            raise YeyoRefException(
+                f"{ref} already exists." if old is None else f"{ref} moved to {current}."
+            )
+        os.replace(lock_path, ref_path)
+    except BaseException:
+        lock_path.unlink()
+        raise
+
+    log_path = refs_dir / "logs" / ref
+    if log_entry is not None and log_path.parent.is_dir():
+        with open(log_path, "ab") as out_handler:
+            out_handler.write(f"{old or '0' * 40} {new} ".encode() + log_entry + b"\n")
+
+
+def _is_valid_tag_name(tag: str) -> bool:
+    """Return True if tag is a valid ref name by the rules of `git check-ref-format`."""
+    if not tag or tag.startswith("/") or tag.endswith((".", "/", ".lock")) or tag == "@":
+        return False
+    if any(c in tag for c in " ~^:?*[\\\x7f") or any(ord(c) < 32 for c in tag):
+        return False
+    if ".." in tag or "@{" in tag or "//" in tag:
+        return False
+    return not any(part.startswith(".") or part.endswith(".lock") for part in tag.split("/"))
+
+
+def check_paths(paths: Iterable[str]):
+    """Raise YeyoPathException if any of paths, relative to the work tree, is outside of it."""
+    for path in paths:
+        normalized = Path(os.path.normpath(path))
+        if normalized.is_absolute() or normalized.parts[:1] in ((), ("..",), (".",)):
+            raise YeyoPathException(f"{path} is outside the work tree, it can't be committed.")
+
+
+def _raise_if_converted(repo: "git.Repo", paths: List[str]):
+    """Raise YeyoPlumbingUnsupported if git would convert any of paths when adding it."""
+    if repo.config_reader().get_value("core", "autocrlf", False) not in (False, "false"):
+        raise YeyoPlumbingUnsupported("core.autocrlf converts line endings.")
+
+    output = repo.git.check_attr("-z", *CONVERSION_ATTRIBUTES, "--", *paths)
+    fields = output.split("\0")
+    for path, attribute, value in zip(fields[::3], fields[1::3], fields[2::3]):
+        if value != "unspecified":
+            raise YeyoPlumbingUnsupported(f"The {attribute} attribute applies to {path}.")
+
+
+def _raise_if_unsupported(repo: "git.Repo", common_dir: Path, paths: List[str]):
+    config_reader = repo.config_reader()
+    if config_reader.get_value("extensions", "objectformat", "sha1") != "sha1":
+        raise YeyoPlumbingUnsupported("Only SHA-1 object names are supported.")
+    if os.name == "nt" or not config_reader.get_value("core", "filemode", True):
+        raise YeyoPlumbingUnsupported("File modes can't be read from the work tree.")
+    for date in ("GIT_AUTHOR_DATE", "GIT_COMMITTER_DATE"):
+        if date in os.environ:
+            raise YeyoPlumbingUnsupported(f"{date} is set.")
+
+    hooks_dir = Path(config_reader.get_value("core", "hookspath", str(common_dir / "hooks")))
+    if not hooks_dir.is_absolute():
+        hooks_dir = Path(repo.working_tree_dir) / hooks_dir
+    for hook in HOOKS:
+        if os.access(hooks_dir / hook, os.X_OK):
+            raise YeyoPlumbingUnsupported(f"The {hook} hook has to run.")
+
+    _raise_if_converted(repo, paths)
+
+
+def _head(git_dir: Path, common_dir: Path) -> Tuple[Optional[str], str]:
+    """Return the ref HEAD points to, None if it's detached, and the sha of the commit at HEAD."""
+    head = (git_dir / "HEAD").read_text().strip()
+    if not head.startswith("ref: "):
+        return None, head
+
+    ref = head[len("ref: ") :]
+    sha = refs.read_ref(common_dir, ref)
+    if sha is None:
+        raise YeyoPlumbingUnsupported(f"{ref} has no commits yet.")
+    return ref, sha
+
+
+def _parent_tree(odb, commit_binsha: bytes) -> bytes:
+    header = odb.stream(commit_binsha).read().split(b"\n\n", 1)[0]
+    for line in header.split(b"\n"):
+        if line.startswith(b"tree "):
+            return bytes.fromhex(line[len(b"tree ") :].decode())
+    raise ValueError(f"The commit {commit_binsha.hex()} has no tree.")
+
+
+def commit_and_tag(
+    repo: "git.Repo",
+    paths: List[str],
+    message: str,
+    tag: Optional[str] = None,
+    tag_message: Optional[str] = None,
+) -> str:
+    """
+    Commit paths, relative to the work tree, with message on top of HEAD, and tag the commit.
+
+    The tag is lightweight unless tag_message is given. Other changes in the index aren't
+    committed. Returns the new commit's sha.
+    """
+    import git
+    from gitdb import GitDB
+
+    check_paths(paths)
+    work_tree = Path(repo.working_tree_dir)
+    git_dir = Path(repo.git_dir)
+    common_dir = refs.git_dir(work_tree)
+    _raise_if_unsupported(repo, common_dir, paths)
+
+    if tag is not None and not _is_valid_tag_name(tag):
+        raise YeyoPlumbingUnsupported(f"{tag!r} isn't a valid tag name, git will say why.")
+
+    head_ref, parent = _head(git_dir, common_dir)
+    if tag is not None and refs.read_ref(common_dir, refs.TAGS_PREFIX + tag) is not None:
+        raise YeyoRefException(f"The tag {tag} already exists.")
+
+    odb = GitDB(str(common_dir / "objects"))
+    tree = patch_tree(
+        odb, _parent_tree(odb, bytes.fromhex(parent)), hash_changes(odb, work_tree, paths)
+    )
+
+    config_reader = repo.config_reader()
+    timestamp = int(time.time())
+    author = _signature(git.Actor.author(config_reader), timestamp)
+    committer = _signature(git.Actor.committer(config_reader), timestamp)
+    data = (
+        b"tree %s\nparent %s\nauthor %s\ncommitter %s\n\n"
+        % (tree.hex().encode(), parent.encode(), author, committer)
+        + message.encode()
+    )
+    commit = _store(odb, b"commit", data, len(data)).hex()
+
+    tag_sha = commit
+    if tag is not None and tag_message is not None:
+        data = (
+            b"object %s\ntype commit\ntag %s\ntagger %s\n\n"
+            % (commit.encode(), tag.encode(), committer)
+            + tag_message.encode()
+        )
+        tag_sha = _store(odb, b"tag", data, len(data)).hex()
+
+    # The index is refreshed before HEAD moves, so the changed paths are never seen as reverted.
+    repo.git.update_index("--add", "--", *paths)
+
+    log_entry = committer + b"\tcommit: " + message.split("\n", 1)[0].encode()
+    if head_ref is None:
+        update_ref(git_dir, "HEAD", commit, parent, log_entry)
+    else:
+        update_ref(common_dir, head_ref, commit, parent, log_entry)
+        log_path = git_dir / "logs" / "HEAD"
+        if log_path.exists():
+            with open(log_path, "ab") as out_handler:
+                out_handler.write(f"{parent} {commit} ".encode() + log_entry + b"\n")
+
+    if tag is not None:
+        update_ref(common_dir, refs.TAGS_PREFIX + tag, tag_sha, None)
+    return commit
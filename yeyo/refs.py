@@ -0,0 +1,197 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Lists a repo's tags by reading its refs directly, rather than through git or GitPython.
+
+A tag is either a line of `packed-refs` or a loose file under `refs/tags/`. Only the names are
+needed, so loose refs aren't read, just listed. The names are cached along with the mtime and size
+of `packed-refs` and the mtime of every directory under `refs/tags/`, since creating or deleting a
+tag changes one of those. While they're unchanged, the cached names are used as is.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from yeyo import cache
+from yeyo.index import RACY_WINDOW_NS
+
+REFS_CACHE_NAME = "refs.json"
+TAGS_PREFIX = "refs/tags/"
+
+# The mtime of each directory under refs/tags/, and the mtime and size of packed-refs.
+RefsKey = Tuple[Dict[str, int], Optional[Tuple[int, int]]]
+
+
+class YeyoNoRepoException(Exception):
+    """Raised when a directory isn't in a git repo."""
+
+
+def git_dir(directory: Path) -> Path:
+    """
+    Return the directory that holds the refs of the repo that directory is in.
+
+    The repo is given by $GIT_DIR if it's set, or else found the way git finds it, by looking for a
+    .git in directory and then in each of its parents. The refs are in the .git directory, or for a
+    linked worktree, in the common directory of its main repo. Raises YeyoNoRepoException if
+    directory isn't in a repo.
+    """
+    if os.environ.get("GIT_DIR"):
+        dot_git = Path(os.environ["GIT_DIR"]).absolute()
+    else:
+        directory = Path(directory).absolute()
+        for parent in [directory, *directory.parents]:
+            dot_git = parent / ".git"
+            if dot_git.exists():
+                break
+        else:
+            raise YeyoNoRepoException(f"{directory} isn't in a git repo.")
+
+    if dot_git.is_file():
+        # A linked worktree, or a submodule, points to its git directory.
+        gitdir = dot_git.read_text().strip()
+        if not gitdir.startswith("gitdir:"):
+            raise ValueError(f"Unable to read the git directory from {dot_git}.")
+        dot_git = (dot_git.parent / gitdir[len("gitdir:") :].strip()).resolve()
+
+    commondir = dot_git / "commondir"
+    if commondir.is_file():
+        dot_git = (dot_git / commondir.read_text().strip()).resolve()
+    return dot_git
+
+
+def _packed_tags(packed_refs: Path) -> List[str]:
+    names = []
+    with open(packed_refs, "rb") as in_handler:
+        for line in in_handler:
+            # Skip the header, and the peeled commits of annotated tags, which start with ^.
+            if line[:1] in (b"#", b"^"):
+                continue
+            _, _, ref = line.rstrip(b"\r\n").partition(b" ")
+            if ref.startswith(b"refs/tags/"):
+                names.append(ref[len(TAGS_PREFIX) :].decode("utf-8", "surrogateescape"))
+    return names
+
+
+def _loose_tags(tags_dir: Path) -> Tuple[List[str], Dict[str, int]]:
+    """Return the names of the loose tags under tags_dir, and the mtime of each directory."""
+    names = []
+    mtimes = {}
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        directory = os.path.join(tags_dir, relative)
+        try:
+            mtimes[relative] = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+
+        for entry in entries:
+            name = f"{relative}/{entry.name}" if relative else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(name)
+            elif not entry.name.endswith(".lock"):
+                names.append(name)
+    return names, mtimes
+
+
+def read_ref(refs_dir: Path, ref: str) -> Optional[str]:
+    """
+    Return the sha that ref, e.g. refs/heads/master, points to in refs_dir, or None if unset.
+
+    A loose ref takes precedence over a packed one.
+    """
+    try:
+        return (refs_dir / ref).read_text().strip()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        pass
+
+    try:
+        with open(refs_dir / "packed-refs", "rb") as in_handler:
+            for line in in_handler:
+                sha, _, name = line.rstrip(b"\r\n").partition(b" ")
+                if name.decode("utf-8", "surrogateescape") == ref and line[:1] not in (b"#", b"^"):
+                    return sha.decode()
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def _packed_key(packed_refs: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(packed_refs)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _is_current(refs_dir: Path, key: RefsKey) -> bool:
+    mtimes, packed = key
+    if _packed_key(refs_dir / "packed-refs") != (tuple(packed) if packed is not None else None):
+        return False
+
+    tags_dir = refs_dir / TAGS_PREFIX
+    for relative, mtime_ns in mtimes.items():
+        try:
+            if os.stat(os.path.join(tags_dir, relative)).st_mtime_ns != mtime_ns:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def _is_racy(key: RefsKey) -> bool:
+    """Return True if a change within the mtime granularity of key could go unnoticed."""
+    mtimes, packed = key
+    newest = max(list(mtimes.values()) + ([packed[0]] if packed is not None else []), default=0)
+    return time.time_ns() - newest < RACY_WINDOW_NS
+
+
+def tag_names(refs_dir: Path, cache_file: Optional[Path] = None) -> List[str]:
+    """
+    Return the names of the tags in the git directory refs_dir, see git_dir.
+
+    If cache_file is given, the names are cached there and reused while the refs are unchanged.
+    """
+    if cache_file is not None:
+        cached = cache.recall("refs", cache_file)
+        if cached is None:
+            try:
+                with open(cache_file) as in_handler:
+                    cached = json.load(in_handler)
+            except (OSError, ValueError):
+                cached = None
+        if cached is not None and _is_current(refs_dir, cached["key"]):
+            cache.remember("refs", cache_file, cached)
+            return cached["names"]
+
+    packed = _packed_key(refs_dir / "packed-refs")
+    names = _packed_tags(refs_dir / "packed-refs") if packed is not None else []
+    loose, mtimes = _loose_tags(refs_dir / TAGS_PREFIX)
+
+    # A tag can be both packed and loose, e.g. when it's updated after being packed.
+    names = sorted(set(names).union(loose))
+
+    key = (mtimes, packed)
+    if cache_file is not None and not _is_racy(key):
+        cached = {"key": key, "names": names}
+        cache.remember("refs", cache_file, cached)
+        cache.write(cache_file, json.dumps(cached).encode())
+    return names
+
+
+def tag_names_for_config(config_path: Path) -> List[str]:
+    """
+    Return the names of the tags in the repo the config at config_path is in, see tag_names.
+
+    Raises YeyoNoRepoException if the config isn't in a repo, see git_dir.
+    """
+    return tag_names(
+        git_dir(Path(config_path).parent), cache.cache_path(config_path, REFS_CACHE_NAME)
+    )
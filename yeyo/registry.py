@@ -0,0 +1,128 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+A sharded registry of tracked files, for configs that track a great many files.
+
+When a `.yeyo.d` directory exists next to the config, the tracked files are kept there instead of in
+the config's `files` list. There is one json shard per directory of tracked files, so adding or
+removing a file only rewrites the shard for that file's directory. The shards are merged back into
+`YeyoConfig.files` when the config is loaded.
+
+Entries are the same dicts as in the config's `files` list.
+"""
+
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from urllib.parse import quote
+
+from yeyo import fsutil
+
+REGISTRY_DIR_NAME = ".yeyo.d"
+
+Entry = Dict[str, Any]
+
+
+def registry_dir(config_path: Path) -> Path:
+    """Return the registry directory for the config at config_path."""
+    return Path(config_path).parent / REGISTRY_DIR_NAME
+
+
+def is_sharded(config_path: Path) -> bool:
+    """Return True if the config at config_path keeps its files in a sharded registry."""
+    return registry_dir(config_path).is_dir()
+
+
+def shard_name(file_path: str) -> str:
+    """
+    Return the name of the shard holding file_path, named after its percent-encoded directory.
+
+    The top-level directory, ".", is never produced by quote for a real directory name as "%2E".
+    """
+    parent = str(Path(file_path).parent)
+    return ("%2E" if parent == "." else quote(parent, safe="")) + ".json"
+
+
+def _read_shard(p: Path) -> List[Entry]:
+    try:
+        with open(p) as in_handler:
+            return json.load(in_handler)
+    except FileNotFoundError:
+        return []
+
+
+def _entry_key(entry: Entry):
+    return entry["file_path"], entry["match_template"], entry.get("template_type", "")
+
+
+def _write_shard(p: Path, entries: List[Entry]):
+    if not entries:
+        if p.exists():
+            os.unlink(p)
+        return
+
+    entries = sorted(entries, key=_entry_key)
+    fsutil.write_atomic(p, json.dumps(entries, indent=2).encode() + b"\n")
+
+
+def _group(entries: Iterable[Entry]) -> Dict[str, List[Entry]]:
+    shards: Dict[str, List[Entry]] = defaultdict(list)
+    for entry in entries:
+        shards[shard_name(entry["file_path"])].append(entry)
+    return shards
+
+
+def shard_paths(directory: Path) -> List[Path]:
+    """Return the paths of the shards in the registry directory."""
+    return sorted(p for p in Path(directory).glob("*.json"))
+
+
+def load_entries(directory: Path) -> List[Entry]:
+    """Load the entries of every shard in the registry directory."""
+    entries: List[Entry] = []
+    for p in shard_paths(directory):
+        entries.extend(_read_shard(p))
+    return entries
+
+
+def add_entries(directory: Path, entries: Iterable[Entry]):
+    """Add the entries to the registry, rewriting only the shards they belong to."""
+    for name, new_entries in _group(entries).items():
+        p = Path(directory) / name
+        existing = _read_shard(p)
+        existing.extend(e for e in new_entries if e not in existing)
+        _write_shard(p, existing)
+
+
+def remove_paths(directory: Path, file_paths: Iterable[str]):
+    """Remove every entry for the file_paths, rewriting only the shards they belong to."""
+    by_shard: Dict[str, set] = defaultdict(set)
+    for file_path in file_paths:
+        by_shard[shard_name(file_path)].add(file_path)
+
+    for name, removed in by_shard.items():
+        p = Path(directory) / name
+        existing = _read_shard(p)
+        kept = [e for e in existing if e["file_path"] not in removed]
+        if kept != existing:
+            _write_shard(p, kept)
+
+
+def sync(directory: Path, entries: Iterable[Entry]):
+    """Make the registry hold exactly the entries, only rewriting the shards that differ."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+
+    shards = _group(entries)
+    for p in shard_paths(directory):
+        if p.name not in shards:
+            _write_shard(p, [])
+
+    for name, shard_entries in shards.items():
+        p = Path(directory) / name
+        if sorted(_read_shard(p), key=_entry_key) != sorted(shard_entries, key=_entry_key):
+            _write_shard(p, shard_entries)
@@ -0,0 +1,434 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Rewrites the files tracked by yeyo, fanning the work out over a thread pool.
+
+A bump happens in two phases. The files are first scanned read-only for the spans to replace, and
+then only the files which had a match are rewritten, so files without the version keep their
+contents, mtimes and inodes.
+"""
+
+import contextlib
+import functools
+import hashlib
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+from typing import Union
+
+from yeyo import metrics
+
+Replacement = Tuple[str, str]
+Buffer = Union[bytes, mmap.mmap]
+
+# The size of the unchanged regions that are copied at once when writing a patched file.
+CHUNK_SIZE = 1 << 20
+
+# The placeholder for the version in a regex template, see RegexTemplate.
+VERSION_PLACEHOLDER = "yeyo_version"
+
+# The number of combined patterns kept compiled, patterns are keyed by their search strings and
+# regex templates, so a long running process reuses them across bumps from the same version.
+PATTERN_CACHE_SIZE = 256
+
+# A backreference by number, a backslash and a digit that aren't the end of an escaped backslash, or
+# a conditional on a numbered group.
+_NUMBERED_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d")
+
+
+class RegexTemplate(NamedTuple):
+    """
+    A regex match template, and the versions its placeholders match and are replaced with.
+
+    Each yeyo_version in the template becomes a named group matching the old version, and only
+    those groups are replaced by the new version, the text matched around them is kept as is.
+    """
+
+    template: str
+    old: str
+    new: str
+
+
+class FilePlan(NamedTuple):
+    """
+    The compiled replacements for a single file.
+
+    A match of a literal search string is replaced as a whole from replacements. A match of one of
+    the regex templates is the outer group named in groups, which maps to the names of its version
+    groups and the version they're replaced with.
+    """
+
+    file_path: Path
+    pattern: Optional[Pattern[bytes]]
+    replacements: Dict[bytes, bytes]
+    encoding: str = "utf-8"
+    regexes: Tuple[RegexTemplate, ...] = ()
+    groups: Optional[Dict[str, Tuple[Tuple[str, ...], bytes]]] = None
+
+
+class Span(NamedTuple):
+    """A byte range [start, end) of a file, holding old, that is replaced with new."""
+
+    start: int
+    end: int
+    new: bytes
+    old: bytes = b""
+
+
+class FileScan(NamedTuple):
+    """The spans found in a single file by the read-only scan."""
+
+    file_path: Path
+    spans: List[Span]
+    messages: List[str]
+    error: Optional[Exception] = None
+    sha256: Optional[str] = None
+
+
+Lookup = Callable[[FilePlan], Optional[List[Span]]]
+
+
+class StagedFile(NamedTuple):
+    """A patched copy of a file, written next to it but not yet moved into place."""
+
+    file_path: Path
+    staged_path: Optional[Path] = None
+    sha256: Optional[str] = None
+    error: Optional[Exception] = None
+    occurrences: Optional[List[Tuple[int, int, bytes]]] = None
+
+
+@contextlib.contextmanager
+def _map_file(in_handler: BinaryIO) -> Iterator[Buffer]:
+    """Memory-map the open file, empty files can't be mapped so they yield an empty buffer."""
+    if os.fstat(in_handler.fileno()).st_size == 0:
+        yield b""
+        return
+
+    with mmap.mmap(in_handler.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        yield buf
+
+
+def _regex_source(template: bytes, version: bytes, name: str) -> Tuple[bytes, Tuple[str, ...]]:
+    """
+    Turn template into a regex whose placeholders are groups matching version.
+
+    Returns the regex, with the whole template in the group called name, and the version groups.
+    """
+    parts = template.split(VERSION_PLACEHOLDER.encode())
+    if len(parts) == 1:
+        raise ValueError(f"The regex template {template!r} doesn't contain {VERSION_PLACEHOLDER}.")
+
+    groups = tuple(f"{name}v{i}" for i in range(len(parts) - 1))
+    source = parts[0]
+    for group, part in zip(groups, parts[1:]):
+        source += b"(?P<" + group.encode() + b">" + re.escape(version) + b")" + part
+    return b"(?P<" + name.encode() + b">" + source + b")", groups
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def _compile_pattern(
+    search_strings: Tuple[bytes, ...], regexes: Tuple[Tuple[bytes, bytes], ...] = ()
+) -> Tuple[Pattern[bytes], Dict[str, Tuple[str, ...]]]:
+    """
+    Compile the regex templates and search strings into one alternation.
+
+    The regex templates, given as (template, version) pairs, come first in order, and then the
+    search strings longest first, so the longest literal match is preferred. Returns the pattern
+    and the version groups of each regex template's group.
+    """
+    alternatives = []
+    groups = {}
+    for i, (template, version) in enumerate(regexes):
+        source, groups[f"r{i}"] = _regex_source(template, version, f"r{i}")
+        alternatives.append(source)
+
+    alternatives.extend(re.escape(s) for s in sorted(search_strings, key=len, reverse=True))
+    # ^ and $ in a regex template match at the start and end of each line.
+    return re.compile(b"|".join(alternatives), re.MULTILINE), groups
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_template(template: str) -> Pattern[str]:
+    """
+    Compile the regex template on its own, matching any version, to check that it's valid.
+
+    Raises a ValueError if it isn't a valid regex, doesn't contain the placeholder, or can match
+    the empty string, e.g. because the version is optional. At bump time the template is wrapped
+    in groups and combined with others, see _compile_pattern, so a template with a numbered
+    backreference, a named group or anything else that doesn't compile in that form is rejected too.
+    """
+    if VERSION_PLACEHOLDER not in template:
+        raise ValueError(f"The regex template {template!r} doesn't contain {VERSION_PLACEHOLDER}.")
+    if _NUMBERED_REFERENCE.search(template):
+        raise ValueError(
+            f"The regex template {template!r} has a numbered backreference, which would refer to "
+            "another group once it's combined with the other templates."
+        )
+    try:
+        pattern = re.compile(template.replace(VERSION_PLACEHOLDER, r"(?:\S+?)"), re.MULTILINE)
+        if pattern.groupindex:
+            raise ValueError(f"The regex template {template!r} has named groups, use (?:...).")
+        _compile_pattern((), ((template.encode(), b"0.0.0"),))
+    except re.error as e:
+        raise ValueError(f"The regex template {template!r} is invalid: {e}.")
+
+    if pattern.fullmatch("") is not None:
+        raise ValueError(f"The regex template {template!r} can match the empty string.")
+    return pattern
+
+
+def compile_plan(
+    replacements: Dict[Path, List[Union[Replacement, RegexTemplate]]], encoding: str = "utf-8"
+) -> List[FilePlan]:
+    """
+    Compile the replacements into a plan per file, sorted by path.
+
+    Each file's search strings and regex templates are combined into one pattern, so every file is
+    scanned once no matter how many templates it's listed under. Compiled patterns are cached, so
+    files with the same templates, e.g. all the files using the default template, share one.
+    """
+    plans = []
+    for file_path in sorted(replacements):
+        encoded = {}
+        regexes = []
+        for replacement in replacements[file_path]:
+            if isinstance(replacement, RegexTemplate):
+                compile_template(replacement.template)
+                regexes.append(replacement)
+            elif replacement[0]:
+                encoded[replacement[0].encode(encoding)] = replacement[1].encode(encoding)
+
+        if not encoded and not regexes:
+            plans.append(FilePlan(file_path, None, encoded, encoding))
+            continue
+
+        regexes = sorted(set(regexes))
+        pattern, version_groups = _compile_pattern(
+            tuple(sorted(encoded)),
+            tuple((r.template.encode(encoding), r.old.encode(encoding)) for r in regexes),
+        )
+        groups = {
+            f"r{i}": (version_groups[f"r{i}"], regex.new.encode(encoding))
+            for i, regex in enumerate(regexes)
+        }
+        plans.append(
+            FilePlan(file_path, pattern, encoded, encoding, tuple(regexes), groups or None)
+        )
+
+    return plans
+
+
+def next_pattern(plan: FilePlan) -> Optional[Pattern[bytes]]:
+    """
+    Return the pattern the next bump of the plan's file will scan with, if it's known.
+
+    The next bump searches for what this one replaces with, unless the file has regex templates.
+    """
+    if plan.regexes or not plan.replacements:
+        return None
+    return _compile_pattern(tuple(sorted(set(plan.replacements.values()))))[0]
+
+
+def _find_spans(buf: Buffer, plan: FilePlan) -> List[Span]:
+    """Find the spans of buf matched by the plan in a single pass."""
+    if plan.pattern is None:
+        return []
+
+    spans = []
+    for m in plan.pattern.finditer(buf):
+        if plan.groups is None or m.lastgroup not in plan.groups:
+            spans.append(Span(m.start(), m.end(), plan.replacements[m.group()], m.group()))
+            continue
+
+        # Only the version groups in the alternative that matched take part, the others are unset.
+        version_groups, new = plan.groups[m.lastgroup]
+        for group in version_groups:
+            start, end = m.span(group)
+            if start != -1:
+                spans.append(Span(start, end, new, m.group(group)))
+    return spans
+
+
+def patch_bytes(plan: FilePlan, data: bytes) -> bytes:
+    """Return data with the plan's replacements made, for contents that are already in memory."""
+    patched = bytearray()
+    position = 0
+    for span in _find_spans(data, plan):
+        patched += data[position : span.start] + span.new
+        position = span.end
+    return bytes(patched + data[position:])
+
+
+def _line_messages(file_path: Path, buf: Buffer, spans: List[Span], encoding: str) -> List[str]:
+    """Describe each changed line, only reading the lines that contain a span."""
+    messages = []
+
+    i = 0
+    while i < len(spans):
+        line_start = buf.rfind(b"\n", 0, spans[i].start) + 1
+        line_end = buf.find(b"\n", spans[i].end)
+        if line_end == -1:
+            line_end = len(buf)
+
+        line_spans = []
+        while i < len(spans) and spans[i].start < line_end:
+            line_spans.append(spans[i])
+            i += 1
+
+        old_line = buf[line_start:line_end]
+        new_line = bytearray()
+        position = line_start
+        for span in line_spans:
+            new_line += buf[position : span.start] + span.new
+            position = span.end
+        new_line += buf[position:line_end]
+
+        old_text = old_line.rstrip(b"\r").decode(encoding, errors="replace")
+        new_text = bytes(new_line).rstrip(b"\r").decode(encoding, errors="replace")
+        messages.append(f"Replacing line: {old_text} with {new_text} in file {file_path}.")
+
+    return messages
+
+
+def _copy_patched(buf: Buffer, spans: List[Span], out_handler: BinaryIO) -> str:
+    """
+    Stream buf to out_handler in bounded chunks, substituting the spans along the way.
+
+    Returns the sha256 of everything written.
+    """
+    digest = hashlib.sha256()
+
+    position = 0
+    for span in spans + [Span(len(buf), len(buf), b"")]:
+        while position < span.start:
+            chunk_end = min(position + CHUNK_SIZE, span.start)
+            chunk = buf[position:chunk_end]
+            out_handler.write(chunk)
+            digest.update(chunk)
+            position = chunk_end
+        out_handler.write(span.new)
+        digest.update(span.new)
+        position = span.end
+
+    return digest.hexdigest()
+
+
+def _write_patched(file_path: Path, buf: Buffer, spans: List[Span]) -> Tuple[str, str]:
+    """
+    Write the patched buf to a temporary file next to file_path.
+
+    Returns the name of the temporary file and the sha256 of its contents.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=str(file_path.parent), prefix=f".{file_path.name}.")
+    try:
+        with open(fd, "wb") as out_handler:
+            sha256 = _copy_patched(buf, spans, out_handler)
+        shutil.copymode(str(file_path), tmp_name)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return tmp_name, sha256
+
+
+def scan_file(plan: FilePlan, lookup: Optional[Lookup] = None, digest: bool = False) -> FileScan:
+    """
+    Find the spans of the plan's file that need replacing, without modifying it.
+
+    If lookup returns the spans for the plan, e.g. from an index of earlier bumps, they're used as
+    is. Otherwise the plan's pattern is matched directly against the memory-mapped file. Either way,
+    only the lines that contain a span are decoded to describe the change. If digest is True, the
+    sha256 of the scanned contents is included.
+    """
+    file_path = plan.file_path
+    try:
+        with open(file_path, "rb") as in_handler, _map_file(in_handler) as buf:
+            spans = lookup(plan) if lookup is not None else None
+            if spans is not None and any(buf[s.start : s.end] != s.old for s in spans):
+                spans = None
+            if spans is None:
+                spans = _find_spans(buf, plan)
+                metrics.count("files_scanned")
+                metrics.count("bytes_read", len(buf))
+            else:
+                metrics.count("files_indexed")
+            messages = _line_messages(file_path, buf, spans, plan.encoding)
+            sha256 = hashlib.sha256(buf).hexdigest() if digest else None
+    except Exception as e:
+        return FileScan(file_path, [], [], e)
+
+    return FileScan(file_path, spans, messages, sha256=sha256)
+
+
+def scan_files(
+    plans: List[FilePlan],
+    jobs: Optional[int] = None,
+    lookup: Optional[Lookup] = None,
+    digest: bool = False,
+) -> Iterator[FileScan]:
+    """Scan the planned files concurrently with at most jobs threads, in the order of plans."""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(lambda plan: scan_file(plan, lookup, digest), plans)
+
+
+def stage_file(scan: FileScan, find: Optional[Pattern[bytes]] = None) -> StagedFile:
+    """
+    Write the file with the scanned spans replaced to a temporary file next to it.
+
+    The unchanged regions between spans are streamed to the new file in bounded chunks, so memory
+    use doesn't grow with the size of the file. The original file isn't touched. If find is given,
+    e.g. see next_pattern, the staged copy, which was just written and is still cached, is searched
+    for it, and the matches are returned as occurrences.
+    """
+    file_path = scan.file_path
+    occurrences = None
+    try:
+        with open(file_path, "rb") as in_handler, _map_file(in_handler) as buf:
+            tmp_name, sha256 = _write_patched(file_path, buf, scan.spans)
+            size = len(buf) + sum(len(s.new) - (s.end - s.start) for s in scan.spans)
+
+        if find is not None:
+            with open(tmp_name, "rb") as in_handler, _map_file(in_handler) as buf:
+                occurrences = [(m.start(), m.end(), m.group()) for m in find.finditer(buf)]
+    except Exception as e:
+        return StagedFile(file_path, error=e)
+
+    metrics.count("bytes_written", size)
+    return StagedFile(file_path, Path(tmp_name), sha256, occurrences=occurrences)
+
+
+def stage_files(
+    scans: List[FileScan],
+    jobs: Optional[int] = None,
+    finds: Optional[List[Optional[Pattern[bytes]]]] = None,
+) -> Iterator[StagedFile]:
+    """
+    Stage the scanned files concurrently with at most jobs threads, in the order of scans.
+
+    finds, if given, holds the pattern to search each staged copy for, see stage_file.
+    """
+    if finds is None:
+        finds = [None] * len(scans)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(stage_file, scans, finds)
+
+
+def discard_staged(staged_files: List[StagedFile]):
+    """Remove the temporary files of staged files that were never moved into place."""
+    for staged in staged_files:
+        if staged.staged_path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(staged.staged_path)
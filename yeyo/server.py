@@ -0,0 +1,171 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Serves yeyo commands from a long running process over a Unix socket, see `yeyo serve`.
+
+Each request is a single line of JSON with the command's arguments and working directory, and each
+response a single line of JSON with the command's exit code and output. Requests are handled one at
+a time in the server's process, which keeps the heavy imports, the parsed configs, the compiled
+templates, the directory and occurrence indexes and the git repos in memory between them. All of
+those are checked against the files on disk when they're used, so changes are picked up.
+"""
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import traceback
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from yeyo import cache
+
+SOCKET_NAME = "serve.sock"
+
+# The top level commands that the server runs, anything else is run by the client itself.
+SERVED_COMMANDS = {"bump", "files", "git", "history"}
+
+
+class Response(NamedTuple):
+    """The outcome of a command run by the server."""
+
+    exit_code: int
+    stdout: str
+    stderr: str
+
+
+def default_socket_path(config_path: Path) -> Path:
+    """Return the socket the server for the config at config_path listens on by default."""
+    return cache.cache_path(config_path, SOCKET_NAME)
+
+
+def is_served(argv: List[str]) -> bool:
+    """Return True if the command given by argv, which starts with the command, is served."""
+    return bool(argv) and argv[0] in SERVED_COMMANDS
+
+
+def run_command(argv: List[str], cwd: str) -> Response:
+    """Run the yeyo command given by argv in cwd, capturing its exit code and output."""
+    import click
+
+    from yeyo.cli import main
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    previous_cwd = os.getcwd()
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                # Outside of standalone mode, click returns the exit code of e.g. --help.
+                rv = main.main(args=argv, prog_name="yeyo", standalone_mode=False)
+                exit_code = rv if isinstance(rv, int) else 0
+            except click.ClickException as e:
+                e.show(file=stderr)
+                exit_code = e.exit_code
+            except click.exceptions.Abort:
+                stderr.write("Aborted!\n")
+                exit_code = 1
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else 1
+            except Exception:
+                traceback.print_exc(file=stderr)
+                exit_code = 1
+    finally:
+        os.chdir(previous_cwd)
+
+    return Response(exit_code, stdout.getvalue(), stderr.getvalue())
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request: Dict[str, Any] = json.loads(self.rfile.readline())
+            argv, cwd = request["argv"], request["cwd"]
+        except (ValueError, KeyError, TypeError) as e:
+            response = Response(2, "", f"Invalid request: {e}\n")
+        else:
+            if is_served(argv):
+                response = run_command(argv, cwd)
+            else:
+                response = Response(2, "", f"The server doesn't run: {' '.join(argv)}\n")
+
+        self.wfile.write(json.dumps(response._asdict()).encode() + b"\n")
+
+
+def _is_listening(socket_path: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def make_server(socket_path: Path) -> socketserver.UnixStreamServer:
+    """Create a server listening on socket_path, that handles one request at a time."""
+    return socketserver.UnixStreamServer(str(socket_path), _Handler)
+
+
+def serve(socket_path: Path):
+    """
+    Serve commands on socket_path until interrupted or terminated.
+
+    A socket left behind by a server that's no longer running is replaced.
+    """
+    if socket_path.exists():
+        if _is_listening(socket_path):
+            raise OSError(f"A server is already listening on {socket_path}.")
+        socket_path.unlink()
+
+    # Requests change the working directory, so the socket is removed by its absolute path.
+    socket_path = socket_path.absolute()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    cache.keep_in_memory()
+
+    server = make_server(socket_path)
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            socket_path.unlink()
+        cache.keep_in_memory(False)
+
+
+def request(socket_path: Path, argv: List[str], cwd: str) -> Optional[Response]:
+    """
+    Ask the server on socket_path to run the command given by argv in cwd.
+
+    Returns None if there's no server to ask, e.g. it isn't running or the platform has no Unix
+    sockets.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return None
+
+        sock.sendall(json.dumps({"argv": argv, "cwd": cwd}).encode() + b"\n")
+        with sock.makefile("rb") as in_handler:
+            line = in_handler.readline()
+
+    if not line:
+        return None
+    return Response(**json.loads(line))
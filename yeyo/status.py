@@ -0,0 +1,98 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Checks whether a repo has changes besides the ones a bump makes, with one `git status` call.
+
+How much of the repo is checked is set by the scope:
+
+- tracked-only: modified, staged and deleted tracked files anywhere, but no untracked files, so git
+  only compares the index to the working tree and never walks it for new files.
+- pathspec: modified and untracked files in the directories that hold the config and the tracked
+  files, but not in their subdirectories.
+- full: modified and untracked files anywhere.
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+
+if TYPE_CHECKING:
+    import git
+
+DIRTY_SCOPES = ("tracked-only", "pathspec", "full")
+DEFAULT_DIRTY_SCOPE = "full"
+
+# The kind of change for each status letter, the first of these found in a file's XY status wins.
+_KINDS = (("U", "unmerged"), ("D", "deleted"), ("R", "renamed"), ("C", "copied"), ("A", "added"))
+
+
+class DirtyFile(NamedTuple):
+    """A file with changes, and git's two letter status of the index and the working tree."""
+
+    path: Path
+    kind: str
+    xy: str
+
+    def to_dict(self):
+        """Convert the file to a dictionary."""
+        return {"path": str(self.path), "kind": self.kind, "xy": self.xy}
+
+    def __str__(self):
+        """Return the path and the kind of change, e.g. `VERSION (modified)`."""
+        return f"{self.path} ({self.kind})"
+
+
+def _kind(xy: str) -> str:
+    for letter, kind in _KINDS:
+        if letter in xy:
+            return kind
+    return "modified"
+
+
+def parse_porcelain_v2(output: str) -> List[DirtyFile]:
+    """Parse the output of `git status --porcelain=v2 -z` into the changed files."""
+    dirty = []
+    records = iter(output.split("\0"))
+    for record in records:
+        if not record or record.startswith("#") or record.startswith("!"):
+            continue
+
+        if record.startswith("? "):
+            dirty.append(DirtyFile(Path(record[2:]), "untracked", "??"))
+            continue
+
+        # Ordinary, renamed or copied, and unmerged entries have 8, 9 and 10 fields before the path.
+        fields = {"1": 8, "2": 9, "u": 10}[record[0]]
+        parts = record.split(" ", fields)
+        dirty.append(DirtyFile(Path(parts[fields]), _kind(parts[1]), parts[1]))
+        if record[0] == "2":
+            # A rename or copy is followed by the path it came from.
+            next(records, None)
+    return dirty
+
+
+def _pathspecs(allowed_paths: Iterable[Path]) -> List[str]:
+    directories = {Path(p).parent for p in allowed_paths}
+    return sorted(":(glob)*" if d == Path(".") else f":(glob){d.as_posix()}/*" for d in directories)
+
+
+def dirty_files(
+    repo: "git.Repo", allowed_paths: Iterable[Path], scope: str = DEFAULT_DIRTY_SCOPE
+) -> List[DirtyFile]:
+    """Return the files in scope with changes, other than those in allowed_paths."""
+    if scope not in DIRTY_SCOPES:
+        raise ValueError(f"Unknown dirty scope {scope}, expected one of {DIRTY_SCOPES}.")
+
+    allowed_paths = {Path(p) for p in allowed_paths}
+    args = ["--porcelain=v2", "-z"]
+    if scope == "tracked-only":
+        args.append("--untracked-files=no")
+    else:
+        args.append("--untracked-files=all")
+    if scope == "pathspec":
+        args.extend(["--", *_pathspecs(allowed_paths)])
+
+    output = repo.git.status(*args)
+    return [f for f in parse_porcelain_v2(output) if f.path not in allowed_paths]
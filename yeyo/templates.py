@@ -0,0 +1,65 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Renders yeyo's jinja templates through a single shared environment.
+
+Templates are looked up by their source, so the environment's LRU cache holds the compiled template
+for each distinct source string. Optionally, the compiled bytecode is also cached on disk so that
+later processes can skip compiling the same templates.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+from yeyo import metrics
+
+# How many compiled templates are kept in memory.
+TEMPLATE_CACHE_SIZE = 400
+
+_bytecode_cache_dir: Optional[Path] = None
+_environment = None
+
+
+def configure(bytecode_cache_dir: Optional[Path] = None):
+    """
+    Set the directory for the on-disk bytecode cache, None disables it.
+
+    This doesn't import jinja2, the environment is created the first time a template is rendered.
+    The environment, and the templates it has compiled, are kept if the directory is unchanged.
+    """
+    global _bytecode_cache_dir, _environment
+
+    if bytecode_cache_dir != _bytecode_cache_dir:
+        _bytecode_cache_dir = bytecode_cache_dir
+        _environment = None
+
+
+def get_environment():
+    """Return the shared environment, creating it on first use."""
+    global _environment
+
+    if _environment is None:
+        import jinja2
+
+        bytecode_cache = None
+        if _bytecode_cache_dir is not None:
+            _bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(str(_bytecode_cache_dir))
+
+        # The name of each template is its source, and sources never go out of date.
+        loader = jinja2.FunctionLoader(lambda source: (source, None, lambda: True))
+
+        _environment = jinja2.Environment(
+            loader=loader,
+            cache_size=TEMPLATE_CACHE_SIZE,
+            auto_reload=False,
+            bytecode_cache=bytecode_cache,
+        )
+
+    return _environment
+
+
+def render(source: str, **kwargs) -> str:
+    """Render the template source with kwargs, compiling it only if it isn't cached."""
+    with metrics.phase("templates.render"):
+        return get_environment().get_template(source).render(**kwargs)
@@ -0,0 +1,36 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""Fixtures shared by the tests."""
+
+import os
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+
+import git
+import pytest
+
+
+@pytest.fixture
+def make_repo():
+    """
+    Return a function that makes a git repo at root, with the files it's given in one commit.
+
+    The files map paths relative to root to their contents, the paths in executable are made
+    executable. Files a .gitignore among them ignores are written but not committed.
+    """
+
+    def make(root: Path, files: Dict[str, str], executable: Iterable[str] = ()) -> git.Repo:
+        repo = git.Repo.init(str(root))
+        for name, contents in files.items():
+            p = root / name
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text(contents)
+        for name in executable:
+            os.chmod(root / name, 0o755)
+
+        repo.git.add("--all")
+        repo.index.commit("COMMIT")
+        return repo
+
+    return make
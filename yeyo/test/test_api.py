@@ -0,0 +1,93 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from yeyo.api import Chain
+from yeyo.api import Step
+from yeyo.config import DEFAULT_COMMIT_TEMPLATE
+from yeyo.config import DEFAULT_TAG_TEMPLATE
+from yeyo.config import YEYO_VERSION_TEMPLATE
+from yeyo.config import YeyoConfig
+
+
+class TestChain(unittest.TestCase):
+    def test_steps(self):
+
+        yc = YeyoConfig.from_version_string("0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE)
+        chain = Chain.from_config(yc).bump_minor().bump_prerelease().finalize()
+
+        self.assertEqual(
+            chain.steps,
+            (
+                Step("bump_minor", "0.2.0"),
+                Step("bump_prerelease", "0.2.0-dev.1"),
+                Step("finalize", "0.2.0"),
+            ),
+        )
+        self.assertEqual(chain.version_string, "0.2.0")
+        self.assertIs(chain.start, yc)
+        self.assertIs(chain.config.files, yc.files)
+
+    def test_apply_writes_net_change_once(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            config_path = tmp_path / "test.yaml"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(version, YEYO_VERSION_TEMPLATE)
+            yc.to_yaml(config_path)
+            version.write_text("0.1.1")
+
+            chain = Chain.from_yaml(config_path)
+            for _ in range(1000):
+                chain = chain.bump_prerelease()
+            chain = chain.bump_major()
+
+            with mock.patch.object(YeyoConfig, "update", wraps=chain.config.update) as update:
+                applied = chain.apply(config_path)
+
+            update.assert_called_once()
+            self.assertEqual(applied.version_string, "1.0.0")
+            self.assertEqual(version.read_text(), "1.0.0")
+            self.assertEqual(YeyoConfig.from_yaml(config_path).version_string, "1.0.0")
+
+    def test_apply_without_change(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = Path(tmp) / "test.yaml"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            )
+            chain = Chain.from_config(yc).bump_prerelease().finalize()
+
+            self.assertFalse(chain.changed)
+            chain.apply(config_path)
+            self.assertFalse(config_path.exists())
+
+    def test_apply_build_only(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            config_path = tmp_path / "test.yaml"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(version, YEYO_VERSION_TEMPLATE)
+            yc.to_yaml(config_path)
+            version.write_text("0.1.1")
+
+            chain = Chain.from_yaml(config_path).bump_build()
+
+            self.assertTrue(chain.changed)
+            applied = chain.apply(config_path)
+            self.assertEqual(version.read_text(), applied.version_string)
+            self.assertEqual(YeyoConfig.from_yaml(config_path).version_string, "0.1.1+build.1")
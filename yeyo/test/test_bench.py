@@ -0,0 +1,53 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from yeyo import bench
+from yeyo import cli
+
+
+class TestBench(unittest.TestCase):
+    def test_bench_bump_derivation(self):
+
+        results = bench.bench_bump_derivation(sizes=[10, 100], repeat=1)
+
+        self.assertEqual({r.size for r in results}, {10, 100})
+        self.assertIn("bump_prerelease", {r.name for r in results})
+        self.assertTrue(all(r.seconds >= 0 for r in results))
+
+    def test_synthetic_config(self):
+
+        self.assertEqual(len(bench.synthetic_config(50).files), 50)
+
+    def test_synthetic_contents(self):
+
+        contents = bench.synthetic_contents(100, 3, "0.1.0")
+
+        self.assertEqual(contents.count(b"0.1.0"), 3)
+        self.assertGreaterEqual(len(contents), 90)
+
+    def test_run_suite(self):
+
+        tiny = bench.Scale("tiny", 3, 64, 2)
+        with mock.patch.dict(bench.SCALES, {"tiny": tiny}):
+            report = bench.run_suite(["tiny"], repeat=1)
+
+        names = {r["name"] for r in report["results"]}
+        self.assertTrue({"from_yaml_cold", "update_files", "files_add", "tag_after"} <= names)
+        self.assertEqual({r["scale"] for r in report["results"]}, {"tiny"})
+
+    def test_cli_options(self):
+
+        runner = CliRunner()
+        result = runner.invoke(cli.main, ["dev", "bench", "--help"])
+        # The help is written out, so bench isn't imported to build it.
+        self.assertTrue(all(name in result.output for name in bench.SCALES))
+        self.assertIn(f"defaults to {bench.DEFAULT_REPEAT}", result.output)
+
+        result = runner.invoke(cli.main, ["dev", "bench", "-s", "huge"])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("Unknown scales ['huge']", result.output)
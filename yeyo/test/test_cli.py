@@ -1,6 +1,9 @@
 # (c) Copyright 2019 Trent Hauck
 # All Rights Reserved
 
+import os
+import subprocess
+import sys
 import unittest
 from pathlib import Path
 from typing import List
@@ -17,10 +20,16 @@ from yeyo.cli import STARTING_VERSION
 from yeyo.config import DEFAULT_COMMIT_TEMPLATE
 from yeyo.config import DEFAULT_CONFIG_PATH
 from yeyo.config import DEFAULT_TAG_TEMPLATE
+from yeyo.config import REGEX_TEMPLATE
 from yeyo.config import YEYO_VERSION_TEMPLATE
 from yeyo.config import FileVersion
 from yeyo.config import YeyoConfig
 
+# The cumulative time it may take to import yeyo.cli, in microseconds, as reported by -X importtime.
+IMPORT_TIME_BUDGET_US = 250_000
+
+HEAVY_MODULES = ("git", "jinja2", "py", "ruamel", "semver", "yeyo.bench")
+
 TEST_FILE = Path("VERSION")
 TEST_FILE_VERSION = FileVersion(TEST_FILE, YEYO_VERSION_TEMPLATE)
 
@@ -89,6 +98,158 @@ def test_version_bumps():
                 assert_tag_in_tags(expected_git_tag, repo)
 
 
+def test_sharded_files():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("a").mkdir()
+        Path("a/VERSION").write_text(STARTING_VERSION)
+        Path(TEST_FILE).write_text(STARTING_VERSION)
+
+        for command in [
+            ["init", "--default"],
+            ["files", "shard"],
+            ["files", "add", "a/VERSION"],
+            ["bump", "patch"],
+        ]:
+            result = runner.invoke(cli.main, command)
+            assert result.exit_code == 0, result.output
+
+        assert sorted(p.name for p in Path(".yeyo.d").iterdir()) == ["%2E.json", "a.json"]
+
+        yc = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH))
+        assert {f.file_path for f in yc.files} == {TEST_FILE, Path("a/VERSION")}
+        assert_files_in_config_have_version(yc)
+
+
+def test_bulk_files_add_and_rm():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for name in ["a", "b", "c"]:
+            Path(name).mkdir()
+            Path(name, "setup.py").write_text(f'version="{STARTING_VERSION}"')
+
+        assert runner.invoke(cli.main, ["init"]).exit_code == 0
+
+        stdin = "c/setup.py -t 'version=\"yeyo_version\"'\n# a comment\nVERSION\n"
+        result = runner.invoke(
+            cli.main, ["files", "add", "[ab]/setup.py", "--from-file", "-"], stdin
+        )
+        assert result.exit_code == 0, result.output
+
+        yc = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH))
+        assert yc.files == {
+            FileVersion(Path("a/setup.py"), YEYO_VERSION_TEMPLATE),
+            FileVersion(Path("b/setup.py"), YEYO_VERSION_TEMPLATE),
+            FileVersion(Path("c/setup.py"), 'version="yeyo_version"'),
+            FileVersion(Path("VERSION"), YEYO_VERSION_TEMPLATE),
+        }
+
+        result = runner.invoke(cli.main, ["files", "rm", "*/setup.py", "VERSION"])
+        assert result.exit_code == 0, result.output
+
+        yc = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH))
+        assert yc.files == set()
+
+
+def test_files_add_and_rm_globs():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for p in ["a/setup.py", "a/b/setup.py", "setup.py"]:
+            Path(p).parent.mkdir(parents=True, exist_ok=True)
+            Path(p).write_text(STARTING_VERSION)
+        Path("a/dir.py").mkdir()
+
+        assert runner.invoke(cli.main, ["init"]).exit_code == 0
+
+        result = runner.invoke(cli.main, ["files", "add", "a/*.py", "**/b/*.py"])
+        assert result.exit_code == 0, result.output
+        yc = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH))
+        assert {fv.file_path for fv in yc.files} == {Path("a/setup.py"), Path("a/b/setup.py")}
+
+        result = runner.invoke(cli.main, ["files", "add", "setup.py", "c/*.py"])
+        assert result.exit_code == 2
+        assert "No files match 'c/*.py'." in result.output
+        assert YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH)) == yc
+
+        result = runner.invoke(cli.main, ["files", "rm", "a/*.py"])
+        assert result.exit_code == 0, result.output
+        yc = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH))
+        assert {fv.file_path for fv in yc.files} == {Path("a/b/setup.py")}
+
+
+def test_files_add_regex():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("setup.py").write_text(
+            f"version = '{STARTING_VERSION}'\nother = '{STARTING_VERSION}'\n"
+        )
+        assert runner.invoke(cli.main, ["init"]).exit_code == 0
+
+        template = r"version\s*=\s*['\"]yeyo_version['\"]"
+        result = runner.invoke(cli.main, ["files", "add", "setup.py", "--regex", "-t", template])
+        assert result.exit_code == 0, result.output
+
+        result = runner.invoke(cli.main, ["files", "add", "VERSION", "--regex", "-t", "(0.1.0"])
+        assert result.exit_code == 2
+
+        yc = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH))
+        assert yc.files == {FileVersion(Path("setup.py"), template, REGEX_TEMPLATE)}
+
+        result = runner.invoke(cli.main, ["bump", "minor"])
+        assert result.exit_code == 0, result.output
+        version_string = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH)).version_string
+        assert version_string != STARTING_VERSION
+        expected = f"version = '{version_string}'\nother = '{STARTING_VERSION}'\n"
+        assert Path("setup.py").read_text() == expected
+
+        # The setup.py now has a version the config doesn't, so its regex template doesn't match.
+        Path("setup.py").write_text("version = '9.9.9'\n")
+        result = runner.invoke(cli.main, ["bump", "minor"])
+        assert result.exit_code == 1
+        assert YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH)).version_string == version_string
+
+
+def test_apply_errors():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert runner.invoke(cli.main, ["init"]).exit_code == 0
+
+        Path("bad.ndjson").write_text("not a plan\n")
+        result = runner.invoke(cli.main, ["apply", "bad.ndjson"])
+        assert result.exit_code == 1
+        assert "Error: bad.ndjson is not a valid plan" in result.output
+
+        result = runner.invoke(cli.main, ["bump", "minor", "--plan", "bump.ndjson"])
+        assert result.exit_code == 0, result.output
+        assert runner.invoke(cli.main, ["bump", "patch"]).exit_code == 0
+        result = runner.invoke(cli.main, ["apply", "bump.ndjson"])
+        assert result.exit_code == 1
+        assert "changed since the plan at bump.ndjson was made" in result.output
+
+
+def test_files_add_regex_alternation():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("req.txt").write_text(f"a=={STARTING_VERSION}\nb>={STARTING_VERSION}\n")
+        assert runner.invoke(cli.main, ["init"]).exit_code == 0
+
+        template = "==yeyo_version|>=yeyo_version"
+        result = runner.invoke(cli.main, ["files", "add", "req.txt", "--regex", "-t", template])
+        assert result.exit_code == 0, result.output
+
+        result = runner.invoke(cli.main, ["bump", "patch"])
+        assert result.exit_code == 0, result.output
+
+        version_string = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH)).version_string
+        assert Path("req.txt").read_text() == f"a=={version_string}\nb>={version_string}\n"
+
+
 def assert_files_in_config_have_version(config):
     for f in config.files:
         with open(f.file_path) as fhandler:
@@ -99,3 +260,48 @@ def assert_files_in_config_have_version(config):
 def assert_tag_in_tags(version_string, repo):
     tags = [t.name for t in repo.tags]
     assert version_string in tags
+
+
+def _run_and_list_heavy_modules(args, cwd="."):
+    code = (
+        "import sys\n"
+        "from yeyo import cli\n"
+        f"cli.main({args!r}, standalone_mode=False)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    # The subprocess may run somewhere else, so make sure it imports this copy of yeyo.
+    env = dict(os.environ, PYTHONPATH=str(Path(cli.__file__).parents[1]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    cli_import = next(l for l in proc.stderr.splitlines() if l.endswith("| yeyo.cli"))
+    cumulative_us = int(cli_import.split("|")[1])
+
+    loaded = proc.stdout.splitlines()[-1]
+    return set(loaded.split(",")) - {""}, cumulative_us
+
+
+def test_version_startup_budget():
+    loaded, cumulative_us = _run_and_list_heavy_modules(["version"])
+
+    assert loaded == set()
+    assert cumulative_us < IMPORT_TIME_BUDGET_US
+
+
+def test_files_ls_does_not_load_git():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+
+        loaded, _ = _run_and_list_heavy_modules(["files", "ls"], cwd=".")
+
+    assert "git" not in loaded
+    assert "jinja2" not in loaded
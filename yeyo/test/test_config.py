@@ -4,15 +4,21 @@
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
 import pytest
 import semver
 
+from yeyo import cache
+from yeyo import journal
 from yeyo.config import DEFAULT_COMMIT_TEMPLATE
 from yeyo.config import DEFAULT_TAG_TEMPLATE
+from yeyo.config import REGEX_TEMPLATE
 from yeyo.config import YEYO_VERSION_TEMPLATE
 from yeyo.config import FileVersion
 from yeyo.config import YeyoConfig
+from yeyo.config import YeyoUpdateException
+from yeyo.index import INDEX_NAME
 
 version_replace_test = [
     (
@@ -51,6 +57,17 @@ def test_file_version_replace(path, template, actual, v1, expected, v2):
     assert test_str == expected
 
 
+def test_regex_file_version_roundtrip():
+    """Test that a regex template keeps its type in the config"""
+
+    fv = FileVersion(Path("setup.py"), r"version\s*=\s*'yeyo_version'", REGEX_TEMPLATE)
+    assert FileVersion.from_dict(fv.to_dict()) == fv
+    assert "template_type" not in FileVersion(Path("VERSION"), YEYO_VERSION_TEMPLATE).to_dict()
+
+    v1, v2 = semver.VersionInfo(0, 1, 0), semver.VersionInfo(0, 2, 0)
+    assert fv.replace("version= '0.1.0'", v1, v2) == "version= '0.2.0'"
+
+
 class TestYeyoConfig(unittest.TestCase):
     def test_to_json_roundtrip(self):
 
@@ -133,3 +150,182 @@ class TestYeyoConfig(unittest.TestCase):
         # `add` is in-place so do after the first assert.
         paths.add(FileVersion(new_path, YEYO_VERSION_TEMPLATE))
         self.assertEqual(new_yc.files, paths)
+
+    def test_bumps_share_files(self):
+
+        paths = [FileVersion(Path(str(i)), YEYO_VERSION_TEMPLATE) for i in range(10)]
+        yc = YeyoConfig.from_version_string(
+            "0.1.1-dev.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE, paths
+        )
+
+        for new_yc in [yc.bump_major(), yc.bump_prerelease("rc"), yc.finalize()]:
+            self.assertIs(new_yc.files, yc.files)
+
+        self.assertEqual(yc.bump_prerelease("rc").version_string, "0.1.1-rc.1")
+
+    def test_untouched_files_are_not_rewritten(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            readme = tmp_path / "README"
+            config_path = tmp_path / "test.yaml"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(version, YEYO_VERSION_TEMPLATE)
+            yc = yc.add_file(readme, YEYO_VERSION_TEMPLATE)
+            new_yc = yc.bump_minor()
+
+            version.write_text(yc.version_string)
+            readme.write_text("no version here")
+            readme_stat = readme.stat()
+
+            new_yc.update(yc, config_path)
+
+            self.assertEqual(version.read_text(), new_yc.version_string)
+            self.assertEqual(readme.stat().st_ino, readme_stat.st_ino)
+            self.assertEqual(readme.stat().st_mtime_ns, readme_stat.st_mtime_ns)
+
+    def test_resolve_files(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            for name in ["a", "b"]:
+                (tmp_path / name).mkdir()
+                (tmp_path / name / "VERSION").write_text("0.1.1")
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(tmp_path / "*" / "VERSION", YEYO_VERSION_TEMPLATE)
+
+            new_yc = yc.bump_patch()
+            new_yc.update(yc, tmp_path / "test.yaml")
+
+            self.assertEqual((tmp_path / "a" / "VERSION").read_text(), "0.1.2")
+            self.assertEqual((tmp_path / "b" / "VERSION").read_text(), "0.1.2")
+
+    def test_plan_and_apply(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            config_path = tmp_path / "test.yaml"
+            plan_path = tmp_path / "plan.ndjson"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(version, YEYO_VERSION_TEMPLATE)
+            yc.to_yaml(config_path)
+            version.write_text("0.1.1")
+
+            new_yc = yc.bump_minor()
+            new_yc.update(yc, config_path, plan_path=plan_path)
+
+            self.assertEqual(version.read_text(), "0.1.1")
+            self.assertEqual(YeyoConfig.from_yaml(config_path).version_string, "0.1.1")
+
+            applied = YeyoConfig.apply(plan_path, config_path)
+
+            self.assertEqual(applied, new_yc)
+            self.assertEqual(version.read_text(), "0.2.0")
+            self.assertEqual(YeyoConfig.from_yaml(config_path).version_string, "0.2.0")
+
+            # The config moved on, so the plan can't be applied again.
+            with self.assertRaises(YeyoUpdateException):
+                YeyoConfig.apply(plan_path, config_path)
+
+    def test_apply_refuses_stale_plan(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            config_path = tmp_path / "test.yaml"
+            plan_path = tmp_path / "plan.ndjson"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(version, YEYO_VERSION_TEMPLATE)
+            yc.to_yaml(config_path)
+            version.write_text("0.1.1")
+
+            yc.bump_patch().update(yc, config_path, plan_path=plan_path)
+            version.write_text("0.1.1\n")
+
+            with self.assertRaises(YeyoUpdateException):
+                YeyoConfig.apply(plan_path, config_path)
+
+            self.assertEqual(version.read_text(), "0.1.1\n")
+
+    def test_failed_update_changes_nothing(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            a, b = tmp_path / "a", tmp_path / "b"
+            config_path = tmp_path / "test.yaml"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_files(FileVersion(p, YEYO_VERSION_TEMPLATE) for p in [a, b])
+            yc.to_yaml(config_path)
+            a.write_text("0.1.1")
+            b.write_text("0.1.1")
+
+            new_yc = yc.bump_patch()
+            with mock.patch.object(YeyoConfig, "to_yaml", side_effect=[OSError, None]):
+                with self.assertRaises(OSError):
+                    new_yc.update(yc, config_path)
+
+            self.assertEqual(a.read_text(), "0.1.1")
+            self.assertEqual(b.read_text(), "0.1.1")
+            names = sorted(p.name for p in tmp_path.iterdir())
+            self.assertEqual(names, [".yeyo.cache", "a", "b", "test.yaml"])
+
+    def test_unwritable_index_does_not_fail_the_bump(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            config_path = tmp_path / "test.yaml"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(version, YEYO_VERSION_TEMPLATE)
+            yc.to_yaml(config_path)
+            version.write_text("0.1.1")
+            # A directory in the way of the index makes writing it fail.
+            (cache.cache_path(config_path, INDEX_NAME) / "x").mkdir(parents=True)
+
+            new_yc = yc.bump_patch()
+            new_yc.update(yc, config_path)
+
+            self.assertEqual(version.read_text(), "0.1.2")
+            self.assertEqual(YeyoConfig.from_yaml(config_path).version_string, "0.1.2")
+            self.assertIsNone(YeyoConfig.recover(config_path))
+
+    def test_recover(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            config_path = tmp_path / "test.yaml"
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1", DEFAULT_COMMIT_TEMPLATE, DEFAULT_TAG_TEMPLATE
+            ).add_file(version, YEYO_VERSION_TEMPLATE)
+            yc.to_yaml(config_path)
+            version.write_text("0.1.1")
+
+            new_yc = yc.bump_patch()
+            with mock.patch.object(journal, "commit", side_effect=KeyboardInterrupt):
+                with mock.patch.object(journal, "rollback", side_effect=KeyboardInterrupt):
+                    with self.assertRaises(KeyboardInterrupt):
+                        new_yc.update(yc, config_path)
+
+            with self.assertRaises(YeyoUpdateException):
+                new_yc.update(yc, config_path)
+
+            self.assertEqual(YeyoConfig.recover(config_path), new_yc)
+            self.assertEqual(version.read_text(), "0.1.2")
+            self.assertEqual(YeyoConfig.from_yaml(config_path).version_string, "0.1.2")
+            self.assertIsNone(YeyoConfig.recover(config_path))
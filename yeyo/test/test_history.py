@@ -0,0 +1,198 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import json
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import git
+import pytest
+from click.testing import CliRunner
+
+from yeyo import cache
+from yeyo import cli
+from yeyo.cli import STARTING_VERSION
+from yeyo.config import DEFAULT_COMMIT_TEMPLATE
+from yeyo.config import DEFAULT_CONFIG_PATH
+from yeyo.config import DEFAULT_TAG_TEMPLATE
+from yeyo.config import YEYO_VERSION_TEMPLATE
+from yeyo.config import FileVersion
+from yeyo.config import YeyoConfig
+from yeyo.history import HISTORY_DIR_NAME
+from yeyo.history import HISTORY_NAME
+from yeyo.history import History
+from yeyo.history import HistoryEntry
+from yeyo.history import HistoryIndex
+
+
+def _entry(version, tag=None, commit=None, timestamp=0.0):
+    return HistoryEntry(version, tag, commit, timestamp, ["VERSION"])
+
+
+def test_lookups(tmp_path):
+
+    yeyo_history = History.for_config(tmp_path / DEFAULT_CONFIG_PATH)
+    assert yeyo_history.by_version("0.1.0") is None
+
+    entries = [
+        _entry("0.1.0", "v0.1.0", "ab12"),
+        _entry("0.2.0-dev.1"),
+        _entry("0.2.0", "v0.2.0", "ab34"),
+        _entry("0.1.0", None, "cd56", 1.0),
+    ]
+    for entry in entries[:2]:
+        yeyo_history.append(entry)
+    assert yeyo_history.by_version("0.2.0-dev.1") == entries[1]
+
+    # Entries appended after the index was saved are picked up by the next lookup.
+    for entry in entries[2:]:
+        yeyo_history.append(entry)
+    yeyo_history = History(yeyo_history.log_path, yeyo_history.index_path)
+
+    assert list(yeyo_history.entries()) == entries
+    assert yeyo_history.by_version("0.1.0") == entries[3]
+    assert yeyo_history.by_tag("v0.2.0") == entries[2]
+    assert yeyo_history.by_commit("cd") == entries[3]
+    assert yeyo_history.by_commit("ef") is None
+    with pytest.raises(ValueError):
+        yeyo_history.by_commit("ab")
+
+
+def test_lookups_read_few_records(tmp_path):
+
+    yeyo_history = History.for_config(tmp_path / DEFAULT_CONFIG_PATH)
+    entries = [_entry(f"0.{i}.0", f"v0.{i}.0", f"{i:04x}".ljust(40, "f")) for i in range(1000)]
+    yeyo_history.replace(entries)
+    assert yeyo_history.by_version("0.1.0") == entries[1]
+
+    with mock.patch.object(
+        HistoryIndex, "_read", autospec=True, side_effect=HistoryIndex._read
+    ) as read:
+        assert yeyo_history.by_tag("v0.500.0") == entries[500]
+        assert yeyo_history.by_commit(f"{777:04x}fff") == entries[777]
+        assert yeyo_history.by_version("1.0.0") is None
+    # The header and sections of each index, then about log2(1000) records per lookup.
+    assert read.call_count < 3 * (4 + 12)
+
+    yeyo_history.index_path.write_bytes(b"not an index")
+    assert yeyo_history.by_version("0.999.0") == entries[999]
+
+
+def test_torn_entry(tmp_path):
+
+    yeyo_history = History.for_config(tmp_path / DEFAULT_CONFIG_PATH)
+    yeyo_history.append(_entry("0.1.0"))
+    with open(yeyo_history.log_path, "ab") as out_handler:
+        out_handler.write(b'{"version": "0.2')
+
+    assert yeyo_history.by_version("0.1.0") == _entry("0.1.0")
+
+    yeyo_history.append(_entry("0.3.0"))
+    assert [e.version for e in yeyo_history.entries()] == ["0.1.0", "0.3.0"]
+    assert yeyo_history.by_version("0.3.0") == _entry("0.3.0")
+
+
+def test_log_is_kept_outside_the_cache(tmp_path):
+
+    config_path = tmp_path / DEFAULT_CONFIG_PATH
+    legacy_path = cache.cache_path(config_path, HISTORY_NAME)
+    cache.ensure_cache_dir(legacy_path.parent)
+    legacy_path.write_text(json.dumps(_entry("0.1.0").to_dict()) + "\n")
+
+    yeyo_history = History.for_config(config_path)
+    assert yeyo_history.log_path == tmp_path / HISTORY_DIR_NAME / HISTORY_NAME
+    assert not legacy_path.exists()
+
+    yeyo_history.append(_entry("0.2.0"))
+    shutil.rmtree(tmp_path / cache.CACHE_DIR_NAME)
+
+    yeyo_history = History.for_config(config_path)
+    assert [e.version for e in yeyo_history.entries()] == ["0.1.0", "0.2.0"]
+    assert yeyo_history.by_version("0.1.0") == _entry("0.1.0")
+
+
+def test_bumps_are_recorded():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = git.Repo.init(".")
+        Path("VERSION").write_text(STARTING_VERSION)
+        repo.index.add(["VERSION"])
+        repo.index.commit("COMMIT")
+
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+        for command in [["bump", "patch", "--git-tag-after"], ["bump", "minor"]]:
+            result = runner.invoke(cli.main, command)
+            assert result.exit_code == 0, result.output
+
+        result = runner.invoke(cli.main, ["history", "show", "0.0.1-dev.1"])
+        assert result.exit_code == 0, result.output
+        tagged = json.loads(result.output)
+        assert tagged["tag"] == "0.0.1-dev.1"
+        assert tagged["commit"] == repo.head.commit.hexsha
+        assert tagged["files"] == ["VERSION"]
+
+        result = runner.invoke(cli.main, ["history", "show", "0.1.0-dev.1"])
+        assert json.loads(result.output)["commit"] is None
+
+        repo.index.commit("Unrelated.")
+        result = runner.invoke(cli.main, ["history", "at", "HEAD"])
+        assert json.loads(result.output) == tagged
+
+        result = runner.invoke(cli.main, ["history", "show", "1.0.0"])
+        assert result.exit_code == 1
+
+
+def test_tag_after_records_the_configs_history():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = git.Repo.init(".")
+        config_path = Path("conf") / DEFAULT_CONFIG_PATH
+        config_path.parent.mkdir()
+        Path("VERSION").write_text(STARTING_VERSION)
+        yc = YeyoConfig.from_version_string(
+            STARTING_VERSION,
+            DEFAULT_TAG_TEMPLATE,
+            DEFAULT_COMMIT_TEMPLATE,
+            {FileVersion(Path("VERSION"), YEYO_VERSION_TEMPLATE)},
+        )
+        yc.to_yaml(config_path)
+        repo.index.add(["VERSION", str(config_path)])
+        repo.index.commit("COMMIT")
+
+        yc.bump_patch().update(yc, config_path, git_tag_after=True)
+
+        (entry,) = History.for_config(config_path).entries()
+        assert entry.commit == repo.head.commit.hexsha
+        assert History.for_config(Path(DEFAULT_CONFIG_PATH)).size() == 0
+        assert repo.git.status("--porcelain") == ""
+
+
+def test_rebuild():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = git.Repo.init(".")
+        Path("VERSION").write_text(STARTING_VERSION)
+        repo.index.add(["VERSION"])
+        repo.index.commit("COMMIT")
+
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+        for command in [["bump", "patch", "--git-tag-after"], ["bump", "minor", "--git-tag-after"]]:
+            assert runner.invoke(cli.main, command).exit_code == 0
+
+        yeyo_history = History.for_config(Path(DEFAULT_CONFIG_PATH))
+        recorded = list(yeyo_history.entries())
+        yeyo_history.log_path.unlink()
+
+        result = runner.invoke(cli.main, ["history", "rebuild"])
+        assert result.exit_code == 0, result.output
+        assert "Found 2 versions" in result.output
+
+        rebuilt = list(History.for_config(Path(DEFAULT_CONFIG_PATH)).entries())
+        assert [e._replace(timestamp=0) for e in rebuilt] == [
+            e._replace(timestamp=0) for e in recorded
+        ]
+        assert History.for_config(Path(DEFAULT_CONFIG_PATH)).by_tag("0.1.0-dev.1") == rebuilt[1]
@@ -0,0 +1,121 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from yeyo import journal
+from yeyo import rewrite
+from yeyo.config import DEFAULT_CONFIG_PATH
+from yeyo.index import OccurrenceIndex
+
+
+def _bump(index, p, old, new):
+    (plan,) = rewrite.compile_plan({p: [(old, new)]})
+    scan = rewrite.scan_file(plan, index.lookup)
+    (staged,) = rewrite.stage_files([scan], finds=[rewrite.next_pattern(plan)])
+    bump_journal = journal.begin(p.parent / DEFAULT_CONFIG_PATH, {}, {}, [staged])
+    journal.commit(bump_journal)
+    journal.finish(bump_journal)
+    index.record(plan, staged)
+    return scan
+
+
+class TestOccurrenceIndex(unittest.TestCase):
+    def test_unchanged_file_skips_the_scan(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.write_text("a 0.1.0 b 0.1.0\n")
+            index = OccurrenceIndex(Path(tmp) / "index.json")
+
+            _bump(index, p, "0.1.0", "0.1.10")
+            index.save()
+            index = OccurrenceIndex.load(index.path)
+
+            with mock.patch.object(rewrite, "_find_spans", side_effect=AssertionError):
+                scan = _bump(index, p, "0.1.10", "0.2.0")
+
+            self.assertEqual([s.start for s in scan.spans], [2, 11])
+            self.assertEqual(p.read_text(), "a 0.2.0 b 0.2.0\n")
+
+    def test_changed_file_is_scanned(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.write_text("a 0.1.0\n")
+            index = OccurrenceIndex(Path(tmp) / "index.json")
+
+            _bump(index, p, "0.1.0", "0.2.0")
+
+            # Same size, so only the hash tells the file has changed.
+            p.write_text("0.2.0 a\n")
+            scan = _bump(index, p, "0.2.0", "0.3.0")
+
+            self.assertEqual([s.start for s in scan.spans], [0])
+            self.assertEqual(p.read_text(), "0.3.0 a\n")
+
+    def test_touched_file_is_validated_by_hash(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.write_text("0.1.0\n")
+            index = OccurrenceIndex(Path(tmp) / "index.json")
+
+            _bump(index, p, "0.1.0", "0.2.0")
+            os.utime(p, ns=(0, 0))
+            (plan,) = rewrite.compile_plan({p: [("0.2.0", "0.3.0")]})
+
+            self.assertEqual(index.lookup(plan), [rewrite.Span(0, 5, b"0.3.0", b"0.2.0")])
+
+    def test_new_template_is_scanned(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.write_text("0.1.0\n")
+            index = OccurrenceIndex(Path(tmp) / "index.json")
+
+            _bump(index, p, "0.1.0", "0.2.0")
+            (plan,) = rewrite.compile_plan({p: [("0.2.0", "0.3.0"), ("v0.2.0", "v0.3.0")]})
+
+            self.assertIsNone(index.lookup(plan))
+
+    def test_index_matches_a_scan(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            indexed, scanned = tmp_path / "indexed", tmp_path / "scanned"
+            for p in (indexed, scanned):
+                p.write_text("version 0.1.0\nnext 0.1.1\n")
+            index = OccurrenceIndex(tmp_path / "index.json")
+
+            for old, new in [("0.1.0", "0.1.1"), ("0.1.1", "0.1.2")]:
+                _bump(index, indexed, old, new)
+                _bump(OccurrenceIndex(tmp_path / "unused.json"), scanned, old, new)
+
+            self.assertEqual(indexed.read_text(), "version 0.1.2\nnext 0.1.2\n")
+            self.assertEqual(indexed.read_text(), scanned.read_text())
+
+    def test_moved_occurrence_is_scanned(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.write_text("a 0.1.0\n")
+            index = OccurrenceIndex(Path(tmp) / "index.json")
+            _bump(index, p, "0.1.0", "0.2.0")
+
+            # The entry still hashes the same, but the stored offset no longer holds the version.
+            index.entries[str(p)] = index.entries[str(p)]._replace(occurrences=[(0, 5, "0.2.0")])
+            scan = _bump(index, p, "0.2.0", "0.3.0")
+
+            self.assertEqual([s.start for s in scan.spans], [2])
+            self.assertEqual(p.read_text(), "a 0.3.0\n")
+
+    def test_missing_index_is_empty(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index = OccurrenceIndex.for_config(Path(tmp) / ".yeyo.yaml")
+            self.assertEqual(index.entries, {})
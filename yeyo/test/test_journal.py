@@ -0,0 +1,78 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from yeyo import journal
+from yeyo import rewrite
+
+
+def _stage(tmp_path, names):
+    replacements = {}
+    for name in names:
+        p = tmp_path / name
+        p.write_text("0.1.0\n")
+        replacements[p] = [("0.1.0", "0.2.0")]
+
+    scans = list(rewrite.scan_files(rewrite.compile_plan(replacements)))
+    return list(rewrite.stage_files(scans))
+
+
+class TestJournal(unittest.TestCase):
+    def test_begin_does_not_replace(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            config_path = tmp_path / ".yeyo.yaml"
+            staged = _stage(tmp_path, ["a", "b"])
+
+            bump_journal = journal.begin(config_path, {"v": 1}, {"v": 2}, staged)
+
+            self.assertEqual(journal.load(config_path), bump_journal)
+            self.assertEqual((tmp_path / "a").read_text(), "0.1.0\n")
+
+            journal.commit(bump_journal)
+            journal.finish(bump_journal)
+
+            self.assertEqual((tmp_path / "a").read_text(), "0.2.0\n")
+            self.assertEqual((tmp_path / "b").read_text(), "0.2.0\n")
+            self.assertIsNone(journal.load(config_path))
+            self.assertEqual(sorted(p.name for p in tmp_path.iterdir()), ["a", "b"])
+
+    def test_rollback_after_partial_commit(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            config_path = tmp_path / ".yeyo.yaml"
+            staged = _stage(tmp_path, ["a", "b"])
+
+            bump_journal = journal.begin(config_path, {}, {}, staged)
+            first = bump_journal.entries[0]
+            first.staged_path.replace(first.file_path)
+
+            journal.rollback(bump_journal)
+            journal.finish(bump_journal)
+
+            self.assertEqual((tmp_path / "a").read_text(), "0.1.0\n")
+            self.assertEqual((tmp_path / "b").read_text(), "0.1.0\n")
+            self.assertEqual(sorted(p.name for p in tmp_path.iterdir()), ["a", "b"])
+
+    def test_roll_forward_after_partial_commit(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            config_path = tmp_path / ".yeyo.yaml"
+            staged = _stage(tmp_path, ["a", "b"])
+
+            bump_journal = journal.begin(config_path, {}, {}, staged)
+            first = bump_journal.entries[0]
+            first.staged_path.replace(first.file_path)
+
+            journal.roll_forward(journal.load(config_path))
+            journal.finish(bump_journal)
+
+            self.assertEqual((tmp_path / "a").read_text(), "0.2.0\n")
+            self.assertEqual((tmp_path / "b").read_text(), "0.2.0\n")
+            self.assertEqual(sorted(p.name for p in tmp_path.iterdir()), ["a", "b"])
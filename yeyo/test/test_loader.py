@@ -0,0 +1,52 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from yeyo import loader
+
+
+class TestLoader(unittest.TestCase):
+    def test_dumped_config_is_cached(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / ".yeyo.yaml"
+            d = {"version": "0.1.0", "files": [{"file_path": "VERSION"}]}
+            loader.dump_yaml(d, p)
+
+            with mock.patch("ruamel.yaml.YAML", side_effect=AssertionError):
+                self.assertEqual(loader.load_yaml(p), d)
+
+    def test_changed_config_is_parsed(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / ".yeyo.yaml"
+            loader.dump_yaml({"version": "0.1.0"}, p)
+
+            p.write_text("version: 0.2.0\n")
+            self.assertEqual(loader.load_yaml(p), {"version": "0.2.0"})
+
+            with mock.patch("ruamel.yaml.YAML", side_effect=AssertionError):
+                self.assertEqual(loader.load_yaml(p), {"version": "0.2.0"})
+
+    def test_corrupt_cache_is_ignored(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / ".yeyo.yaml"
+            loader.dump_yaml({"version": "0.1.0"}, p)
+            loader._cache_file(p).write_bytes(b"not a key\nnor a config")
+
+            self.assertEqual(loader.load_yaml(p), {"version": "0.1.0"})
+
+    def test_stale_cache_is_not_unmarshaled(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / ".yeyo.yaml"
+            loader.dump_yaml({"version": "0.1.0"}, p)
+            p.write_text("version: 0.2.0\n")
+
+            with mock.patch("marshal.load", side_effect=AssertionError):
+                self.assertEqual(loader.load_yaml(p), {"version": "0.2.0"})
@@ -0,0 +1,78 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import json
+import sys
+from pathlib import Path
+
+import git
+import pytest
+from click.testing import CliRunner
+
+from yeyo import cli
+from yeyo import metrics
+from yeyo.cli import STARTING_VERSION
+
+
+def test_phase_without_recording():
+
+    metrics.disable()
+    assert metrics.phase("a") is metrics.phase("b")
+
+    with metrics.phase("a"):
+        metrics.count("c")
+
+
+def test_recorder():
+
+    recorder = metrics.enable()
+    try:
+        for _ in range(2):
+            with metrics.phase("outer"), metrics.phase("inner"):
+                metrics.count("bytes_read", 10)
+    finally:
+        metrics.disable()
+
+    metrics.count("bytes_read")
+
+    report = recorder.to_dict()
+    assert report["counters"] == {"bytes_read": 20}
+    assert list(report["phases"]) == ["inner", "outer"]
+    assert report["phases"]["outer"]["calls"] == 2
+    assert report["phases"]["outer"]["wall_seconds"] >= report["phases"]["inner"]["wall_seconds"]
+
+
+def test_metrics_json():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = git.Repo.init(".")
+        Path("VERSION").write_text(STARTING_VERSION)
+        repo.index.add(["VERSION"])
+        repo.index.commit("COMMIT")
+
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+
+        command = ["--metrics-json", "metrics.json", "bump", "patch", "--git-tag-after"]
+        result = runner.invoke(cli.main, command)
+        assert result.exit_code == 0, result.output
+
+        report = json.loads(Path("metrics.json").read_text())
+
+    assert {"command", "config.load", "files.scan", "git.plumbing"} <= set(report["phases"])
+    assert report["counters"]["files_rewritten"] == 1
+    if hasattr(sys, "addaudithook"):
+        assert report["counters"]["git_subprocesses"] > 0
+
+
+@pytest.mark.parametrize("command", [["--timings", "files", "ls"], ["files", "ls"]])
+def test_timings(command):
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+
+        result = runner.invoke(cli.main, command)
+        assert result.exit_code == 0, result.output
+
+    assert ('"config.load"' in result.output) == ("--timings" in command)
@@ -0,0 +1,53 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from yeyo import planfile
+from yeyo import rewrite
+
+
+class TestPlanFile(unittest.TestCase):
+    def test_roundtrip(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            version = tmp_path / "VERSION"
+            version.write_bytes(b"\xff 0.1.0\n")
+            readme = tmp_path / "README"
+            readme.write_text("no version here")
+
+            setup = tmp_path / "setup.py"
+            setup.write_text("version = '0.1.0'\n")
+
+            replacements = {p: [("0.1.0", "0.2.0")] for p in [version, readme]}
+            replacements[setup] = [
+                rewrite.RegexTemplate(r"version\s*=\s*'yeyo_version'", "0.1.0", "0.2.0")
+            ]
+            plans = rewrite.compile_plan(replacements)
+            scans = list(rewrite.scan_files(plans, digest=True))
+
+            plan_path = tmp_path / "plan.ndjson"
+            planfile.write_plan(plan_path, "0.1.0", {"version": "0.2.0"}, plans, scans)
+            bump_plan = planfile.read_plan(plan_path)
+
+            self.assertEqual(bump_plan.old_version, "0.1.0")
+            self.assertEqual(bump_plan.config, {"version": "0.2.0"})
+            self.assertEqual(bump_plan.plans, plans)
+            self.assertEqual(bump_plan.scans, scans)
+            self.assertEqual(planfile.stale_files(bump_plan), [])
+
+            version.write_text("0.1.0\n")
+            (stale,) = planfile.stale_files(bump_plan)
+            self.assertIn(str(version), stale)
+
+    def test_invalid_plan(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            plan_path = Path(tmp) / "plan.ndjson"
+            plan_path.write_text('{"type": "file"}\n')
+
+            with self.assertRaises(planfile.YeyoPlanException):
+                planfile.read_plan(plan_path)
@@ -0,0 +1,160 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import os
+from pathlib import Path
+
+import git
+import pytest
+from click.testing import CliRunner
+
+from yeyo import cli
+from yeyo import config
+from yeyo import plumbing
+from yeyo.cli import STARTING_VERSION
+
+FILES = {"VERSION": STARTING_VERSION, "a/run.sh": STARTING_VERSION}
+
+
+def _assert_consistent(repo: git.Repo):
+    repo.git.fsck("--strict")
+    assert repo.git.status("--porcelain") == ""
+    assert repo.git.write_tree() == repo.head.commit.tree.hexsha
+
+
+def test_commit_and_tag(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path, FILES, executable=["a/run.sh"])
+    parent = repo.head.commit
+
+    (tmp_path / "a" / "run.sh").write_text("changed")
+    (tmp_path / "b" / "c").mkdir(parents=True)
+    (tmp_path / "b" / "c" / "new.txt").write_text("new")
+
+    sha = plumbing.commit_and_tag(repo, ["a/run.sh", "b/c/new.txt"], "Bump.", "v1")
+    _assert_consistent(repo)
+
+    commit = repo.head.commit
+    assert commit.hexsha == sha
+    assert commit.parents == (parent,)
+    assert commit.message == "Bump."
+    assert repo.tags["v1"].commit == commit
+    assert repo.tags["v1"].tag is None
+
+    assert (commit.tree / "a" / "run.sh").mode == 0o100755
+    assert (commit.tree / "b" / "c" / "new.txt").data_stream.read() == b"new"
+    assert (commit.tree / "VERSION").binsha == (parent.tree / "VERSION").binsha
+    assert repo.head.log()[-1].message == "commit: Bump."
+
+
+def test_annotated_tag(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path, FILES, executable=["a/run.sh"])
+    (tmp_path / "VERSION").write_text("changed")
+
+    plumbing.commit_and_tag(repo, ["VERSION"], "Bump.", "v1", tag_message="Release v1.")
+    _assert_consistent(repo)
+
+    tag_object = repo.tags["v1"].tag
+    assert tag_object.message == "Release v1."
+    assert tag_object.object == repo.head.commit
+
+
+def test_detached_head(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path, FILES, executable=["a/run.sh"])
+    repo.git.checkout("--detach")
+    (tmp_path / "VERSION").write_text("changed")
+
+    sha = plumbing.commit_and_tag(repo, ["VERSION"], "Bump.")
+    assert repo.head.is_detached
+    assert repo.head.commit.hexsha == sha
+    assert repo.heads.master.commit != repo.head.commit
+
+
+def test_refuses_existing_tag(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path, FILES, executable=["a/run.sh"])
+    repo.create_tag("v1")
+    head = repo.head.commit
+
+    with pytest.raises(plumbing.YeyoRefException):
+        plumbing.commit_and_tag(repo, ["VERSION"], "Bump.", "v1")
+    assert repo.head.commit == head
+
+
+@pytest.mark.parametrize(
+    "setup", ["hook", "unborn", "symlink", "tag_name", "attributes", "filter", "autocrlf"]
+)
+def test_unsupported(tmp_path, setup, make_repo):
+
+    paths, tag = ["VERSION"], "v1"
+    if setup == "unborn":
+        repo = git.Repo.init(str(tmp_path))
+        (tmp_path / "VERSION").write_text(STARTING_VERSION)
+    else:
+        repo = make_repo(tmp_path, FILES, executable=["a/run.sh"])
+
+    if setup == "hook":
+        hook = Path(repo.git_dir) / "hooks" / "pre-commit"
+        hook.write_text("#!/bin/sh\n")
+        os.chmod(hook, 0o755)
+    elif setup == "symlink":
+        (tmp_path / "link").symlink_to("VERSION")
+        paths = ["link"]
+    elif setup == "tag_name":
+        tag = "bad..tag"
+    elif setup == "attributes":
+        (tmp_path / ".gitattributes").write_text("* text=auto eol=lf\n")
+    elif setup == "filter":
+        Path(repo.git_dir, "info").mkdir(exist_ok=True)
+        Path(repo.git_dir, "info", "attributes").write_text("VERSION filter=lfs\n")
+    elif setup == "autocrlf":
+        with repo.config_writer() as writer:
+            writer.set_value("core", "autocrlf", "input")
+
+    with pytest.raises(plumbing.YeyoPlumbingUnsupported):
+        plumbing.commit_and_tag(repo, paths, "Bump.", tag)
+
+
+def test_refuses_paths_outside_the_work_tree(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path / "repo", FILES, executable=["a/run.sh"])
+    (tmp_path / "shared.txt").write_text("shared")
+    objects = sorted(p.name for p in Path(repo.git_dir, "objects").glob("*/*"))
+
+    with pytest.raises(plumbing.YeyoPathException):
+        plumbing.commit_and_tag(repo, ["VERSION", "../shared.txt"], "Bump.", "v1")
+    assert sorted(p.name for p in Path(repo.git_dir, "objects").glob("*/*")) == objects
+    _assert_consistent(repo)
+
+
+def test_crlf_with_attributes_is_committed_by_git(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path, FILES, executable=["a/run.sh"])
+    (tmp_path / ".gitattributes").write_text("* text=auto eol=lf\n")
+    repo.index.add([".gitattributes"])
+    repo.index.commit("Attributes.")
+    (tmp_path / "VERSION").write_bytes(b"0.1.0\r\n")
+
+    sha = config.git_commit_and_tag(repo, ["VERSION"], "Bump.", "v1")
+    assert repo.commit(sha).tree["VERSION"].data_stream.read() == b"0.1.0\n"
+    assert repo.git.status("--porcelain") == ""
+
+
+def test_bump_falls_back_to_gitpython(make_repo):
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = make_repo(Path("."), FILES, executable=["a/run.sh"])
+        hook = Path(repo.git_dir) / "hooks" / "post-commit"
+        hook.write_text("#!/bin/sh\ntouch .git/post-commit-ran\n")
+        os.chmod(hook, 0o755)
+
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+        result = runner.invoke(cli.main, ["bump", "patch", "--git-tag-after"])
+        assert result.exit_code == 0, result.output
+
+        assert Path(".git/post-commit-ran").exists()
+        assert repo.tags["0.0.1-dev.1"].commit == repo.head.commit
+        _assert_consistent(repo)
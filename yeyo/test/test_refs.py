@@ -0,0 +1,136 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import os
+from pathlib import Path
+
+import git
+from click.testing import CliRunner
+
+from yeyo import cli
+from yeyo import refs
+from yeyo.config import DEFAULT_COMMIT_TEMPLATE
+from yeyo.config import DEFAULT_CONFIG_PATH
+from yeyo.config import YeyoConfig
+
+FILES = {"VERSION": "0.1.0"}
+
+
+def _age(refs_dir: Path):
+    """Move the mtimes of the refs out of the racy window, so their tags are cached."""
+    for p in [refs_dir / "packed-refs", *(refs_dir / "refs" / "tags").glob("**/")]:
+        if p.exists():
+            os.utime(p, ns=(0, 0))
+
+
+def test_tag_names(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path, FILES)
+    with repo.config_writer() as writer:
+        writer.set_value("user", "name", "yeyo")
+        writer.set_value("user", "email", "yeyo@example.com")
+
+    repo.create_tag("v1.0.0", message="Annotated.")
+    repo.create_tag("release/v0.9.0")
+    repo.git.pack_refs("--all")
+    repo.create_tag("v1.1.0")
+    repo.create_tag("nested/v1.2.0")
+
+    refs_dir = refs.git_dir(tmp_path)
+    assert refs_dir == tmp_path / ".git"
+    assert refs.tag_names(refs_dir) == sorted(t.name for t in repo.tags)
+
+
+def test_cached_tag_names(tmp_path, make_repo):
+
+    repo = make_repo(tmp_path, FILES)
+    repo.create_tag("v1.0.0")
+    repo.git.pack_refs("--all")
+    repo.create_tag("nested/v1.1.0")
+
+    refs_dir = refs.git_dir(tmp_path)
+    cache_file = tmp_path / "refs.json"
+    _age(refs_dir)
+    assert refs.tag_names(refs_dir, cache_file) == ["nested/v1.1.0", "v1.0.0"]
+    assert cache_file.exists()
+
+    # The cached names are used while the refs are unchanged.
+    (refs_dir / "refs" / "tags" / "unseen").write_text("")
+    os.utime(refs_dir / "refs" / "tags", ns=(0, 0))
+    assert refs.tag_names(refs_dir, cache_file) == ["nested/v1.1.0", "v1.0.0"]
+
+    (refs_dir / "refs" / "tags" / "unseen").unlink()
+    repo.create_tag("nested/v1.2.0")
+    assert refs.tag_names(refs_dir, cache_file) == ["nested/v1.1.0", "nested/v1.2.0", "v1.0.0"]
+
+    repo.delete_tag("v1.0.0")
+    assert refs.tag_names(refs_dir, cache_file) == ["nested/v1.1.0", "nested/v1.2.0"]
+
+
+def test_avoid_existing_tags():
+
+    yc = YeyoConfig.from_version_string(
+        "1.0.0-rc.2", "v{{ yeyo_version }}", DEFAULT_COMMIT_TEMPLATE
+    )
+    tags = ["v1.0.0-rc.2", "v1.0.0-rc.3+build.1", "v1.0.0-rc.5", "v1.0.0-dev.4", "1.0.0-rc.4"]
+
+    assert yc.avoid_existing_tags(tags).version_string == "1.0.0-rc.4"
+    assert yc.avoid_existing_tags([]) == yc
+    assert yc.finalize().avoid_existing_tags(tags).version_string == "1.0.0"
+
+
+def test_bump_prerelease_avoiding_tags(make_repo):
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = make_repo(Path("."), FILES)
+        for tag in ["0.1.0-dev.1", "0.1.0-dev.2"]:
+            repo.create_tag(tag)
+
+        assert (
+            runner.invoke(cli.main, ["init", "--starting-version", "0.1.0", "--default"]).exit_code
+            == 0
+        )
+
+        command = ["bump", "prerelease", "--avoid-existing-tags", "--git-tag-after"]
+        result = runner.invoke(cli.main, command)
+        assert result.exit_code == 0, result.output
+
+        assert YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH)).version_string == "0.1.0-dev.3"
+        assert "0.1.0-dev.3" in [t.name for t in repo.tags]
+
+
+def test_bump_prerelease_in_subdirectory(tmp_path, monkeypatch, make_repo):
+
+    repo = make_repo(tmp_path, FILES)
+    repo.create_tag("0.1.0-dev.1")
+    (tmp_path / "svc").mkdir()
+    (tmp_path / "svc" / "VERSION").write_text("0.1.0")
+    monkeypatch.chdir(tmp_path / "svc")
+
+    assert refs.git_dir(Path(".")) == Path(repo.git_dir).resolve()
+
+    runner = CliRunner()
+    assert (
+        runner.invoke(cli.main, ["init", "--starting-version", "0.1.0", "--default"]).exit_code == 0
+    )
+
+    result = runner.invoke(cli.main, ["bump", "prerelease", "--avoid-existing-tags"])
+    assert result.exit_code == 0, result.output
+    assert YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH)).version_string == "0.1.0-dev.2"
+
+    result = runner.invoke(cli.main, ["git", "versions"])
+    assert result.exit_code == 0, result.output
+    assert result.output == "0.1.0-dev.1\n"
+
+
+def test_no_repo(tmp_path, monkeypatch):
+
+    monkeypatch.delenv("GIT_DIR", raising=False)
+    (tmp_path / "VERSION").write_text("0.1.0")
+    monkeypatch.chdir(tmp_path)
+    assert CliRunner().invoke(cli.main, ["init", "--default"]).exit_code == 0
+
+    result = CliRunner().invoke(cli.main, ["git", "versions"])
+    assert result.exit_code == 1
+    assert "isn't in a git repo" in result.output
@@ -0,0 +1,66 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from yeyo import registry
+from yeyo.config import DEFAULT_COMMIT_TEMPLATE
+from yeyo.config import DEFAULT_TAG_TEMPLATE
+from yeyo.config import YEYO_VERSION_TEMPLATE
+from yeyo.config import FileVersion
+from yeyo.config import YeyoConfig
+
+
+def _entry(file_path):
+    return {"file_path": file_path, "match_template": YEYO_VERSION_TEMPLATE}
+
+
+class TestRegistry(unittest.TestCase):
+    def test_shard_name(self):
+        self.assertEqual(registry.shard_name("VERSION"), "%2E.json")
+        self.assertEqual(registry.shard_name("a/b/setup.py"), "a%2Fb.json")
+
+    def test_add_only_touches_its_shard(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            registry.add_entries(directory, [_entry("a/VERSION"), _entry("b/VERSION")])
+            b_shard = directory / "b.json"
+            b_stat = b_shard.stat()
+
+            registry.add_entries(directory, [_entry("a/setup.py"), _entry("a/VERSION")])
+
+            self.assertEqual(b_shard.stat().st_mtime_ns, b_stat.st_mtime_ns)
+            self.assertEqual(
+                sorted(e["file_path"] for e in registry.load_entries(directory)),
+                ["a/VERSION", "a/setup.py", "b/VERSION"],
+            )
+
+    def test_remove_drops_empty_shards(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            registry.add_entries(directory, [_entry("a/VERSION"), _entry("b/VERSION")])
+
+            registry.remove_paths(directory, ["a/VERSION"])
+
+            self.assertEqual(registry.shard_paths(directory), [directory / "b.json"])
+
+    def test_config_roundtrip(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = Path(tmp) / ".yeyo.yaml"
+            registry.registry_dir(config_path).mkdir()
+
+            yc = YeyoConfig.from_version_string(
+                "0.1.1",
+                DEFAULT_TAG_TEMPLATE,
+                DEFAULT_COMMIT_TEMPLATE,
+                {FileVersion(Path("a/VERSION"), YEYO_VERSION_TEMPLATE)},
+            )
+            yc.to_yaml(config_path)
+
+            self.assertNotIn("VERSION", config_path.read_text())
+            self.assertEqual(YeyoConfig.from_yaml(config_path), yc)
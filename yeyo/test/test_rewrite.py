@@ -0,0 +1,189 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from yeyo import journal
+from yeyo import rewrite
+from yeyo.config import DEFAULT_CONFIG_PATH
+
+
+def _plan(file_path, replacements):
+    (plan,) = rewrite.compile_plan({file_path: replacements})
+    return plan
+
+
+def _replace(scans, jobs=None):
+    """Stage the scanned files and move them into place through a journal, as a bump does."""
+    staged_files = list(rewrite.stage_files(scans, jobs))
+    config_path = scans[0].file_path.parent / DEFAULT_CONFIG_PATH
+    bump_journal = journal.begin(config_path, {}, {}, staged_files, jobs)
+    journal.commit(bump_journal)
+    journal.finish(bump_journal)
+    return staged_files
+
+
+class TestStageFiles(unittest.TestCase):
+    def test_results_are_sorted(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+
+            replacements = {}
+            for i in reversed(range(20)):
+                p = tmp_path / f"{i:02d}.txt"
+                p.write_text("version 0.1.0\n")
+                replacements[p] = [("0.1.0", "0.2.0")]
+
+            scans = list(rewrite.scan_files(rewrite.compile_plan(replacements), jobs=4))
+            results = _replace(scans, jobs=4)
+
+            self.assertEqual([r.file_path for r in results], sorted(replacements))
+            for r in results:
+                self.assertIsNone(r.error)
+                self.assertEqual(r.file_path.read_text(), "version 0.2.0\n")
+
+    def test_scan_does_not_write(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.write_text("0.1.0\n")
+
+            (scan,) = rewrite.scan_files(rewrite.compile_plan({p: [("0.1.0", "0.2.0")]}))
+
+            self.assertEqual(p.read_text(), "0.1.0\n")
+            self.assertEqual(scan.spans, [rewrite.Span(0, 5, b"0.2.0", b"0.1.0")])
+            self.assertEqual(scan.messages, [f"Replacing line: 0.1.0 with 0.2.0 in file {p}."])
+
+    def test_missing_file_is_reported(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = Path(tmp) / "missing"
+            present = Path(tmp) / "present"
+            present.write_text("0.1.0")
+
+            replacements = {missing: [("0.1.0", "0.2.0")], present: [("0.1.0", "0.2.0")]}
+            missing_scan, present_scan = rewrite.scan_files(rewrite.compile_plan(replacements))
+
+            self.assertIsInstance(missing_scan.error, FileNotFoundError)
+            self.assertIsNone(present_scan.error)
+
+
+class TestStageFile(unittest.TestCase):
+    def test_patches_across_chunks(self):
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(rewrite, "CHUNK_SIZE", 7):
+            p = Path(tmp) / "lock"
+            contents = b"".join(b"pkg-%d==0.1.0\r\n" % i for i in range(100))
+            p.write_bytes(contents)
+
+            scan = rewrite.scan_file(_plan(p, [("0.1.0", "0.10.0")]))
+            (result,) = _replace([scan])
+
+            self.assertIsNone(result.error)
+            self.assertEqual(len(scan.messages), 100)
+            self.assertEqual(p.read_bytes(), contents.replace(b"0.1.0", b"0.10.0"))
+
+    def test_message_shows_the_whole_line(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.write_text("a=0.1.0 b=0.1.0")
+
+            scan = rewrite.scan_file(_plan(p, [("a=0.1.0", "a=0.2.0")]))
+
+            self.assertEqual(
+                scan.messages,
+                [f"Replacing line: a=0.1.0 b=0.1.0 with a=0.2.0 b=0.1.0 in file {p}."],
+            )
+
+    def test_empty_file(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "VERSION"
+            p.touch()
+
+            scan = rewrite.scan_file(_plan(p, [("0.1.0", "0.2.0")]))
+
+            self.assertIsNone(scan.error)
+            self.assertEqual(scan.spans, [])
+
+    def test_multiple_templates_in_one_pass(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "pyproject.toml"
+            p.write_text('version = "0.1.0"\nyeyo = "==0.1.0"\n')
+
+            replacements = [('version = "0.1.0"', 'version = "0.2.0"'), ("==0.1.0", "==0.2.0")]
+            (result,) = _replace([rewrite.scan_file(_plan(p, replacements))])
+
+            self.assertIsNone(result.error)
+            self.assertEqual(p.read_text(), 'version = "0.2.0"\nyeyo = "==0.2.0"\n')
+
+    def test_plans_share_patterns(self):
+
+        replacements = {Path(name): [("0.1.0", "0.2.0")] for name in ("b", "a")}
+        a, b = rewrite.compile_plan(replacements)
+
+        self.assertEqual((a.file_path, b.file_path), (Path("a"), Path("b")))
+        self.assertIs(a.pattern, b.pattern)
+
+    def test_regex_template_replaces_only_the_version(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "setup.py"
+            p.write_text("version = '0.1.0'\nversion=\"0.1.0\"\nyeyo==0.1.0\nother 0.1.0\n")
+
+            replacements = [
+                rewrite.RegexTemplate(r"version\s*=\s*['\"]yeyo_version['\"]", "0.1.0", "0.2.0"),
+                ("yeyo==0.1.0", "yeyo==0.2.0"),
+            ]
+            (result,) = _replace([rewrite.scan_file(_plan(p, replacements))])
+
+            self.assertIsNone(result.error)
+            self.assertEqual(
+                p.read_text(), "version = '0.2.0'\nversion=\"0.2.0\"\nyeyo==0.2.0\nother 0.1.0\n"
+            )
+
+    def test_regex_template_patterns_are_cached(self):
+
+        regex = rewrite.RegexTemplate(r"v\s*yeyo_version", "0.1.0", "0.2.0")
+        (a,) = rewrite.compile_plan({Path("a"): [regex]})
+        (b,) = rewrite.compile_plan({Path("b"): [regex]})
+
+        self.assertIs(a.pattern, b.pattern)
+        self.assertEqual(rewrite.patch_bytes(a, b"v 0.1.0, v0.1.0"), b"v 0.2.0, v0.2.0")
+
+    def test_regex_template_alternation(self):
+
+        regex = rewrite.RegexTemplate("==yeyo_version|>=yeyo_version", "0.1.0", "0.1.1")
+        (plan,) = rewrite.compile_plan({Path("requirements.txt"): [regex]})
+
+        patched = rewrite.patch_bytes(plan, b"a==0.1.0\nb>=0.1.0\nc<=0.1.0\n")
+        self.assertEqual(patched, b"a==0.1.1\nb>=0.1.1\nc<=0.1.0\n")
+
+    def test_regex_template_anchors_match_each_line(self):
+
+        regex = rewrite.RegexTemplate('^version = "yeyo_version"$', "0.1.0", "0.2.0")
+        (plan,) = rewrite.compile_plan({Path("pyproject.toml"): [regex]})
+
+        patched = rewrite.patch_bytes(plan, b'[tool]\nversion = "0.1.0"\nother = "0.1.0"\n')
+        self.assertEqual(patched, b'[tool]\nversion = "0.2.0"\nother = "0.1.0"\n')
+
+    def test_invalid_regex_template(self):
+
+        with self.assertRaises(ValueError):
+            rewrite.compile_template("version = 0.1.0")
+        with self.assertRaises(ValueError):
+            rewrite.compile_template("version = (yeyo_version")
+        with self.assertRaises(ValueError):
+            rewrite.compile_template("(?:==yeyo_version)?")
+        with self.assertRaises(ValueError):
+            rewrite.compile_template(r"version\s*=\s*(\d+)?yeyo_version\1")
+        with self.assertRaises(ValueError):
+            rewrite.compile_template(r"(?P<quote>['\"])yeyo_version(?P=quote)")
+        rewrite.compile_template(r"path\\1 yeyo_version")
+        rewrite.compile_template(r"version\s*=\s*yeyo_version")
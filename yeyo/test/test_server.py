@@ -0,0 +1,74 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from yeyo import cache
+from yeyo import server
+from yeyo.cli import main
+
+
+def _init(runner):
+    runner.invoke(main, ["init"])
+    Path("VERSION").write_text("0.0.0-dev.1")
+    runner.invoke(main, ["files", "add", "VERSION"])
+
+
+class TestServer(unittest.TestCase):
+    def test_is_served(self):
+
+        self.assertTrue(server.is_served(["bump", "minor"]))
+        self.assertFalse(server.is_served(["init"]))
+        self.assertFalse(server.is_served([]))
+
+    def test_run_command(self):
+
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            _init(runner)
+
+            response = server.run_command(["git", "render-tag-string"], os.getcwd())
+            self.assertEqual(response, server.Response(0, "0.0.0-dev.1\n", ""))
+
+            response = server.run_command(["bump", "nope"], os.getcwd())
+            self.assertEqual(response.exit_code, 2)
+            self.assertIn("No such command", response.stderr)
+
+    def test_request_without_server(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(server.request(Path(tmp) / "serve.sock", ["bump"], tmp))
+
+
+@pytest.mark.skipif(not hasattr(server.socket, "AF_UNIX"), reason="Needs Unix sockets.")
+def test_request_roundtrip():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _init(runner)
+
+        socket_path = Path(tempfile.mkdtemp()) / "serve.sock"
+        unix_server = server.make_server(socket_path)
+        thread = threading.Thread(target=unix_server.serve_forever)
+        thread.start()
+        cache.keep_in_memory()
+        try:
+            response = server.request(socket_path, ["bump", "patch"], os.getcwd())
+            assert response.exit_code == 0, response.stderr
+            assert Path("VERSION").read_text() == "0.0.1-dev.1"
+
+            # The config is kept in memory, but changes on disk are picked up.
+            runner.invoke(main, ["bump", "minor"])
+            response = server.request(socket_path, ["git", "render-tag-string"], os.getcwd())
+            assert response.stdout == "0.1.0-dev.1\n"
+        finally:
+            cache.keep_in_memory(False)
+            unix_server.shutdown()
+            unix_server.server_close()
+            thread.join()
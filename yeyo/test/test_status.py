@@ -0,0 +1,95 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import json
+from pathlib import Path
+
+import git
+import pytest
+from click.testing import CliRunner
+
+from yeyo import cli
+from yeyo import status
+from yeyo.cli import STARTING_VERSION
+from yeyo.config import DEFAULT_CONFIG_PATH
+from yeyo.config import YeyoConfig
+from yeyo.config import YeyoDirtyRepoException
+from yeyo.status import DirtyFile
+
+
+def test_parse_porcelain_v2():
+
+    output = "\0".join(
+        [
+            "1 .M N... 100644 100644 100644 abc abc a file.txt",
+            "1 A. N... 000000 100644 100644 000 abc new.txt",
+            "2 R. N... 100644 100644 100644 abc abc R100 moved.txt",
+            "old.txt",
+            "u UU N... 100644 100644 100644 100644 a b c conflict.txt",
+            "? untracked/file.txt",
+            "",
+        ]
+    )
+    assert status.parse_porcelain_v2(output) == [
+        DirtyFile(Path("a file.txt"), "modified", ".M"),
+        DirtyFile(Path("new.txt"), "added", "A."),
+        DirtyFile(Path("moved.txt"), "renamed", "R."),
+        DirtyFile(Path("conflict.txt"), "unmerged", "UU"),
+        DirtyFile(Path("untracked/file.txt"), "untracked", "??"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "scope,expected",
+    [
+        ("tracked-only", {"README"}),
+        ("pathspec", {"README", "new.txt"}),
+        ("full", {"README", "new.txt", "sub/new.txt"}),
+    ],
+)
+def test_dirty_files(scope, expected):
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = git.Repo.init(".")
+        for p in ["VERSION", "README"]:
+            Path(p).write_text(STARTING_VERSION)
+        repo.index.add(["VERSION", "README"])
+        repo.index.commit("COMMIT")
+
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+
+        Path("VERSION").write_text("changed")
+        Path("README").write_text("changed")
+        Path("new.txt").write_text("")
+        Path("sub").mkdir()
+        Path("sub/new.txt").write_text("")
+
+        yc = YeyoConfig.from_yaml(Path(DEFAULT_CONFIG_PATH))
+        assert {str(f.path) for f in yc.dirty_files(scope=scope)} == expected
+
+        result = runner.invoke(cli.main, ["git", "status", "--dirty-scope", scope])
+        assert result.exit_code == 1
+        assert {json.loads(line)["path"] for line in result.output.splitlines()} == expected
+
+
+def test_bump_refuses_modified_files():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = git.Repo.init(".")
+        for p in ["VERSION", "README"]:
+            Path(p).write_text(STARTING_VERSION)
+        repo.index.add(["VERSION", "README"])
+        repo.index.commit("COMMIT")
+
+        assert runner.invoke(cli.main, ["init", "--default"]).exit_code == 0
+        Path("README").write_text("changed")
+
+        result = runner.invoke(cli.main, ["bump", "patch", "--git-tag-after"])
+        assert isinstance(result.exception, YeyoDirtyRepoException)
+        assert result.exception.dirty_files == [DirtyFile(Path("README"), "modified", ".M")]
+
+        repo.index.add(["README"])
+        result = runner.invoke(cli.main, ["git", "status", "--dirty-scope", "tracked-only"])
+        assert json.loads(result.output) == {"path": "README", "kind": "modified", "xy": "M."}
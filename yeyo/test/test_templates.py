@@ -0,0 +1,33 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from yeyo import templates
+
+
+class TestTemplates(unittest.TestCase):
+    def tearDown(self):
+        templates.configure(None)
+
+    def test_render(self):
+        self.assertEqual(templates.render("v{{ yeyo_version }}", yeyo_version="0.1.0"), "v0.1.0")
+
+    def test_templates_are_compiled_once(self):
+        env = templates.get_environment()
+        self.assertIs(env.get_template("{{ a }}"), env.get_template("{{ a }}"))
+
+    def test_bytecode_cache(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = Path(tmp) / "templates"
+            templates.configure(cache_dir)
+
+            self.assertEqual(templates.render("{{ yeyo_version }}", yeyo_version="1.0.0"), "1.0.0")
+            self.assertEqual(len(list(cache_dir.iterdir())), 1)
+
+            # A fresh environment loads the template from the bytecode cache.
+            templates.configure(cache_dir)
+            self.assertEqual(templates.render("{{ yeyo_version }}", yeyo_version="2.0.0"), "2.0.0")
@@ -0,0 +1,106 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import functools
+import random
+from pathlib import Path
+
+import git
+import pytest
+import semver
+from click.testing import CliRunner
+
+from yeyo import cli
+from yeyo import versions
+
+VERSIONS = [
+    "0.9.0",
+    "1.0.0-0",
+    "1.0.0-2",
+    "1.0.0-10",
+    "1.0.0-alpha",
+    "1.0.0-alpha.1",
+    "1.0.0-alpha.beta",
+    "1.0.0-beta",
+    "1.0.0-beta.2",
+    "1.0.0-beta.11",
+    "1.0.0-rc.1",
+    "1.0.0",
+    "1.0.1-dev.1",
+    "1.10.0",
+    "10.0.0",
+]
+
+
+def test_sort_keys_match_semver():
+
+    shuffled = random.Random(0).sample(VERSIONS, len(VERSIONS))
+    by_semver = sorted(shuffled, key=functools.cmp_to_key(semver.compare))
+    assert by_semver == VERSIONS
+
+    keys = versions.sort_keys(shuffled)
+    assert [v for _, v in sorted(zip(keys, shuffled))] == VERSIONS
+
+
+def test_invalid_versions():
+
+    assert versions.sort_keys(["1.0", "01.0.0", "1.0.0-", "1.0.0+build.1"])[:3] == [None] * 3
+    assert versions.sort_key("1.0.0+build.1") == versions.sort_key("1.0.0")
+
+
+def test_select():
+
+    assert versions.select(["1.0.0", "foo", "0.9.0"]) == ["0.9.0", "1.0.0"]
+    assert versions.select(VERSIONS, stable=True) == ["0.9.0", "1.0.0", "1.10.0", "10.0.0"]
+    assert versions.select(VERSIONS, version_range=">1.0.0-rc.1, <1.10.0") == [
+        "1.0.0",
+        "1.0.1-dev.1",
+    ]
+    assert versions.latest(VERSIONS, version_range="!=10.0.0") == "1.10.0"
+    assert versions.latest([]) is None
+
+    with pytest.raises(ValueError):
+        versions.parse_range(">=1.0")
+
+
+def test_tag_pattern():
+
+    pattern = versions.tag_pattern("v{{ yeyo_version }}")
+    assert versions.select(["v1.0.0", "1.1.0", "v0.1.0-rc.1"], pattern=pattern) == [
+        "v0.1.0-rc.1",
+        "v1.0.0",
+    ]
+
+    pattern = versions.tag_pattern("release/{{ yeyo_version }}/{{ yeyo_version }}")
+    assert pattern.fullmatch("release/1.0.0/1.0.0").group("version") == "1.0.0"
+    assert pattern.fullmatch("release/1.0.0/1.0.1") is None
+
+    with pytest.raises(ValueError):
+        versions.tag_pattern("release")
+
+
+def test_git_versions():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        repo = git.Repo.init(".")
+        Path("VERSION").write_text("0.1.0")
+        repo.index.add(["VERSION"])
+        repo.index.commit("COMMIT")
+        for tag in ["v1.0.0", "v1.0.0-rc.2", "v1.0.0-rc.10", "v2.0.0-dev.1", "other"]:
+            repo.create_tag(tag)
+
+        result = runner.invoke(cli.main, ["init", "--default", "-t", "v{{ yeyo_version }}"])
+        assert result.exit_code == 0, result.output
+
+        result = runner.invoke(cli.main, ["git", "versions"])
+        assert result.output.split() == ["v1.0.0-rc.2", "v1.0.0-rc.10", "v1.0.0", "v2.0.0-dev.1"]
+
+        result = runner.invoke(cli.main, ["git", "versions", "--latest", "--stable"])
+        assert result.output == "v1.0.0\n"
+
+        result = runner.invoke(cli.main, ["git", "versions", "--range", "<1.0.0", "--reverse"])
+        assert result.output.split() == ["v1.0.0-rc.10", "v1.0.0-rc.2"]
+
+        result = runner.invoke(cli.main, ["git", "versions", "--range", "<1.0"])
+        assert result.exit_code == 2
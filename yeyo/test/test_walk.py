@@ -0,0 +1,108 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from yeyo import walk
+from yeyo.walk import DirectoryIndex
+
+
+def _touch(root, *paths):
+    for p in paths:
+        (root / p).parent.mkdir(parents=True, exist_ok=True)
+        (root / p).write_text("")
+
+
+class TestDirectoryIndex(unittest.TestCase):
+    def test_expand(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _touch(
+                root,
+                "services/a/pyproject.toml",
+                "services/b/pyproject.toml",
+                "services/b/nested/pyproject.toml",
+                "pyproject.toml",
+            )
+            index = DirectoryIndex(root)
+
+            self.assertEqual(
+                index.expand("services/*/pyproject.toml"),
+                [root / "services/a/pyproject.toml", root / "services/b/pyproject.toml"],
+            )
+            self.assertEqual(len(index.expand("**/pyproject.toml")), 4)
+            self.assertEqual(index.expand("missing/*"), [])
+
+    def test_gitignore(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _touch(
+                root, "a/VERSION", "build/VERSION", "b/VERSION", "b/keep/VERSION", ".git/VERSION"
+            )
+            (root / ".gitignore").write_text("build/\n# comment\n/b/*\n!/b/keep\n")
+
+            index = DirectoryIndex(root)
+
+            self.assertEqual(
+                index.expand("**/VERSION"), [root / "a/VERSION", root / "b/keep/VERSION"]
+            )
+
+    def test_listings_are_cached_by_mtime(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _touch(root, "a/VERSION")
+            cache_file = root / ".yeyo.cache" / "dirs.json"
+            cache_file.parent.mkdir()
+            for p in (root, root / "a"):
+                os.utime(p, ns=(0, 0))
+
+            index = DirectoryIndex(root, cache_file)
+            index.expand("*/VERSION")
+            index.save()
+
+            index = DirectoryIndex(root, cache_file)
+            with mock.patch.object(os, "scandir", side_effect=AssertionError):
+                self.assertEqual(index.expand("*/VERSION"), [root / "a/VERSION"])
+
+            _touch(root, "b/VERSION")
+            self.assertEqual(index.expand("*/VERSION"), [root / "a/VERSION", root / "b/VERSION"])
+
+    def test_racy_listings_are_not_cached(self):
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _touch(root, "a/VERSION")
+
+            # The directory was just modified, so it could change again within the same mtime.
+            index = DirectoryIndex(root)
+            self.assertEqual(index.expand("a/*"), [root / "a/VERSION"])
+            self.assertNotIn("a", index._listings)
+
+            os.utime(root / "a", ns=(0, 0))
+            index.expand("a/*")
+            self.assertIn("a", index._listings)
+
+    def test_match(self):
+
+        self.assertTrue(walk.match("services/*/setup.py", "services/a/setup.py"))
+        self.assertFalse(walk.match("services/*/setup.py", "services/a/b/setup.py"))
+        self.assertFalse(walk.match("*/setup.py", "setup.py"))
+        self.assertTrue(walk.match("**/setup.py", "setup.py"))
+        self.assertTrue(walk.match("**/setup.py", "./a/b/setup.py"))
+        self.assertTrue(walk.match("services/**", "services/a/b/setup.py"))
+        self.assertFalse(walk.match("services/**", "services"))
+
+    def test_compile_ignore_line(self):
+        self.assertIsNone(walk.compile_ignore_line("# comment\n"))
+
+        rule = walk.compile_ignore_line("/docs/**/*.md")
+        self.assertTrue(rule.anchored)
+        self.assertTrue(rule.pattern.fullmatch("docs/a/b/index.md"))
+        self.assertFalse(rule.pattern.fullmatch("docs/a/index.txt"))
@@ -0,0 +1,115 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+
+import json
+from pathlib import Path
+
+import git
+from click.testing import CliRunner
+
+from yeyo import cli
+from yeyo import workspace
+from yeyo.cli import STARTING_VERSION
+from yeyo.config import DEFAULT_COMMIT_TEMPLATE
+from yeyo.config import DEFAULT_CONFIG_PATH
+from yeyo.config import YEYO_VERSION_TEMPLATE
+from yeyo.config import FileVersion
+from yeyo.config import YeyoConfig
+from yeyo.history import History
+
+PROJECTS = [Path("a"), Path("b"), Path("services/c")]
+
+
+def _workspace(make_repo, root: Path) -> git.Repo:
+    files = {".gitignore": "ignored/\n"}
+    for project in PROJECTS + [Path("ignored")]:
+        config = YeyoConfig.from_version_string(
+            STARTING_VERSION,
+            f"{project.name}-{{{{ {YEYO_VERSION_TEMPLATE} }}}}",
+            DEFAULT_COMMIT_TEMPLATE,
+            {FileVersion(Path("VERSION"), YEYO_VERSION_TEMPLATE)},
+        )
+        files[f"{project}/VERSION"] = STARTING_VERSION
+        files[f"{project}/{DEFAULT_CONFIG_PATH}"] = json.dumps(config.to_dict())
+    return make_repo(root, files)
+
+
+def test_discover_and_select(tmp_path, make_repo):
+
+    _workspace(make_repo, tmp_path)
+
+    projects = workspace.discover(tmp_path)
+    assert projects == PROJECTS
+    assert workspace.discover(tmp_path) == PROJECTS
+    assert workspace.select(projects, ["services/*", "a"]) == [Path("a"), Path("services/c")]
+    assert workspace.select(projects, []) == PROJECTS
+
+
+def test_split_git_options():
+
+    argv, git_options = workspace.split_git_options(
+        ["bump", "patch", "--git-tag-after", "--dirty-scope", "pathspec", "--dryrun"]
+    )
+    assert argv == ["bump", "patch", "--dirty-scope", "pathspec", "--dryrun"]
+    assert git_options == workspace.GitOptions(False, True, "pathspec")
+    assert git_options.deferred
+
+    argv, git_options = workspace.split_git_options(["files", "ls"])
+    assert argv == ["files", "ls"]
+    assert not git_options.deferred
+
+
+def test_run_bump_and_tag_after(tmp_path, make_repo):
+
+    repo = _workspace(make_repo, tmp_path)
+
+    runner = CliRunner()
+    args = ["workspace", "--root", str(tmp_path), "run", "-j", "2"]
+    result = runner.invoke(cli.main, args + ["bump", "patch", "--no-prerel", "--git-tag-after"])
+    assert result.exit_code == 0, result.output
+
+    headers = [line for line in result.output.splitlines() if line.startswith("==>")]
+    assert headers == [f"==> {project} <==" for project in PROJECTS * 2]
+
+    assert repo.git.status("--porcelain") == ""
+    assert sorted(t.name for t in repo.tags) == ["a-0.0.1", "b-0.0.1", "c-0.0.1"]
+    assert [c.message for c in repo.iter_commits()] == ["0.0.1"] * 3 + ["COMMIT"]
+    assert (tmp_path / "ignored" / "VERSION").read_text() == STARTING_VERSION
+
+    for project in PROJECTS:
+        assert (tmp_path / project / "VERSION").read_text() == "0.0.1"
+        (entry,) = History.for_config(tmp_path / project / DEFAULT_CONFIG_PATH).entries()
+        assert entry.tag == f"{project.name}-0.0.1"
+        assert repo.commit(entry.commit).message == "0.0.1"
+
+
+def test_failures_are_isolated(tmp_path, make_repo):
+
+    repo = _workspace(make_repo, tmp_path)
+    (tmp_path / "b" / DEFAULT_CONFIG_PATH).write_text("version: [")
+    repo.index.add(["b/.yeyo.yaml"])
+    repo.index.commit("Break b.")
+    repo.create_tag("c-0.0.1")
+
+    runner = CliRunner()
+    args = ["workspace", "--root", str(tmp_path), "run", "-j", "1"]
+    result = runner.invoke(cli.main, args + ["bump", "patch", "--no-prerel", "--git-tag-after"])
+    assert result.exit_code == 1
+    assert "Failed in 2 of 3 projects: b, services/c." in result.output
+
+    assert repo.head.commit.message == "0.0.1"
+    assert sorted(t.name for t in repo.tags) == ["a-0.0.1", "c-0.0.1"]
+    assert (tmp_path / "services" / "c" / "VERSION").read_text() == "0.0.1"
+
+
+def test_run_rejects_other_commands(tmp_path, make_repo):
+
+    _workspace(make_repo, tmp_path)
+
+    result = CliRunner().invoke(cli.main, ["workspace", "--root", str(tmp_path), "run", "init"])
+    assert result.exit_code == 2
+
+    args = ["workspace", "--root", str(tmp_path), "-p", "a", "run", "git", "render-tag-string"]
+    result = CliRunner().invoke(cli.main, args)
+    assert result.exit_code == 0, result.output
+    assert result.output == f"==> a <==\na-{STARTING_VERSION}\n"
@@ -0,0 +1,170 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Parses and sorts many version strings at once, with the precedence rules of semver.VersionInfo.
+
+Rather than parsing each version into a VersionInfo, each is parsed with one regex match into a sort
+key, a tuple that compares the way the versions do:
+
+    (major, minor, patch, is_release, prerelease)
+
+is_release puts a release after all of its prereleases, and prerelease is a tuple with a pair per
+dot separated identifier, (0, number) for numeric identifiers and (1, text) for the rest, so
+numeric identifiers sort before alphanumeric ones and a shorter prerelease sorts before a longer one
+it's a prefix of. Build metadata doesn't affect precedence and isn't part of the key. Prereleases
+repeat across a tag set, e.g. dev.1 or rc.2, so their keys are cached.
+"""
+
+import functools
+import re
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+SortKey = Tuple[int, int, int, bool, Tuple[Tuple[int, object], ...]]
+
+# The same grammar as semver.VersionInfo.parse.
+_VERSION_REGEX = re.compile(
+    r"""
+    (?P<major>0|[1-9]\d*)
+    \.
+    (?P<minor>0|[1-9]\d*)
+    \.
+    (?P<patch>0|[1-9]\d*)
+    (?:-(?P<prerelease>
+        (?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)
+        (?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*
+    ))?
+    (?:\+(?P<build>
+        [0-9a-zA-Z-]+
+        (?:\.[0-9a-zA-Z-]+)*
+    ))?
+    """,
+    re.VERBOSE,
+)
+
+_RANGE_OPERATORS = {
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+_RANGE_CLAUSE_REGEX = re.compile(r"\s*(>=|<=|>|<|==|!=)?\s*(\S+)\s*")
+
+# Stands in for the version when a tag template is turned into a pattern, see tag_pattern.
+_VERSION_SENTINEL = "\x00yeyo_version\x00"
+
+
+@functools.lru_cache(maxsize=4096)
+def _prerelease_key(prerelease: str) -> Tuple[Tuple[int, object], ...]:
+    return tuple(
+        (0, int(identifier)) if identifier.isdigit() else (1, identifier)
+        for identifier in prerelease.split(".")
+    )
+
+
+def sort_key(version_string: str) -> Optional[SortKey]:
+    """Return the sort key of version_string, or None if it isn't a valid version."""
+    match = _VERSION_REGEX.fullmatch(version_string)
+    if match is None:
+        return None
+
+    major, minor, patch, prerelease, _ = match.groups()
+    if prerelease is None:
+        return (int(major), int(minor), int(patch), True, ())
+    return (int(major), int(minor), int(patch), False, _prerelease_key(prerelease))
+
+
+def sort_keys(version_strings: Iterable[str]) -> List[Optional[SortKey]]:
+    """Return the sort key of each of version_strings, None for those that aren't versions."""
+    return [sort_key(v) for v in version_strings]
+
+
+def is_stable(key: SortKey) -> bool:
+    """Return True if key is the key of a release, rather than a prerelease."""
+    return key[3]
+
+
+def parse_range(spec: str) -> Callable[[SortKey], bool]:
+    """
+    Parse a comma separated range, e.g. ">=1.2.0,<2.0.0", into a predicate on sort keys.
+
+    Each clause is an operator, one of >=, <=, >, <, == or !=, and a version. A clause without an
+    operator means ==.
+    """
+    clauses = []
+    for clause in spec.split(","):
+        match = _RANGE_CLAUSE_REGEX.fullmatch(clause)
+        key = sort_key(match.group(2)) if match is not None else None
+        if key is None:
+            raise ValueError(f"Invalid version range clause: {clause!r}.")
+        clauses.append((_RANGE_OPERATORS[match.group(1) or "=="], key))
+
+    return lambda k: all(operator(k, key) for operator, key in clauses)
+
+
+def tag_pattern(tag_template: str) -> Pattern:
+    """
+    Compile a regex matching the tags rendered from tag_template, capturing their version.
+
+    Raises a ValueError if the template doesn't contain the version.
+    """
+    from yeyo import templates
+
+    rendered = templates.render(tag_template, yeyo_version=_VERSION_SENTINEL, files=frozenset())
+    parts = rendered.split(_VERSION_SENTINEL)
+    if len(parts) == 1:
+        raise ValueError(f"The tag template {tag_template!r} doesn't contain the version.")
+
+    pattern = re.escape(parts[0]) + r"(?P<version>.+?)" + re.escape(parts[1])
+    for part in parts[2:]:
+        pattern += r"(?P=version)" + re.escape(part)
+    return re.compile(pattern)
+
+
+def _keyed(
+    tags: Iterable[str],
+    pattern: Optional[Pattern] = None,
+    stable: bool = False,
+    version_range: Optional[str] = None,
+) -> Iterator[Tuple[SortKey, str]]:
+    in_range = parse_range(version_range) if version_range is not None else None
+
+    for tag in tags:
+        if pattern is None:
+            version_string = tag
+        else:
+            match = pattern.fullmatch(tag)
+            if match is None:
+                continue
+            version_string = match.group("version")
+
+        key = sort_key(version_string)
+        if key is None or (stable and not is_stable(key)):
+            continue
+        if in_range is not None and not in_range(key):
+            continue
+        yield key, tag
+
+
+def select(tags: Iterable[str], **kwargs) -> List[str]:
+    """
+    Return the tags that are versions, sorted by version.
+
+    kwargs may be pattern, to take the version from each tag's version group, see tag_pattern, and
+    skip the tags that don't match, stable, to only keep releases, and version_range, to only keep
+    the versions in the range, see parse_range.
+    """
+    return [tag for _, tag in sorted(_keyed(tags, **kwargs))]
+
+
+def latest(tags: Iterable[str], **kwargs) -> Optional[str]:
+    """Return the tag with the greatest version, or None if there isn't one, see select."""
+    keyed = max(_keyed(tags, **kwargs), default=None)
+    return keyed[1] if keyed is not None else None
@@ -0,0 +1,347 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Expands glob patterns against the working tree, skipping the files git ignores.
+
+Patterns are matched a path segment at a time, so only the directories that can match the pattern
+are walked. `*`, `?` and `[...]` match within a segment and a `**` segment matches any number of
+directories. The same rules match a pattern against a path that's already known, see match.
+
+Directory listings, and the .gitignore files in them, are cached next to the config keyed by their
+mtime. A directory is only listed again after an entry has been added to or removed from it, so
+repeated expansions of the same patterns mostly cost a stat per directory. As in the occurrence
+index, a listing read within the racy window of its mtime isn't cached, the directory could still
+change without its mtime moving.
+"""
+
+import fnmatch
+import json
+import os
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Set
+from typing import Tuple
+
+from yeyo import cache
+from yeyo.index import RACY_WINDOW_NS
+
+DIRS_CACHE_NAME = "dirs.json"
+
+# Never walked, whatever the .gitignore files say.
+ALWAYS_IGNORED = {".git", cache.CACHE_DIR_NAME}
+
+
+def is_pattern(path: str) -> bool:
+    """Return True if path contains glob characters."""
+    return any(c in path for c in "*?[")
+
+
+@lru_cache(maxsize=None)
+def _compile_segment(segment: str) -> Pattern[str]:
+    return re.compile(fnmatch.translate(segment))
+
+
+def _match_segments(segments: Tuple[str, ...], parts: Tuple[str, ...]) -> bool:
+    if not segments:
+        return not parts
+
+    segment, rest = segments[0], segments[1:]
+    if segment == "**":
+        # A trailing ** matches a file at any depth, otherwise it's followed by the rest.
+        if not rest:
+            return bool(parts)
+        return any(_match_segments(rest, parts[i:]) for i in range(len(parts)))
+
+    return (
+        bool(parts)
+        and _compile_segment(segment).fullmatch(parts[0]) is not None
+        and _match_segments(rest, parts[1:])
+    )
+
+
+def match(pattern: str, path: str) -> bool:
+    """
+    Return True if path matches pattern by the rules DirectoryIndex.expand uses.
+
+    Unlike fnmatch, wildcards don't match a slash. The .gitignore files aren't consulted.
+    """
+    return _match_segments(Path(pattern).parts, Path(path).parts)
+
+
+class IgnoreRule(NamedTuple):
+    """A single line of a .gitignore file."""
+
+    pattern: Pattern[str]
+    negate: bool
+    dir_only: bool
+    anchored: bool
+
+
+def _translate_gitignore(pattern: str) -> str:
+    """Translate a gitignore pattern to a regex, where wildcards don't match a slash."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            regex += "[" + pattern[i + 1 : end].replace("!", "^", 1) + "]"
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+@lru_cache(maxsize=None)
+def compile_ignore_line(line: str) -> Optional[IgnoreRule]:
+    """Compile a line of a .gitignore file, blank lines and comments give None."""
+    line = line.rstrip("\n").rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+
+    # A slash anywhere but the end anchors the pattern to the .gitignore's directory, otherwise it
+    # matches a name at any depth.
+    anchored = "/" in line
+    line = line.lstrip("/")
+
+    if not line:
+        return None
+
+    return IgnoreRule(re.compile(_translate_gitignore(line)), negate, dir_only, anchored)
+
+
+# The rules that apply in a directory, each with the directory of the .gitignore it came from.
+Rules = Tuple[Tuple[str, IgnoreRule], ...]
+
+
+def is_ignored(rules: Rules, rel_path: str, is_dir: bool) -> bool:
+    """Apply the rules in order to rel_path, the last rule that matches wins."""
+    name = rel_path.rsplit("/", 1)[-1]
+    if name in ALWAYS_IGNORED:
+        return True
+
+    ignored = False
+    for base, rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+
+        if rule.anchored:
+            if base and not rel_path.startswith(base + "/"):
+                continue
+            target = rel_path[len(base) + 1 :] if base else rel_path
+        else:
+            target = name
+
+        if rule.pattern.fullmatch(target):
+            ignored = not rule.negate
+
+    return ignored
+
+
+class Listing(NamedTuple):
+    """The entries of a directory, as of its mtime."""
+
+    mtime_ns: int
+    files: List[str]
+    dirs: List[str]
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+class DirectoryIndex:
+    """A cache of directory listings under root, used to expand glob patterns."""
+
+    def __init__(self, root: Path, cache_file: Optional[Path] = None):
+        """Initialize the index for the tree at root, persisted to cache_file if it's given."""
+        self.root = Path(root)
+        self.cache_file = cache_file
+
+        self._listings: Dict[str, Listing] = {}
+        self._ignores: Dict[str, Tuple[int, List[str]]] = {}
+        self._dirty = False
+
+        if cache_file is not None:
+            self._load()
+
+    @classmethod
+    def for_config(cls, config_path: Path) -> "DirectoryIndex":
+        """
+        Create the index for the tree the config at config_path lives in.
+
+        The listings validate themselves against the directories' mtimes, so an index kept in
+        memory is reused as is.
+        """
+        directory_index = cache.recall("dirs", config_path)
+        if directory_index is None:
+            directory_index = cls(
+                Path(config_path).parent, cache.cache_path(config_path, DIRS_CACHE_NAME)
+            )
+            cache.remember("dirs", config_path, directory_index)
+        return directory_index
+
+    def _load(self):
+        try:
+            with open(self.cache_file) as in_handler:
+                d = json.load(in_handler)
+            self._listings = {k: Listing(*v) for k, v in d["listings"].items()}
+            self._ignores = {k: (v[0], v[1]) for k, v in d["ignores"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            self._listings, self._ignores = {}, {}
+
+    def save(self):
+        """Persist the listings if any of them changed."""
+        if self.cache_file is None or not self._dirty:
+            return
+
+        d = {
+            "listings": {k: list(v) for k, v in self._listings.items()},
+            "ignores": {k: list(v) for k, v in self._ignores.items()},
+        }
+        cache.write(self.cache_file, json.dumps(d).encode())
+        self._dirty = False
+
+    @staticmethod
+    def _is_racy(mtime_ns: int, read_ns: int) -> bool:
+        return read_ns - mtime_ns < RACY_WINDOW_NS
+
+    def listing(self, rel_dir: str) -> Optional[Listing]:
+        """Return the listing of rel_dir, only reading the directory if its mtime has changed."""
+        path = self.root / rel_dir
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = self._listings.get(rel_dir)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            return cached
+
+        read_ns = time.time_ns()
+        files, dirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+
+        listing = Listing(mtime_ns, sorted(files), sorted(dirs))
+        if not self._is_racy(mtime_ns, read_ns):
+            self._listings[rel_dir] = listing
+            self._dirty = True
+        return listing
+
+    def _ignore_rules(self, rel_dir: str, listing: Listing) -> Rules:
+        if ".gitignore" not in listing.files:
+            return ()
+
+        path = self.root / rel_dir / ".gitignore"
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return ()
+
+        cached = self._ignores.get(rel_dir)
+        if cached is None or cached[0] != mtime_ns:
+            read_ns = time.time_ns()
+            with open(path) as in_handler:
+                cached = (mtime_ns, in_handler.readlines())
+            if not self._is_racy(mtime_ns, read_ns):
+                self._ignores[rel_dir] = cached
+                self._dirty = True
+
+        rules = (compile_ignore_line(line) for line in cached[1])
+        return tuple((rel_dir, rule) for rule in rules if rule is not None)
+
+    def _expand(self, rel_dir: str, segments: List[str], parent_rules: Rules, out: Set[str]):
+        listing = self.listing(rel_dir)
+        if listing is None:
+            return
+
+        rules = parent_rules + self._ignore_rules(rel_dir, listing)
+        self._match(rel_dir, listing, segments, rules, out)
+
+    def _match(
+        self, rel_dir: str, listing: Listing, segments: List[str], rules: Rules, out: Set[str]
+    ):
+        """Match the segments against the entries of rel_dir, adding the matched files to out."""
+        segment, rest = segments[0], segments[1:]
+
+        if segment == "**":
+            # The ** either matches no directories, so the rest is matched here, or it matches each
+            # subdirectory and possibly more below it.
+            if rest:
+                self._match(rel_dir, listing, rest, rules, out)
+            else:
+                self._match(rel_dir, listing, ["*"], rules, out)
+
+            for name in listing.dirs:
+                subdir = _join(rel_dir, name)
+                if not is_ignored(rules, subdir, is_dir=True):
+                    self._expand(subdir, segments, rules, out)
+            return
+
+        pattern = _compile_segment(segment)
+        if rest:
+            for name in listing.dirs:
+                subdir = _join(rel_dir, name)
+                if pattern.fullmatch(name) and not is_ignored(rules, subdir, is_dir=True):
+                    self._expand(subdir, rest, rules, out)
+        else:
+            for name in listing.files:
+                rel_path = _join(rel_dir, name)
+                if pattern.fullmatch(name) and not is_ignored(rules, rel_path, is_dir=False):
+                    out.add(rel_path)
+
+    def expand(self, pattern: str) -> List[Path]:
+        """
+        Return the files under root that match pattern and aren't ignored, sorted.
+
+        Relative patterns are relative to root. An absolute pattern outside of root is expanded
+        without the cache.
+        """
+        p = Path(pattern)
+        if p.is_absolute():
+            try:
+                p = p.relative_to(self.root.resolve())
+            except ValueError:
+                return DirectoryIndex(Path(p.anchor)).expand(str(p.relative_to(p.anchor)))
+
+        segments = [s for s in p.as_posix().split("/") if s not in ("", ".")]
+        if not segments:
+            return []
+
+        out: Set[str] = set()
+        self._expand("", segments, (), out)
+        return [self.root / rel_path for rel_path in sorted(out)]
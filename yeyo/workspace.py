@@ -0,0 +1,295 @@
+# (c) Copyright 2019 Trent Hauck
+# All Rights Reserved
+"""
+Runs yeyo commands across every project of a monorepo, see `yeyo workspace`.
+
+A project is a directory with a config, and the workspace is every project under a root. Projects
+are found by expanding `**/.yeyo.yaml` through a directory index, see yeyo.walk, so directories git
+ignores are skipped and finding the projects again mostly costs a stat per directory.
+
+Each project's command runs in the project's directory, in a pool of worker processes, and the
+results come back in the order of the projects, with a failure confined to its project. git's index
+and refs can only be updated by one process at a time, so a bump's --git-tag-before and
+--git-tag-after are taken out of the workers' commands, and the tags and commits of every project
+are made afterwards in one serialized step.
+"""
+
+import functools
+import os
+import traceback
+from pathlib import Path
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from yeyo import history
+from yeyo import metrics
+from yeyo import plumbing
+from yeyo import server
+from yeyo import status
+from yeyo import walk
+from yeyo.config import DEFAULT_CONFIG_PATH
+from yeyo.config import YeyoConfig
+from yeyo.config import YeyoDirtyRepoException
+from yeyo.config import config_paths
+from yeyo.config import git_commit_and_tag
+from yeyo.walk import DirectoryIndex
+
+# The commands that run across a workspace, by their leading arguments.
+WORKSPACE_COMMANDS = (
+    ("bump",),
+    ("files", "ls"),
+    ("git", "render-tag-string"),
+    ("git", "render-commit-string"),
+)
+
+CONFIG_PATTERN = f"**/{DEFAULT_CONFIG_PATH}"
+
+# The git flags of a bump that the workers leave to the serialized git step.
+_GIT_FLAGS = {
+    "--git-tag-before": ("tag_before", True),
+    "--no-git-tag-before": ("tag_before", False),
+    "--git-tag-after": ("tag_after", True),
+    "--no-git-tag-after": ("tag_after", False),
+}
+
+
+class GitOptions(NamedTuple):
+    """The git options of a bump, made in the serialized git step rather than by the workers."""
+
+    tag_before: bool = False
+    tag_after: bool = False
+    dirty_scope: str = status.DEFAULT_DIRTY_SCOPE
+
+    @property
+    def deferred(self) -> bool:
+        """True if there's anything for the git step to do."""
+        return self.tag_before or self.tag_after
+
+
+class ProjectResult(NamedTuple):
+    """
+    The outcome of a command in one project, by its directory relative to the workspace root.
+
+    When git is deferred, entry is the history entry the project's bump appended, and tag_before
+    the tag of the version it bumped from. Both are None if the project wasn't bumped.
+    """
+
+    project: Path
+    response: server.Response
+    entry: Optional[history.HistoryEntry] = None
+    tag_before: Optional[str] = None
+
+
+def is_workspace_command(argv: List[str]) -> bool:
+    """Return True if the command given by argv runs across a workspace."""
+    return any(tuple(argv[: len(command)]) == command for command in WORKSPACE_COMMANDS)
+
+
+def discover(root: Path) -> List[Path]:
+    """
+    Return the directories under root with a config, relative to root and sorted.
+
+    The directory listings are cached next to root's config, whether or not root has one.
+    """
+    directory_index = DirectoryIndex.for_config(Path(root) / DEFAULT_CONFIG_PATH)
+    with metrics.phase("workspace.discover"):
+        found = directory_index.expand(CONFIG_PATTERN)
+    directory_index.save()
+    return [Path(os.path.relpath(p.parent, root)) for p in found]
+
+
+def select(projects: Iterable[Path], patterns: Iterable[str]) -> List[Path]:
+    """
+    Return the projects whose directory matches any of the glob patterns, or all without any.
+
+    The patterns are matched like the paths given to `files add` and `files rm`, see walk.match.
+    """
+    patterns = list(patterns)
+    if not patterns:
+        return list(projects)
+    return [
+        project
+        for project in projects
+        if any(walk.match(pattern, project.as_posix()) for pattern in patterns)
+    ]
+
+
+def split_git_options(argv: List[str]) -> Tuple[List[str], GitOptions]:
+    """
+    Take the git flags out of a bump's argv, returning the argv for the workers and the options.
+
+    The dirty scope is left in argv, it's read the way `yeyo bump` reads it.
+    """
+    if not argv or argv[0] != "bump":
+        return argv, GitOptions()
+
+    options = {"dirty_scope": os.environ.get("YEYO_DIRTY_SCOPE", status.DEFAULT_DIRTY_SCOPE)}
+    worker_argv = []
+    for i, arg in enumerate(argv):
+        if arg in _GIT_FLAGS:
+            field, value = _GIT_FLAGS[arg]
+            options[field] = value
+            continue
+        if arg.startswith("--dirty-scope="):
+            options["dirty_scope"] = arg[len("--dirty-scope=") :]
+        elif i > 0 and argv[i - 1] == "--dirty-scope":
+            options["dirty_scope"] = arg
+        worker_argv.append(arg)
+    return worker_argv, GitOptions(**options)
+
+
+def run_project(
+    root: Path, project: Path, argv: List[str], git_options: GitOptions = GitOptions()
+) -> ProjectResult:
+    """Run the command given by argv in the project's directory, see server.run_command."""
+    project_dir = root / project
+    if not git_options.deferred:
+        return ProjectResult(project, server.run_command(argv, str(project_dir)))
+
+    config_path = project_dir / DEFAULT_CONFIG_PATH
+    project_history = history.History.for_config(config_path)
+    offset = project_history.size()
+    try:
+        tag_before = None
+        if git_options.tag_before:
+            tag_before = YeyoConfig.from_yaml(config_path).get_templated_tag()
+    except Exception:
+        return ProjectResult(project, server.Response(1, "", traceback.format_exc()))
+
+    response = server.run_command(argv, str(project_dir))
+    entries = list(project_history.entries(offset)) if response.exit_code == 0 else []
+    if not entries:
+        # A dryrun, or a bump that failed, so there's nothing to commit or tag.
+        return ProjectResult(project, response)
+    return ProjectResult(project, response, entries[-1], tag_before)
+
+
+def run(
+    root: Path,
+    projects: List[Path],
+    argv: List[str],
+    git_options: GitOptions = GitOptions(),
+    jobs: Optional[int] = None,
+) -> Iterator[ProjectResult]:
+    """
+    Run the command given by argv in each of projects, yielding the results in order.
+
+    The projects run in at most jobs worker processes, which defaults to the number of CPUs.
+    """
+    run_one = functools.partial(
+        run_project, Path(root).resolve(), argv=argv, git_options=git_options
+    )
+    if jobs == 1 or len(projects) <= 1:
+        yield from map(run_one, projects)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_one, project) for project in projects]
+        for project, future in zip(projects, futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # e.g. the worker process was killed.
+                yield ProjectResult(project, server.Response(1, "", f"{e!r}\n"))
+
+
+def _record_commit(config_path: Path, entry: history.HistoryEntry, tag: str, commit: str):
+    """Fill in the tag and commit of the entry the project's bump appended to its history."""
+    project_history = history.History.for_config(config_path)
+    entries = list(project_history.entries())
+    if entries and entries[-1] == entry:
+        entries[-1] = entry._replace(tag=tag, commit=commit)
+        project_history.replace(entries)
+
+
+def commit_and_tag(
+    root: Path, results: List[ProjectResult], git_options: GitOptions
+) -> Iterator[ProjectResult]:
+    """
+    Make the tags and commits that the bumps in results deferred, one project at a time.
+
+    Before committing, the repo is checked once for changes other than the bumped projects' tracked
+    files and configs, and YeyoDirtyRepoException is raised before anything is made if there are
+    any. The tags before the bumps are made first, so they all point at the commit the bumps
+    started from. A project whose tag or commit fails, e.g. because its tag exists, is reported and
+    the other projects carry on.
+    """
+    bumped = [result for result in results if result.entry is not None]
+    if not bumped:
+        return
+
+    import git
+
+    root = Path(root).resolve()
+    repo = git.Repo(root, search_parent_directories=True)
+    work_tree = Path(repo.working_tree_dir).resolve()
+
+    def relative(p: Path) -> str:
+        return Path(os.path.relpath(p, work_tree)).as_posix()
+
+    allowed_paths = set()
+    pending = []
+    for result in bumped:
+        project_dir = root / result.project
+        config_path = project_dir / DEFAULT_CONFIG_PATH
+        yc = YeyoConfig.from_yaml(config_path)
+
+        project_config_paths = {relative(p) for p in config_paths(config_path)}
+        changed_files = {relative(project_dir / p) for p in result.entry.files}
+        pending.append((result, config_path, yc, sorted(changed_files | project_config_paths)))
+
+        if git_options.tag_after:
+            files = yc.resolve_files(DirectoryIndex.for_config(config_path))
+            allowed_paths.update(relative(project_dir / fv.file_path) for fv in files)
+            allowed_paths.update(project_config_paths)
+
+    if git_options.tag_after:
+        with metrics.phase("git.status"):
+            extra_files = status.dirty_files(
+                repo, map(Path, allowed_paths), git_options.dirty_scope
+            )
+        if extra_files:
+            raise YeyoDirtyRepoException(
+                "Repo is dirty, these extra files have changes: "
+                + ", ".join(str(f) for f in extra_files)
+                + ".",
+                extra_files,
+            )
+
+    failed = {}
+    for result, *_ in pending:
+        if result.tag_before is None:
+            continue
+        try:
+            with metrics.phase("git.tag"):
+                repo.create_tag(result.tag_before)
+        except git.GitCommandError as e:
+            failed[result.project] = server.Response(1, "", f"{e}\n")
+
+    for result, config_path, yc, commit_paths in pending:
+        if result.project in failed:
+            yield ProjectResult(result.project, failed[result.project])
+            continue
+        if not git_options.tag_after:
+            stdout = f"Tagged {result.tag_before}.\n"
+            yield ProjectResult(result.project, server.Response(0, stdout, ""))
+            continue
+
+        tag_string = yc.get_templated_tag()
+        try:
+            commit_sha = git_commit_and_tag(
+                repo, commit_paths, yc.get_templated_commit(), tag_string
+            )
+        except (plumbing.YeyoRefException, plumbing.YeyoPathException, git.GitCommandError) as e:
+            yield ProjectResult(result.project, server.Response(1, "", f"{e}\n"))
+            continue
+
+        _record_commit(config_path, result.entry, tag_string, commit_sha)
+        stdout = f"Committed {commit_sha[:7]} and tagged {tag_string}.\n"
+        yield ProjectResult(result.project, server.Response(0, stdout, ""))